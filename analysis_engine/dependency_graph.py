@@ -1,15 +1,20 @@
 from __future__ import print_function
 
+import hashlib
 import os
 import sys
 import logging 
 import networkx as nx # pip install networkx or /opt/epd/bin/easy_install networkx
 import six
+import tempfile
 
-from collections import deque
+from collections import deque, OrderedDict
+from six.moves import cPickle
 
 from flightdatautilities.dict_helpers import dict_filter
 
+from analysis_engine import settings, __version__
+from analysis_engine.manifest import module_mtime
 from analysis_engine.node import (
     ApproachNode,
     DerivedParameterNode,
@@ -50,6 +55,10 @@ Q:
 """
 
 
+# Planned processing orders keyed by planning_key (most recently used last).
+_dependency_order_cache = OrderedDict()
+
+
 class InoperableDependencies(KeyError):
     ##def __init__(self, inoperable):
         ##self.inoperable = inoperable
@@ -219,7 +228,7 @@ def dependencies3(di_graph, root, node_mgr, raise_cir_dep=False):
         layer = set()  # layer of current node's available dependencies
         # order the successors based on the order in the derive method; this allows the
         # class to define the best path through the dependency tree.
-        ordered_successors = [name for (name, d) in sorted(di_graph[node].items(), key=lambda a: a[1].get('order'))]
+        ordered_successors = [name for (name, d) in sorted(di_graph[node].items(), key=lambda a: a[1].get('order', 0))]
         for dependency in ordered_successors:
             # traverse again, 'like we did last summer'
             if traverse_tree(dependency):
@@ -489,6 +498,383 @@ def process_order(gr_all, node_mgr, raise_inoperable_requested=False, raise_cir_
 
 
 
+# Colours of nodes within drawn and exported graphs.
+HDF_NODE_COLOR = '#72f4eb'  # turquoise
+MISSING_NODE_COLOR = '#6a6e70'  # fds-grey
+ROOT_NODE_COLOR = '#ffffff'
+NODE_TYPE_COLORS = (
+    (ApproachNode, '#663399'),  # purple
+    (MultistateDerivedParameterNode, '#2aa52a'),  # dark green
+    (DerivedParameterNode, '#72cdf4'),  # fds-blue
+    (FlightAttributeNode, '#b88a00'),  # brown
+    (FlightPhaseNode, '#d93737'),  # red
+    (KeyPointValueNode, '#bed630'),  # fds-green
+    (KeyTimeInstanceNode, '#fdbb30'),  # fds-orange
+)
+
+
+class CompactGraph(object):
+    '''
+    Compact adjacency structure of the dependency graph used for planning.
+    Nodes are identified by integer ids (in the order they would be added to
+    the networkx graph created by graph_nodes) and each node's dependencies
+    are pre-sorted by their position within the derive method.
+    '''
+
+    def __init__(self):
+        self.names = []  # id: name
+        self.ids = {}  # name: id
+        self.attributes = []  # id: node attributes (e.g. color, node_type)
+        # id: [(dependency id, position within derive method)] sorted by
+        # position.
+        self.dependencies = []
+        # id: [(dependency id, position)] in the order edges were added.
+        self.edges = []
+        self.predecessors = []  # id: [id] in the order edges were added
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.ids
+
+    def add_node(self, name, **attributes):
+        '''
+        :returns: Id of the node.
+        :rtype: int
+        '''
+        node_id = self.ids.get(name)
+        if node_id is None:
+            node_id = self.ids[name] = len(self.names)
+            self.names.append(name)
+            self.attributes.append({})
+            self.dependencies.append([])
+            self.edges.append([])
+            self.predecessors.append([])
+        self.attributes[node_id].update(attributes)
+        return node_id
+
+    def add_dependencies(self, node_id, dependency_names):
+        '''
+        Add edges from a node to its dependencies.
+
+        :param dependency_names: Dependency names in the order of the derive
+            method.
+        :type dependency_names: [str]
+        '''
+        # Dependencies repeated within the derive method are ordered by their
+        # last position.
+        positions = OrderedDict()
+        for position, name in enumerate(dependency_names):
+            dependency_id = self.add_node(name)
+            if dependency_id not in positions and \
+                    node_id not in self.predecessors[dependency_id]:
+                self.predecessors[dependency_id].append(node_id)
+            positions[dependency_id] = position
+        self.edges[node_id] = list(six.iteritems(positions))
+        # Stable sort retains insertion order for root edges.
+        self.dependencies[node_id] = sorted(self.edges[node_id],
+                                            key=lambda d: d[1])
+
+    def any_predecessors_in_requested(self, node_id, requested_ids):
+        '''
+        Iterative equivalent of any_predecessors_in_requested which follows
+        the first predecessor of each node, stopping if a cycle is found.
+
+        :rtype: bool
+        '''
+        visited = set()
+        while self.predecessors[node_id]:
+            node_id = self.predecessors[node_id][0]
+            if node_id in requested_ids:
+                return True
+            if node_id in visited:
+                return False
+            visited.add(node_id)
+        return False
+
+    def to_networkx(self, node_ids=None):
+        '''
+        Create a networkx DiGraph for drawing or exporting.
+
+        :param node_ids: Ids of nodes to include. Defaults to all nodes.
+        :type node_ids: iterable of int or None
+        :rtype: nx.DiGraph
+        '''
+        if node_ids is None:
+            node_ids = range(len(self.names))
+        node_ids = sorted(node_ids)
+        included = set(node_ids)
+        graph = nx.DiGraph()
+        for node_id in node_ids:
+            graph.add_node(self.names[node_id],
+                           **self.attributes[node_id])
+        for node_id in node_ids:
+            for dependency_id, position in self.edges[node_id]:
+                if dependency_id not in included:
+                    continue
+                attributes = {} if self.names[node_id] == 'root' \
+                    else {'order': position}
+                graph.add_edge(self.names[node_id],
+                               self.names[dependency_id], **attributes)
+        return graph
+
+
+def compact_graph(node_mgr):
+    '''
+    Build the CompactGraph of all nodes within node_mgr. Equivalent to
+    graph_nodes without networkx.
+
+    :param node_mgr: Node manager.
+    :type node_mgr: NodeManager
+    :rtype: CompactGraph
+    '''
+    graph = CompactGraph()
+    for name in node_mgr.hdf_keys:
+        graph.add_node(name, color=HDF_NODE_COLOR, node_type='HDFNode')
+    hdf_keys = set(node_mgr.hdf_keys)
+    derived_minus_lfl = [(name, node) for name, node in
+                         six.iteritems(node_mgr.derived_nodes)
+                         if name not in hdf_keys]
+    for name, node in derived_minus_lfl:
+        # the default is gray, if you see it, something is wrong
+        color = '#888888'
+        bases = node.__bases__
+        for node_type, node_type_color in NODE_TYPE_COLORS:
+            if node_type in bases:
+                color = node_type_color
+                break
+        graph.add_node(name, color=color, node_type=node.__base__.__name__)
+
+    derived_deps = set()
+    for name, node in derived_minus_lfl:
+        dependency_names = node.get_dependency_names()
+        derived_deps.update(dependency_names)
+        graph.add_dependencies(graph.ids[name], dependency_names)
+
+    available_nodes = set(node_mgr.keys())
+    missing_derived_dep = derived_deps - available_nodes
+    missing_requested = set(node_mgr.requested) - available_nodes
+    if missing_derived_dep:
+        logger.warning("Found %s dependencies which don't exist in LFL "
+                       "or Node modules.", len(missing_derived_dep))
+        logger.debug("The missing dependencies: %s", list(missing_derived_dep))
+    if missing_requested:
+        raise ValueError("Missing requested parameters: %s" %
+                         list(missing_requested))
+
+    # Link root to requested nodes which are not dependencies of another
+    # requested node (see graph_nodes).
+    requested_ids = set(graph.ids[name] for name in node_mgr.requested)
+    root_dependencies = [
+        name for name in node_mgr.requested
+        if not graph.any_predecessors_in_requested(graph.ids[name],
+                                                   requested_ids)]
+    root_id = graph.add_node('root', color=ROOT_NODE_COLOR)
+    graph.add_dependencies(root_id, root_dependencies)
+    for name in missing_derived_dep:
+        graph.add_node(name, color=MISSING_NODE_COLOR)
+    return graph
+
+
+def compact_dependencies(graph, root, node_mgr, raise_cir_dep=False):
+    '''
+    Iterative equivalent of dependencies3 traversing a CompactGraph with an
+    explicit stack.
+
+    As within dependencies3, a dependency which is already within the
+    current branch path is a circular dependency and is unavailable to that
+    branch. Nodes which are inoperable regardless of the branch path (no
+    circular dependency was met beneath them) are memoised so that their
+    dependencies are only traversed once.
+
+    :param graph: Compact dependency graph.
+    :type graph: CompactGraph
+    :param root: Name of the node to start traversing from.
+    :type root: str
+    :param node_mgr: Node manager used to establish whether nodes are
+        operational with their available dependencies.
+    :type node_mgr: NodeManager
+    :param raise_cir_dep: Raise a CircularDependency error if a circular
+        dependency is met.
+    :type raise_cir_dep: bool
+    :returns: Ids of operational nodes in processing order.
+    :rtype: [int]
+    '''
+    names = graph.names
+    dependencies = graph.dependencies
+    operational = node_mgr.operational
+    size = len(names)
+    on_path = bytearray(size)
+    active = bytearray(size)
+    inoperable = bytearray(size)
+    ordering = []
+
+    root_id = graph.ids[root]
+    on_path[root_id] = 1
+    # Frames of [node id, index of next dependency, available dependency
+    # names, whether a circular dependency was met beneath the node].
+    stack = [[root_id, 0, set(), False]]
+    while stack:
+        frame = stack[-1]
+        node_id = frame[0]
+        node_dependencies = dependencies[node_id]
+        if frame[1] < len(node_dependencies):
+            dependency_id = node_dependencies[frame[1]][0]
+            frame[1] += 1
+            if on_path[dependency_id]:
+                frame[3] = True
+                if raise_cir_dep:
+                    path = [names[f[0]] for f in stack]
+                    path.append(names[dependency_id])
+                    raise CircularDependency(
+                        "Circular Dependency In Path (node: '%s', path: "
+                        "'%s')" % (names[dependency_id], "' > '".join(path)))
+                logger.debug("Circular dependency avoided at node '%s'.",
+                             names[dependency_id])
+            elif active[dependency_id]:
+                frame[2].add(names[dependency_id])
+            elif not inoperable[dependency_id]:
+                on_path[dependency_id] = 1
+                stack.append([dependency_id, 0, set(), False])
+            continue
+
+        # All dependencies of the node have been traversed.
+        stack.pop()
+        on_path[node_id] = 0
+        is_operational = operational(names[node_id], frame[2])
+        if is_operational:
+            active[node_id] = 1
+            ordering.append(node_id)
+        elif not frame[3]:
+            inoperable[node_id] = 1
+        if stack:
+            if is_operational:
+                stack[-1][2].add(names[node_id])
+            elif frame[3]:
+                # The parent's result also depends upon the branch path.
+                stack[-1][3] = True
+    return ordering
+
+
+class SpanningTree(object):
+    '''
+    Active nodes and the dependencies between them as planned by
+    dependency_order. Provides the subset of the networkx DiGraph interface
+    used while processing; use to_networkx for drawing or exporting.
+    '''
+
+    def __init__(self, graph, order):
+        '''
+        :param graph: Compact dependency graph.
+        :type graph: CompactGraph
+        :param order: Ids of active nodes in processing order.
+        :type order: [int]
+        '''
+        active = set(order)
+        # Nodes ordered as within graph_nodes.
+        self._nodes = [graph.names[i] for i in sorted(active)]
+        self._attributes = {}
+        for position, node_id in enumerate(order):
+            attributes = dict(graph.attributes[node_id])
+            attributes['label'] = '%d: %s' % (position, graph.names[node_id])
+            attributes['active'] = True
+            self._attributes[graph.names[node_id]] = attributes
+        self._successors = {}
+        self._predecessors = dict((name, []) for name in self._nodes)
+        self._orders = {}
+        for node_id in sorted(active):
+            name = graph.names[node_id]
+            successors = []
+            for dependency_id, position in graph.edges[node_id]:
+                if dependency_id in active:
+                    successor = graph.names[dependency_id]
+                    successors.append(successor)
+                    self._predecessors[successor].append(name)
+                    if name != 'root':
+                        self._orders[(name, successor)] = position
+            self._successors[name] = successors
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def __contains__(self, name):
+        return name in self._successors
+
+    def __iter__(self):
+        return iter(self._nodes)
+
+    def nodes(self):
+        return list(self._nodes)
+
+    def successors(self, name):
+        return list(self._successors[name])
+
+    def predecessors(self, name):
+        return list(self._predecessors[name])
+
+    def to_networkx(self):
+        '''
+        :returns: Spanning tree as created by process_order.
+        :rtype: nx.DiGraph
+        '''
+        graph = nx.DiGraph()
+        for name in self._nodes:
+            graph.add_node(name, **self._attributes[name])
+        for name in self._nodes:
+            for successor in self._successors[name]:
+                order = self._orders.get((name, successor))
+                attributes = {} if order is None else {'order': order}
+                graph.add_edge(name, successor, **attributes)
+        return graph
+
+
+def compact_process_order(graph, node_mgr, raise_inoperable_requested=False,
+                          raise_cir_dep=False):
+    '''
+    Equivalent of process_order for a CompactGraph.
+
+    :param graph: Compact dependency graph.
+    :type graph: CompactGraph
+    :param node_mgr: Node manager.
+    :type node_mgr: NodeManager
+    :returns: Processing order (excluding 'root') and the spanning tree of
+        active nodes.
+    :rtype: ([str], SpanningTree)
+    '''
+    order_ids = compact_dependencies(graph, 'root', node_mgr,
+                                     raise_cir_dep=raise_cir_dep)
+    order = [graph.names[i] for i in order_ids]
+    logger.debug("Processing order of %d nodes is: %s", len(order), order)
+
+    active = set(order)
+    inoperable_requested = [n for n in node_mgr.requested if n not in active]
+    if inoperable_requested:
+        logger.warning("Found %s inoperable requested parameters.",
+                       len(inoperable_requested))
+        if logging.NOTSET < logger.getEffectiveLevel() <= logging.DEBUG:
+            # only build this massive tree if in debug!
+            gr_all = graph.to_networkx()
+            for name in gr_all:
+                gr_all.node[name]['active'] = name in active
+            items = []
+            for n in sorted(inoperable_requested):
+                tree = indent_tree(gr_all, n, recurse_active=False)
+                if tree:
+                    items.append('------- INOPERABLE -------')
+                    items.extend(tree)
+            logger.debug('\n'+'\n'.join(items))
+        if raise_inoperable_requested:
+            raise InoperableDependencies(inoperable_requested)
+
+    required_missing = [n for n in node_mgr.required if n not in active]
+    if required_missing:
+        raise RequiredNodesMissing(
+            "Required nodes missing: %s" % ', '.join(required_missing))
+
+    return order[:-1], SpanningTree(graph, order_ids)  # exclude 'root'
+
+
 def remove_floating_nodes(graph):
     """
     Remove all nodes which aren't referenced within the dependency tree
@@ -500,8 +886,132 @@ def remove_floating_nodes(graph):
     return graph
      
      
+def planning_key(node_mgr, **kwargs):
+    '''
+    Create a key which identifies the processing order planned for node_mgr.
+    The key is made from the available parameters, the names of available
+    attributes, the values of attributes used by can_operate methods, the
+    requested and required nodes, the derived Node classes and the version
+    of the modules they are defined within.
+
+    Attribute values which are not used to plan the processing order (e.g.
+    the Start Datetime of segment_info) do not form part of the key.
+
+    :param node_mgr: Node manager to plan the processing order for.
+    :type node_mgr: NodeManager
+    :param kwargs: Additional planning options.
+    :returns: Hexadecimal key.
+    :rtype: str
+    '''
+    attribute_names = set()
+    nodes = []
+    modules = set()
+    for name, node_class in sorted(six.iteritems(node_mgr.derived_nodes)):
+        nodes.append('%s=%s.%s' % (name, node_class.__module__,
+                                   node_class.__name__))
+        modules.add(node_class.__module__)
+        try:
+            attribute_names.update(
+                node_class.get_can_operate_attribute_names())
+        except TypeError:
+            # Raised again when planning.
+            pass
+
+    attributes = []
+    for name in sorted(n for n in attribute_names if n):
+        attribute = node_mgr.get_attribute(name)
+        if attribute is not None:
+            attributes.append((name, repr(attribute.value)))
+
+    module_versions = []
+    for module_name in sorted(modules):
+        # Modules of LazyNodes may not have been imported.
+        module_versions.append((module_name, module_mtime(module_name)))
+
+    parts = [
+        __version__,
+        repr(sorted(node_mgr.hdf_keys)),
+        repr(sorted(set(node_mgr.aircraft_info) |
+                    set(node_mgr.achieved_flight_record) |
+                    set(node_mgr.segment_info))),
+        repr(attributes),
+        repr(sorted(node_mgr.requested)),
+        repr(sorted(node_mgr.required)),
+        repr(sorted(kwargs.items())),
+        repr(module_versions),
+    ] + nodes
+    return hashlib.sha1('\n'.join(parts).encode('utf-8')).hexdigest()
+
+
+def _cached_dependency_order(key):
+    '''
+    Get a planned processing order from the in memory cache, falling back to
+    the on-disk store within settings.DEPENDENCY_ORDER_CACHE_PATH.
+
+    :returns: (process_order, gr_st) or None if not cached.
+    :rtype: tuple or None
+    '''
+    try:
+        planned = _dependency_order_cache.pop(key)
+    except KeyError:
+        planned = None
+        cache_dir = settings.DEPENDENCY_ORDER_CACHE_PATH
+        if not cache_dir:
+            return None
+        path = os.path.join(cache_dir, key + '.pkl')
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as fh:
+                planned = cPickle.load(fh)
+        except Exception:
+            logger.warning("Unable to load cached processing order: %s",
+                           path)
+            return None
+    # Mark as most recently used.
+    _dependency_order_cache[key] = planned
+    return planned
+
+
+def _cache_dependency_order(key, planned):
+    '''
+    Store a planned processing order in the in memory cache and the on-disk
+    store (if settings.DEPENDENCY_ORDER_CACHE_PATH is set).
+
+    :param planned: (process_order, gr_st)
+    :type planned: tuple
+    '''
+    _dependency_order_cache[key] = planned
+    while len(_dependency_order_cache) > settings.DEPENDENCY_ORDER_CACHE_SIZE:
+        _dependency_order_cache.popitem(last=False)
+
+    cache_dir = settings.DEPENDENCY_ORDER_CACHE_PATH
+    if not cache_dir:
+        return
+    try:
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        # Write to a temporary file and rename so that concurrent processes
+        # never read a partially written file.
+        fd, temp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as fh:
+            cPickle.dump(planned, fh, protocol=2)
+        os.rename(temp_path, os.path.join(cache_dir, key + '.pkl'))
+    except (IOError, OSError):
+        logger.warning("Unable to store processing order within: %s",
+                       cache_dir)
+
+
+def clear_dependency_order_cache():
+    '''
+    Clear the in memory cache of planned processing orders.
+    '''
+    _dependency_order_cache.clear()
+
+
 def dependency_order(node_mgr, draw=not_windows,
-                     raise_inoperable_requested=False, raise_cir_dep=False):
+                     raise_inoperable_requested=False, raise_cir_dep=False,
+                     use_cache=False):
     """
     Main method for retrieving processing order of nodes.
     
@@ -509,18 +1019,40 @@ def dependency_order(node_mgr, draw=not_windows,
     :type node_mgr: NodeManager
     :param draw: Will draw the graph. Green nodes are available LFL params, Blue are operational derived, Black are not requested derived, Red are active top level requested params, Grey are inactive params. Edges are labelled with processing order.
     :type draw: boolean
-    :returns: List of Nodes determining the order for processing and the spanning tree graph.
-    :rtype: (list of strings, dict)
+    :param use_cache: Reuse the processing order planned for a previous node_mgr with the same planning_key. The returned spanning tree is shared between callers.
+    :type use_cache: boolean
+    :returns: List of Nodes determining the order for processing and the spanning tree of active nodes.
+    :rtype: (list of strings, SpanningTree)
     """
-    _graph = graph_nodes(node_mgr)
-    gr_all, gr_st, order = process_order(_graph, node_mgr,
-                                         raise_inoperable_requested=raise_inoperable_requested,
-                                         raise_cir_dep=raise_cir_dep)
+    if use_cache and not draw:
+        key = planning_key(
+            node_mgr, raise_inoperable_requested=raise_inoperable_requested,
+            raise_cir_dep=raise_cir_dep)
+        planned = _cached_dependency_order(key)
+        if planned is None:
+            planned = dependency_order(
+                node_mgr, draw=False,
+                raise_inoperable_requested=raise_inoperable_requested,
+                raise_cir_dep=raise_cir_dep)
+            _cache_dependency_order(key, planned)
+        order, gr_st = planned
+        return list(order), gr_st
+
+    # OPT: Plan with the compact graph; networkx graphs are only created
+    # for drawing and exporting.
+    graph = compact_graph(node_mgr)
+    order, gr_st = compact_process_order(
+        graph, node_mgr,
+        raise_inoperable_requested=raise_inoperable_requested,
+        raise_cir_dep=raise_cir_dep)
     
     if draw:
         from json import dumps
-        logger.info("JSON Graph Representation:\n%s", dumps(graph_adjacencies(gr_st), indent=2))
-        draw_graph(gr_st, 'Active Nodes in Spanning Tree')
+        gr_st_graph = gr_st.to_networkx()
+        logger.info("JSON Graph Representation:\n%s", dumps(graph_adjacencies(gr_st_graph), indent=2))
+        draw_graph(gr_st_graph, 'Active Nodes in Spanning Tree')
+        # Annotate inactive nodes of the entire graph.
+        gr_all = process_order(graph_nodes(node_mgr), node_mgr)[0]
         # reduce number of nodes by removing floating ones
         gr_all = remove_floating_nodes(gr_all)
         draw_graph(gr_all, 'Dependency Tree')
@@ -1619,9 +1619,10 @@ class ClimbForFlightPhases(DerivedParameterNode):
     def derive(self, alt_std=P('Altitude STD Smoothed'), airs=S('Fast')):
 
         self.array = np.ma.zeros(len(alt_std.array))
-        repair_mask(alt_std.array) # Remove small sections of corrupt data
+        # Remove small sections of corrupt data
+        alt_std_array = repair_mask(alt_std.array)
         for air in airs:
-            deltas = np.ma.ediff1d(alt_std.array[air.slice], to_begin=0.0)
+            deltas = np.ma.ediff1d(alt_std_array[air.slice], to_begin=0.0)
             ups = np.ma.clump_unmasked(np.ma.masked_less(deltas,0.0))
             for up in ups:
                 self.array[air.slice][up] = np.ma.cumsum(deltas[up])
@@ -1688,9 +1689,10 @@ class DescendForFlightPhases(DerivedParameterNode):
     def derive(self, alt_std=P('Altitude STD Smoothed'), airs=S('Fast')):
 
         self.array = np.ma.zeros(len(alt_std.array))
-        repair_mask(alt_std.array) # Remove small sections of corrupt data
+        # Remove small sections of corrupt data
+        alt_std_array = repair_mask(alt_std.array)
         for air in airs:
-            deltas = np.ma.ediff1d(alt_std.array[air.slice], to_begin=0.0)
+            deltas = np.ma.ediff1d(alt_std_array[air.slice], to_begin=0.0)
             downs = np.ma.clump_unmasked(np.ma.masked_greater(deltas,0.0))
             for down in downs:
                 self.array[air.slice][down] = np.ma.cumsum(deltas[down])
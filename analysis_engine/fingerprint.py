@@ -0,0 +1,163 @@
+'''
+Content based fingerprints of Nodes used to incrementally reprocess flights.
+
+A Node's fingerprint is a hash of the source code of its class, the values of
+the settings referenced within that source and the fingerprints of the
+dependencies passed into its derive method. Recorded parameters are
+fingerprinted by their data and Attributes by their value. The fingerprint of
+a Node therefore changes whenever the Node or anything upstream of it
+changes, allowing Nodes with unchanged fingerprints to be reused from a
+previous processing run.
+
+Note: Changes to functions called by a Node (e.g. within
+analysis_engine.library) are not detected. Reprocess without fingerprints
+(reprocess=True) after changing shared code.
+'''
+import hashlib
+import inspect
+import logging
+import numpy as np
+import re
+import six
+
+from analysis_engine import settings
+from analysis_engine.manifest import LazyNode
+
+
+logger = logging.getLogger(name=__name__)
+
+# Name of the HDF file attribute which stores fingerprints of processed Nodes.
+NODE_FINGERPRINTS_ATTR = 'node_fingerprints'
+
+_class_fingerprints = {}
+
+_SETTING_NAME_RE = re.compile(r'\b[A-Z][A-Z0-9_]+\b')
+
+
+def _hash(*parts):
+    '''
+    :param parts: Strings or bytes to hash.
+    :returns: Hexadecimal SHA-1 digest of the parts.
+    :rtype: str
+    '''
+    sha = hashlib.sha1()
+    for part in parts:
+        if isinstance(part, six.text_type):
+            part = part.encode('utf-8')
+        sha.update(part)
+        # Separate parts to avoid ambiguous concatenation.
+        sha.update(b'\0')
+    return sha.hexdigest()
+
+
+def class_fingerprint(node_class):
+    '''
+    Fingerprint the source of a Node class (and its base classes) and the
+    values of the settings referenced within the source. Fingerprints are
+    memoised per class.
+
+    :param node_class: Node class.
+    :type node_class: class
+    :returns: Fingerprint of the Node class.
+    :rtype: str
+    '''
+    if isinstance(node_class, LazyNode):
+        node_class = node_class.node_class
+    try:
+        return _class_fingerprints[node_class]
+    except KeyError:
+        pass
+    sources = []
+    # Include base classes which may implement the derive method, excluding
+    # the abstract Node classes.
+    for cls in inspect.getmro(node_class):
+        if cls.__module__ in ('analysis_engine.node', 'builtins',
+                              '__builtin__', 'abc'):
+            continue
+        try:
+            sources.append(inspect.getsource(cls))
+        except (IOError, TypeError):
+            # Source is unavailable, e.g. classes created dynamically.
+            logger.warning("Source of Node class '%s' is not available for "
+                           "fingerprinting.", cls.__name__)
+            sources.append(cls.__name__)
+    source = '\n'.join(sources)
+    setting_values = sorted(
+        '%s=%r' % (name, getattr(settings, name))
+        for name in set(_SETTING_NAME_RE.findall(source))
+        if hasattr(settings, name))
+    fingerprint = _hash(node_class.__module__, source, *setting_values)
+    _class_fingerprints[node_class] = fingerprint
+    return fingerprint
+
+
+def array_fingerprint(array, frequency=None, offset=None):
+    '''
+    Fingerprint the data and mask of an array.
+
+    :param array: Parameter array.
+    :type array: np.ma.MaskedArray
+    :param frequency: Frequency of the parameter.
+    :type frequency: float
+    :param offset: Offset of the parameter.
+    :type offset: float
+    :returns: Fingerprint of the array.
+    :rtype: str
+    '''
+    data = np.ma.getdata(array)
+    return _hash(repr((frequency, offset, str(data.dtype), len(data))),
+                 np.ascontiguousarray(data).tobytes(),
+                 np.ma.getmaskarray(array).tobytes())
+
+
+def node_fingerprints(hdf, node_mgr, process_order):
+    '''
+    Fingerprint every Node within process_order. Dependencies which appear
+    later within process_order are not passed into a Node's derive method
+    and therefore do not contribute to its fingerprint.
+
+    :param hdf: Data file accessor used to read parameters within
+        node_mgr.hdf_keys.
+    :type hdf: hdf_file
+    :param node_mgr: Node manager used to plan process_order.
+    :type node_mgr: NodeManager
+    :param process_order: Node names in the order they will be processed.
+    :type process_order: [str]
+    :returns: Fingerprint of each Node name.
+    :rtype: dict
+    '''
+    fingerprints = {}
+    for name in process_order:
+        if name in node_mgr.hdf_keys:
+            # Recorded data is always hashed so that changes to it (e.g.
+            # within PRE_FLIGHT_ANALYSIS) invalidate the Nodes downstream.
+            param = hdf.get_param(name, valid_only=True)
+            fingerprint = array_fingerprint(
+                param.array, param.frequency, param.offset)
+        elif name in node_mgr.derived_nodes:
+            node_class = node_mgr.derived_nodes[name]
+            dependencies = ['%s=%s' % (dep_name, fingerprints[dep_name])
+                            for dep_name in node_class.get_dependency_names()
+                            if dep_name in fingerprints]
+            fingerprint = _hash(class_fingerprint(node_class), *dependencies)
+        else:
+            attribute = node_mgr.get_attribute(name)
+            if attribute is None:
+                # e.g. 'root'
+                continue
+            fingerprint = _hash(repr(attribute.value))
+        fingerprints[name] = fingerprint
+    return fingerprints
+
+
+def unchanged_nodes(fingerprints, stored):
+    '''
+    :param fingerprints: Current fingerprints (see node_fingerprints).
+    :type fingerprints: dict
+    :param stored: Fingerprints stored by a previous processing run.
+    :type stored: dict
+    :returns: Names of Nodes whose fingerprint is unchanged.
+    :rtype: set
+    '''
+    return {name for name, fingerprint in six.iteritems(fingerprints)
+            if stored.get(name) == fingerprint}
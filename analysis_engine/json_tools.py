@@ -7,6 +7,7 @@ import six
 from datetime import datetime
 
 from analysis_engine import settings
+from analysis_engine.node import intern_name, interned_name
 from analysis_engine.utils import get_derived_nodes
 
 
@@ -121,6 +122,9 @@ def jsondict_to_node(d):
                     val.replace(tzinfo=pytz.utc)
             elif n['type'] == 'slice':
                 val = slice(*val)
+        elif k == 'name' and isinstance(n, six.string_types):
+            # share names with the items created during processing
+            val = interned_name(intern_name(n))
         else:
             val = n
 
@@ -141,6 +145,14 @@ def process_flight_to_json(pf_results, indent=2):
     """
     Convert `process_flight` results into JSON object.
     """
+    return json.dumps(process_flight_to_jsondict(pf_results), indent=indent)
+
+
+def process_flight_to_jsondict(pf_results):
+    """
+    Convert `process_flight` results into a dictionary convertable into JSON
+    object.
+    """
     d = collections.OrderedDict()
     for key in PROCESS_FLIGHT_RESULT_KEYS:
         d[key] = {}
@@ -152,7 +164,7 @@ def process_flight_to_json(pf_results, indent=2):
     
     d['version'] = VERSION
     
-    return json.dumps(sort_dict(d), indent=indent)
+    return sort_dict(d)
 
 
 def json_to_process_flight(txt):
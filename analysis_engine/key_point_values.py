@@ -645,9 +645,9 @@ class AccelerationNormalWithFlapUpWhileAirborneMax(KeyPointValueNode):
 
         flap = flap_lever or flap_synth
         if 'Lever 0' in flap.array.state:
-            retracted = flap.array == 'Lever 0'
+            retracted = flap.state_mask('Lever 0')
         if '0' in flap.array.state:
-            retracted = flap.array == '0'
+            retracted = flap.state_mask('0')
         acc_flap_up = np.ma.masked_where(~retracted, acc_norm.array)
         self.create_kpv_from_slices(acc_flap_up, remove_bump(airborne), max_value)
 
@@ -675,9 +675,9 @@ class AccelerationNormalWithFlapUpWhileAirborneMin(KeyPointValueNode):
 
         flap = flap_lever or flap_synth
         if 'Lever 0' in flap.array.state:
-            retracted = flap.array == 'Lever 0'
+            retracted = flap.state_mask('Lever 0')
         elif '0' in flap.array.state:
-            retracted = flap.array == '0'
+            retracted = flap.state_mask('0')
         acc_flap_up = np.ma.masked_where(~retracted, acc_norm.array)
         self.create_kpv_from_slices(acc_flap_up, remove_bump(airborne),
                                     min_value)
@@ -706,9 +706,9 @@ class AccelerationNormalWithFlapDownWhileAirborneMax(KeyPointValueNode):
 
         flap = flap_lever or flap_synth
         if 'Lever 0' in flap.array.state:
-            retracted = flap.array == 'Lever 0'
+            retracted = flap.state_mask('Lever 0')
         elif '0' in flap.array.state:
-            retracted = flap.array == '0'
+            retracted = flap.state_mask('0')
         acc_flap_dn = np.ma.masked_where(retracted, acc_norm.array)
         self.create_kpv_from_slices(acc_flap_dn, remove_bump(airborne), max_value)
 
@@ -736,9 +736,9 @@ class AccelerationNormalWithFlapDownWhileAirborneMin(KeyPointValueNode):
 
         flap = flap_lever or flap_synth
         if 'Lever 0' in flap.array.state:
-            retracted = flap.array == 'Lever 0'
+            retracted = flap.state_mask('Lever 0')
         elif '0' in flap.array.state:
-            retracted = flap.array == '0'
+            retracted = flap.state_mask('0')
         acc_flap_dn = np.ma.masked_where(retracted, acc_norm.array)
         self.create_kpv_from_slices(acc_flap_dn, remove_bump(airborne), min_value)
 
@@ -4444,9 +4444,9 @@ class AOAWithFlapDuringClimbMax(KeyPointValueNode):
                climbs=S('Climbing')):
         flap = flap_lever or flap_synth
         if 'Lever 0' in flap.array.state:
-            retracted = flap.array == 'Lever 0'
+            retracted = flap.state_mask('Lever 0')
         elif '0' in flap.array.state:
-            retracted = flap.array == '0'
+            retracted = flap.state_mask('0')
         aoa_flap = np.ma.masked_where(retracted, aoa.array)
         self.create_kpvs_within_slices(aoa_flap, climbs, max_value)
 
@@ -4471,9 +4471,9 @@ class AOAWithFlapDuringDescentMax(KeyPointValueNode):
                descends=S('Descending')):
         flap = flap_lever or flap_synth
         if 'Lever 0' in flap.array.state:
-            retracted = flap.array == 'Lever 0'
+            retracted = flap.state_mask('Lever 0')
         elif '0' in flap.array.state:
-            retracted = flap.array == '0'
+            retracted = flap.state_mask('0')
         aoa_flap = np.ma.masked_where(retracted, aoa.array)
         self.create_kpvs_within_slices(aoa_flap, descends, max_value)
 
@@ -5175,9 +5175,9 @@ class AltitudeWithFlapMax(KeyPointValueNode):
 
         flap = flap_lever or flap_synth
         if 'Lever 0' in flap.array.state:
-            retracted = flap.array == 'Lever 0'
+            retracted = flap.state_mask('Lever 0')
         elif '0' in flap.array.state:
-            retracted = flap.array == '0'
+            retracted = flap.state_mask('0')
         alt_flap = np.ma.masked_where(retracted, alt_std.array)
         self.create_kpvs_within_slices(alt_flap, airborne, max_value)
 
@@ -5600,9 +5600,9 @@ class AltitudeAtGearDownSelectionWithFlapDown(KeyPointValueNode):
 
         flap = flap_lever or flap_synth
         if 'Lever 0' in flap.array.state:
-            retracted = flap.array == 'Lever 0'
+            retracted = flap.state_mask('Lever 0')
         elif '0' in flap.array.state:
-            retracted = flap.array == '0'
+            retracted = flap.state_mask('0')
         flap_dns = runs_of_ones(~retracted)
         flap_dn_gear_downs = gear_downs.get(within_slices=flap_dns)
         self.create_kpvs_at_ktis(alt_aal.array, flap_dn_gear_downs)
@@ -5720,9 +5720,9 @@ class AltitudeAtGearDownSelectionWithFlapUp(KeyPointValueNode):
 
         flap = flap_lever or flap_synth
         if 'Lever 0' in flap.array.state:
-            retracted = flap.array == 'Lever 0'
+            retracted = flap.state_mask('Lever 0')
         elif '0' in flap.array.state:
-            retracted = flap.array == '0'
+            retracted = flap.state_mask('0')
         flap_ups = runs_of_ones(retracted)
         flap_up_gear_downs = gear_downs.get(within_slices=flap_ups)
         self.create_kpvs_at_ktis(alt_aal.array, flap_up_gear_downs)
@@ -14058,9 +14058,9 @@ class PitchAfterFlapRetractionMax(KeyPointValueNode):
 
         flap = flap_lever or flap_synth
         if 'Lever 0' in flap.array.state:
-            retracted = flap.array == 'Lever 0'
+            retracted = flap.state_mask('Lever 0')
         elif '0' in flap.array.state:
-            retracted = flap.array == '0'
+            retracted = flap.state_mask('0')
         scope = []
         for air in airborne:
             slices = runs_of_ones(retracted[air.slice])
@@ -16833,9 +16833,9 @@ class SpeedbrakeDeployedWithFlapDuration(KeyPointValueNode):
 
         flap = flap_lever or flap_synth
         if 'Lever 0' in flap.array.state:
-            retracted = flap.array == 'Lever 0'
+            retracted = flap.state_mask('Lever 0')
         elif '0' in flap.array.state:
-            retracted = flap.array == '0'
+            retracted = flap.state_mask('0')
         for air in airborne:
             spd_brk_dep = spd_brk.array[air.slice] == 'Deployed/Cmd Up'
             array = spd_brk_dep & ~retracted[air.slice]
@@ -18711,7 +18711,7 @@ class DualInputWarningDuration(KeyPointValueNode):
         start = takeoff_rolls.get_first().slice.start
         stop = landing_rolls.get_last().slice.stop
         phase = slice(start, stop)
-        condition = dual.array == 'Dual'
+        condition = dual.state_mask('Dual')
         self.create_kpvs_where(condition, dual.hz, phase)
 
 
@@ -18740,7 +18740,7 @@ class DualInputAbove200FtDuration(KeyPointValueNode):
                dual=M('Dual Input'),
                alt_aal=P('Altitude AAL')):
         phase = alt_aal.slices_above(200)
-        condition = dual.array == 'Dual'
+        condition = dual.state_mask('Dual')
         self.create_kpvs_where(condition, dual.hz, phase)
 
 
@@ -18774,7 +18774,7 @@ class DualInputBelow200FtDuration(KeyPointValueNode):
         start = takeoff_rolls.get_first().slice.start
         stop = landing_rolls.get_last().slice.stop
         phase = slices_and([slice(start, stop)], alt_aal.slices_below(200))
-        condition = dual.array == 'Dual'
+        condition = dual.state_mask('Dual')
         self.create_kpvs_where(condition, dual.hz, phase)
 
 
@@ -18808,7 +18808,7 @@ class DualInputByCaptDuration(KeyPointValueNode):
         start = takeoff_rolls.get_first().slice.start
         stop = landing_rolls.get_last().slice.stop
         phase = slice(start, stop)
-        condition = (dual.array == 'Dual') & (pilot.array == 'First Officer')
+        condition = dual.state_mask('Dual') & pilot.state_mask('First Officer')
         self.create_kpvs_where(condition, dual.hz, phase)
 
 
@@ -18843,7 +18843,7 @@ class DualInputByFODuration(KeyPointValueNode):
         start = takeoff_rolls.get_first().slice.start
         stop = landing_rolls.get_last().slice.stop
         phase = slice(start, stop)
-        condition = (dual.array == 'Dual') & (pilot.array == 'Captain')
+        condition = dual.state_mask('Dual') & pilot.state_mask('Captain')
         self.create_kpvs_where(condition, dual.hz, phase)
 
 
@@ -18878,7 +18878,7 @@ class DualInputByCaptMax(KeyPointValueNode):
         start = takeoff_rolls.get_first().slice.start
         stop = landing_rolls.get_last().slice.stop
         phase = slice(start, stop)
-        condition = runs_of_ones((dual.array == 'Dual') & (pilot.array == 'First Officer'))
+        condition = runs_of_ones(dual.state_mask('Dual') & pilot.state_mask('First Officer'))
         dual_input_phases = slices_and((phase,), condition)
         self.create_kpvs_within_slices(
             stick_capt.array,
@@ -18919,7 +18919,7 @@ class DualInputByFOMax(KeyPointValueNode):
         start = takeoff_rolls.get_first().slice.start
         stop = landing_rolls.get_last().slice.stop
         phase = slice(start, stop)
-        condition = runs_of_ones((dual.array == 'Dual') & (pilot.array == 'Captain'))
+        condition = runs_of_ones(dual.state_mask('Dual') & pilot.state_mask('Captain'))
         dual_input_phases = slices_and((phase,), condition)
         self.create_kpvs_within_slices(
             stick_fo.array,
@@ -16,6 +16,7 @@ from analysis_engine.library import (
     hysteresis,
     index_at_distance,
     index_at_value,
+    index_at_values,
     is_index_within_slice,
     last_valid_sample,
     max_value,
@@ -873,9 +874,9 @@ class FirstFlapExtensionWhileAirborne(KeyTimeInstanceNode):
 
         flap = flap_lever or flap_synth
         if 'Lever 0' in flap.array.state:
-            retracted = flap.array == 'Lever 0'
+            retracted = flap.state_mask('Lever 0')
         elif '0' in flap.array.state:
-            retracted = flap.array == '0'
+            retracted = flap.state_mask('0')
         for air in airborne:
             cleans = runs_of_ones(retracted[air.slice])
             for clean in cleans:
@@ -1735,6 +1736,30 @@ class LandingTurnOffRunway(KeyTimeInstanceNode):
 ################################################################################
 
 
+def altitude_indices(thresholds, alt_aal, alt_std, _slice):
+    '''
+    Index at which each altitude threshold is crossed within a slice, using
+    height above airfield up to the transition altitude and standard
+    altitudes above.
+
+    :type thresholds: [int]
+    :param alt_aal: Altitude AAL
+    :type alt_aal: Parameter
+    :param alt_std: Altitude STD Smoothed
+    :type alt_std: Parameter
+    :type _slice: slice
+    :returns: index_at_value of each threshold.
+    :rtype: dict
+    '''
+    indices = {}
+    for alt, alt_thresholds in (
+            (alt_aal, [t for t in thresholds if t <= TRANSITION_ALTITUDE]),
+            (alt_std, [t for t in thresholds if t > TRANSITION_ALTITUDE])):
+        indices.update(zip(alt_thresholds,
+                           index_at_values(alt.array, alt_thresholds, _slice)))
+    return indices
+
+
 class AltitudeWhenClimbing(KeyTimeInstanceNode):
     '''
     Creates KTIs at certain altitudes when the aircraft is climbing.
@@ -1752,17 +1777,12 @@ class AltitudeWhenClimbing(KeyTimeInstanceNode):
         climbs = list(takeoff) + list(initial_climb) + list(climb)
         climb_slices = slices_remove_small_gaps([c.slice for c in climbs])
         for climb_slice in climb_slices:
+            # Will trigger a single KTI per height (if threshold is crossed)
+            # per climbing phase.
+            indices = altitude_indices(self.NAME_VALUES['altitude'], alt_aal,
+                                       alt_std, climb_slice)
             for alt_threshold in self.NAME_VALUES['altitude']:
-                # Will trigger a single KTI per height (if threshold is crossed)
-                # per climbing phase.
-                if alt_threshold <= TRANSITION_ALTITUDE:
-                    # Use height above airfield.
-                    alt = alt_aal.array
-                else:
-                    # Use standard altitudes.
-                    alt = alt_std.array
-
-                index = index_at_value(alt, alt_threshold, climb_slice)
+                index = indices[alt_threshold]
                 if index:
                     self.create_kti(index, altitude=alt_threshold)
 
@@ -1778,21 +1798,15 @@ class AltitudeWhenDescending(KeyTimeInstanceNode):
                alt_aal=P('Altitude AAL'),
                alt_std=P('Altitude STD Smoothed')):
         for descend in descending:
+            # Will trigger a single KTI per height (if threshold is
+            # crossed) per descending phase. The altitude array is
+            # scanned backwards to make sure we trap the last instance at
+            # each height.
+            indices = altitude_indices(self.NAME_VALUES['altitude'], alt_aal,
+                                       alt_std, slice(descend.slice.stop,
+                                                      descend.slice.start, -1))
             for alt_threshold in self.NAME_VALUES['altitude']:
-                # Will trigger a single KTI per height (if threshold is
-                # crossed) per descending phase. The altitude array is
-                # scanned backwards to make sure we trap the last instance at
-                # each height.
-                if alt_threshold <= TRANSITION_ALTITUDE:
-                    # Use height above airfield.
-                    alt = alt_aal.array
-                else:
-                    # Use standard altitudes.
-                    alt = alt_std.array
-
-                index = index_at_value(alt, alt_threshold,
-                                       slice(descend.slice.stop,
-                                             descend.slice.start, -1))
+                index = indices[alt_threshold]
                 if index:
                     self.create_kti(index, altitude=alt_threshold)
 
@@ -1953,9 +1967,10 @@ class DistanceToTouchdown(KeyTimeInstanceNode):
                touchdowns=KTI('Touchdown')):
         last_tdwn_idx = 0
         for touchdown in touchdowns:
-            for d in self.NAME_VALUES['distance']:
-                index = index_at_value(dtl.array, d,
-                                       slice(floor(touchdown.index), last_tdwn_idx, -1))
+            indices = index_at_values(
+                dtl.array, self.NAME_VALUES['distance'],
+                slice(floor(touchdown.index), last_tdwn_idx, -1))
+            for d, index in zip(self.NAME_VALUES['distance'], indices):
                 if index:
                     # may not have travelled far enough to find distance threshold.
                     self.create_kti(index, distance=d)
@@ -19,6 +19,7 @@ from hashlib import sha256
 from math import ceil, copysign, cos, floor, log, radians, sin, sqrt, pow
 from operator import attrgetter
 from scipy import interpolate as scipy_interpolate, optimize
+from scipy.linalg import solveh_banded
 from scipy.ndimage import filters
 from scipy.signal import medfilt
 
@@ -33,6 +34,7 @@ from flightdatautilities import aircrafttables as at, units as ut
 from flightdatautilities.geometry import cross_track_distance, great_circle_distance__haversine
 
 from analysis_engine.settings import (
+    ALIGN_KERNEL_CACHE_SIZE,
     BUMP_HALF_WIDTH,
     ILS_CAPTURE,
     ILS_CAPTURE_ROC,
@@ -53,6 +55,11 @@ deg2rad = radians(1.0)
 
 logger = logging.getLogger(name=__name__)
 
+# Most recently used alignment kernels (see _align_kernel).
+_align_kernels = OrderedDict()
+# Number of aligned samples processed at once by align.
+_ALIGN_BLOCK_SIZE = 2 ** 14
+
 Value = namedtuple('Value', 'index value')
 
 
@@ -197,8 +204,8 @@ airspeed may be used.
     lon = np_ma_masked_zeros_like(spd)
 
     # Do some spadework to prepare the ground
-    repair_mask(spd, repair_duration=None)
-    repair_mask(hdg, repair_duration=None)
+    spd = repair_mask(spd, repair_duration=None)
+    hdg = repair_mask(hdg, repair_duration=None)
     # Get longest slice as we want the flight not a high speed RTO
     valid_slices = np.ma.clump_unmasked(np.ma.masked_less_equal(spd, 50.0))
     valid_slice = max(valid_slices, key=lambda p: p.stop - p.start)
@@ -335,53 +342,16 @@ def align(slave, master, interpolate=True):
     return wrap_array(slave.name, aligned)
 
 
-def align_args(slave_array, slave_frequency, slave_offset, master_frequency, master_offset=0, interpolate=True):
+def _align_ratio(slave_frequency, slave_offset, master_frequency,
+                 master_offset):
     '''
-    align implementation abstracted from Parameter class interface.
-
-    TODO: Upscaling MappedArrays should result in transitions at midpoints rather
-          than simply repeating the array as the exact time is unknown, e.g.
-          ['-', '-', 'Up'] * 4 == ['-', '-', '-', '-',
-                                   '-', '-' 'Up', 'Up', # currently '-', '-', '-', '-'
-                                   'Up', 'Up', 'Up', 'Up']
-          This is arguably more accurate, as the state could have changed
-          anywhere between the sample where the state changed and the previous
-          one.
+    Validate the frequencies and offsets of an alignment.
 
-    :type slave_array: np.ma.masked_array
-    :type slave_frequency: int or float
-    :type slave_offset: int or float
-    :type master_frequency: int or float
-    :type master_offset: int or float
-    :type interpolate: bool
-    :returns: Slave array aligned to master.
-    :rtype: array of same type as slave_array
+    :returns: The sample rates of the master and slave within the period of
+        the slowest parameter, the sample rate ratio and the timing
+        disparity in terms of the slave parameter sample interval.
+    :rtype: (float, float, float, float)
     '''
-
-    original_array = slave_array
-    if slave_array.dtype.type is np.string_:
-        # by converting string arrays to multistate arrays we can use
-        # established aligning process
-        slave_array = string_array_to_mapped_array(slave_array)
-
-    if isinstance(slave_array, MappedArray):  # Multi-state array.
-        # force disable interpolate!
-        mappings = slave_array.values_mapping
-        slave_array = slave_array.raw
-        interpolate = False
-        _dtype = slave_array.dtype
-    elif isinstance(slave_array, np.ma.MaskedArray):
-        _dtype = float
-    else:
-        raise ValueError('Cannot align slave array of unknown type.')
-
-    if len(slave_array) == 0:
-        # No elements to align, avoids exception being raised in the loop below.
-        return slave_array
-    if slave_frequency == master_frequency and slave_offset == master_offset:
-        # No alignment is required, return the slave's array unchanged.
-        return slave_array
-
     # Get the sample rates for the two parameters
     wm = master_frequency
     ws = slave_frequency
@@ -411,85 +381,289 @@ def align_args(slave_array, slave_frequency, slave_offset, master_frequency, mas
 
     # Compute the sample rate ratio:
     r = wm / float(ws)
+    return wm, ws, r, delta
+
 
+def _column_indexer(columns):
+    '''
+    :param columns: Column indices.
+    :type columns: [int]
+    :returns: Slice equivalent to columns if they are evenly spaced, otherwise
+        an array of the columns.
+    :rtype: slice or np.array
+    '''
+    if len(columns) == 1:
+        return slice(columns[0], columns[0] + 1)
+    step = columns[1] - columns[0]
+    if step > 0 and all(b - a == step for a, b in zip(columns, columns[1:])):
+        return slice(columns[0], columns[-1] + 1, step)
+    return np.array(columns)
+
+
+def _align_kernel(ws, wm, delta, interpolate):
+    '''
+    Alignment kernel for a combination of sample rates and timing disparity.
+    Each period of wm aligned samples is gathered from the same positions
+    within the corresponding period of ws slave samples (or the neighbouring
+    periods), so the kernel describes where each aligned sample within a
+    period is gathered from rather than every sample of the array. The most
+    recently used ALIGN_KERNEL_CACHE_SIZE kernels are cached.
+
+    :param ws: Slave sample rate within the period.
+    :type ws: float
+    :param wm: Master sample rate within the period.
+    :type wm: float
+    :param delta: Timing disparity in terms of the slave sample interval.
+    :type delta: float
+    :param interpolate: Whether to interpolate or take the closest sample.
+    :type interpolate: bool
+    :returns: Coefficients of the slave samples before and after each aligned
+        sample within the period and, for both, a list of (period offset,
+        aligned columns, slave columns) to gather.
+    :rtype: (np.array, np.array, list, list)
+    '''
+    key = (ws, wm, delta, interpolate)
+    try:
+        kernel = _align_kernels.pop(key)
+    except KeyError:
+        kernel = None
+    if kernel is None:
+        r = wm / float(ws)
+        # When upsampling, every rth aligned sample is gathered from
+        # consecutive slave samples, so group these to gather them with
+        # strided slices.
+        phases = int(r) if r >= 1 and not r % 1 else 1
+        before = defaultdict(lambda: ([], []))
+        after = defaultdict(lambda: ([], []))
+        coefficients = []
+        # Each sample in the master parameter may need different combination parameters
+        for i in range(int(wm)):
+            bracket = (i / r) + delta
+            # Interpolate between the hth and (h+1)th samples of the slave array
+            h = int(floor(bracket))
+            h1 = h + 1
+            # Compute the linear interpolation coefficient of the (h+1)th
+            # sample.
+            b = bracket - h
+            # Cunningly, if we are not interpolating (working with mapped
+            # arrays e.g. discrete or multi-state parameters), by reverting
+            # to 1,0 or 0,1 coefficients we gather the closest value in time
+            # to the master parameter.
+            if not interpolate:
+                b = floor(b + 0.5)
+            if h < -ws or h >= ws:
+                raise ValueError('Align called with excessive timing mismatch')
+            for index, gather in ((h, before), (h1, after)):
+                columns = gather[(index // int(ws), i % phases)]
+                columns[0].append(i)
+                columns[1].append(index % int(ws))
+            coefficients.append(b)
+        b = np.array(coefficients, dtype=float)
+        kernel = (1 - b, b) + tuple(
+            [(offset, _column_indexer(aligned), _column_indexer(slave))
+             for (offset, _), (aligned, slave) in sorted(gather.items())]
+            for gather in (before, after))
+    _align_kernels[key] = kernel
+    while len(_align_kernels) > ALIGN_KERNEL_CACHE_SIZE:
+        _align_kernels.popitem(last=False)
+    return kernel
+
+
+def _align_gather(periods, wm, gather, gathered=None):
+    '''
+    Gather slave samples for each aligned sample.
+
+    :param periods: Slave samples with one row per period, padded with a
+        period before and after the aligned periods. Additional axes are
+        those of a stack of arrays.
+    :type periods: np.array
+    :param wm: Master sample rate within the period.
+    :type wm: int
+    :param gather: Kernel positions to gather from (see _align_kernel).
+    :type gather: list
+    :param gathered: Optional array to gather into.
+    :type gathered: np.array or None
+    :returns: Gathered samples with one row per period.
+    :rtype: np.array
+    '''
+    count = periods.shape[0] - 2
+    if gathered is None:
+        gathered = np.empty((count, wm) + periods.shape[2:],
+                            dtype=periods.dtype)
+    for offset, aligned, slave in gather:
+        gathered[:, aligned] = periods[1 + offset:1 + offset + count, slave]
+    return gathered
+
+
+def _align_data(slave_array, slave_frequency, master_frequency, wm, ws, r,
+                delta, interpolate, dtype):
+    '''
+    Align the last axis of slave_array. Implementation shared by align_args
+    and align_arrays.
+
+    :param slave_array: 1D array or 2D array with one row per array.
+    :type slave_array: np.ma.masked_array
+    :returns: Aligned array.
+    :rtype: np.ma.masked_array
+    '''
+    length = slave_array.shape[-1]
     # Here we create a masked array to hold the returned values that will have
     # the same sample rate and timing offset as the master
-    len_aligned = int(len(slave_array) * r)
-    if len_aligned != (len(slave_array) * r):
+    len_aligned = int(length * r)
+    if len_aligned != (length * r):
         raise ValueError("Array length problem in align. Probable cause is flight cutting not at superframe boundary")
 
-    slave_aligned = np.ma.zeros(len(slave_array) * r, dtype=_dtype)
-
     # Where offsets are equal, the slave_array recorded values remain
     # unchanged and interpolation is performed between these values.
     # - and we do not interpolate mapped arrays!
     if not delta and interpolate and (is_power2(slave_frequency) and
                                       is_power2(master_frequency)):
+        if master_frequency <= slave_frequency:
+            # step through slave taking the required samples
+            return slave_array[..., ::int(round(1 / r))]
+        # populate values and interpolate
+        slave_aligned = np.ma.zeros(slave_array.shape[:-1] + (len_aligned,),
+                                    dtype=dtype)
         slave_aligned.mask = True
-        if master_frequency > slave_frequency:
-            # populate values and interpolate
-            slave_aligned[0::r] = slave_array[0::1]
-            # Interpolate and do not extrapolate masked ends or gaps
-            # bigger than the duration between slave samples (i.e. where
-            # original slave data is masked).
-            # If array is fully masked, return array of masked zeros
-            dur_between_slave_samples = 1.0 / slave_frequency
+        slave_aligned[..., ::int(r)] = slave_array
+        # Interpolate and do not extrapolate masked ends or gaps
+        # bigger than the duration between slave samples (i.e. where
+        # original slave data is masked).
+        # If array is fully masked, return array of masked zeros
+        dur_between_slave_samples = 1.0 / slave_frequency
+        if slave_aligned.ndim == 1:
             return repair_mask(
                 slave_aligned,
                 frequency=master_frequency,
                 repair_duration=dur_between_slave_samples,
                 raise_entirely_masked=False,
             )
+        for row in slave_aligned:
+            row[:] = repair_mask(
+                row,
+                frequency=master_frequency,
+                repair_duration=dur_between_slave_samples,
+                raise_entirely_masked=False,
+            )
+        return slave_aligned
+
+    a, b, before, after = _align_kernel(ws, wm, delta, interpolate)
+    ws = int(ws)
+    wm = int(wm)
+    count = -(-length // ws)
+    padded_length = (count + 2) * ws
+    # Stacked arrays are aligned along the first axis with the stack as the
+    # last axis so that each sample is gathered from contiguous memory.
+    stack = slave_array.shape[:-1]
+    shape = (count + 2, ws) + stack
+    # Pad the slave array with a period before and after so that each
+    # period of aligned samples is gathered from the same positions.
+    data = np.zeros((padded_length,) + stack)
+    data[ws:ws + length] = np.ma.getdata(slave_array).T
+    data = data.reshape(shape)
+    mask = np.ma.getmask(slave_array)
+    if mask is np.ma.nomask or not mask.any():
+        padded_mask = None
+    else:
+        padded_mask = np.ones((padded_length,) + stack, dtype=bool)
+        padded_mask[ws:ws + length] = mask.T
+        padded_mask = padded_mask.reshape(shape)
+
+    a = a.reshape((wm,) + (1,) * len(stack))
+    b = b.reshape((wm,) + (1,) * len(stack))
+    aligned = np.empty((count, wm) + stack)
+    aligned_mask = np.zeros((count, wm) + stack, dtype=bool)
+    # Align blocks of periods so that intermediate arrays fit within the CPU
+    # cache.
+    block = max(1, _ALIGN_BLOCK_SIZE // (wm * (slave_array.size // length)))
+    for start in range(0, count, block):
+        stop = min(start + block, count)
+        periods = data[start:stop + 2]
+        block_aligned = _align_gather(periods, wm, before,
+                                      aligned[start:stop])
+        with np.errstate(invalid='ignore'):
+            block_aligned *= a
+            gathered = _align_gather(periods, wm, after)
+            gathered *= b
+            block_aligned += gathered
+        if padded_mask is not None:
+            periods = padded_mask[start:stop + 2]
+            block_mask = _align_gather(periods, wm, before,
+                                       aligned_mask[start:stop])
+            block_mask |= _align_gather(periods, wm, after)
+
+    # We can't interpolate values outside of the range of the slave array.
+    # Treat ends as "padding"; Value of 0 and Masked. Only the first and
+    # last periods are gathered from the padding.
+    padding = np.ones(padded_length, dtype=bool)
+    padding[ws:ws + length] = False
+    padding = padding.reshape(count + 2, ws)
+    edge = min(count, 2)
+    for rows, periods in ((slice(None, edge), padding[:edge + 2]),
+                          (slice(count - edge, None), padding[-edge - 2:])):
+        outside = (_align_gather(periods, wm, before) |
+                   _align_gather(periods, wm, after))
+        aligned[rows][outside] = 0
+        aligned_mask[rows][outside] = True
+
+    aligned = aligned.reshape((-1,) + stack)[:len_aligned]
+    aligned_mask = aligned_mask.reshape((-1,) + stack)[:len_aligned]
+    return np.ma.MaskedArray(np.ascontiguousarray(aligned.T, dtype=dtype),
+                             mask=np.ascontiguousarray(aligned_mask.T))
 
-        else:
-            # step through slave taking the required samples
-            return slave_array[0::1/r]
-
-    # Each sample in the master parameter may need different combination parameters
-    for i in range(int(wm)):
-        bracket = (i / r) + delta
-        # Interpolate between the hth and (h+1)th samples of the slave array
-        h = int(floor(bracket))
-        h1 = h + 1
-
-        # Compute the linear interpolation coefficients, b & a
-        b = bracket - h
-
-        # Cunningly, if we are interpolating (working with mapped arrays e.g.
-        # discrete or multi-state parameters), by reverting to 1,0 or 0,1
-        # coefficients we gather the closest value in time to the master
-        # parameter.
-        if not interpolate:
-            b = round(b)
 
-        # Either way, a is the residual part.
-        a = 1 - b
+def align_args(slave_array, slave_frequency, slave_offset, master_frequency, master_offset=0, interpolate=True):
+    '''
+    align implementation abstracted from Parameter class interface.
 
-        if h < 0:
-            if h<-ws:
-                raise ValueError('Align called with excessive timing mismatch')
-            # slave_array values do not exist in aligned array
-            if ws==1:
-                slave_aligned[i+wm::wm] = a*slave_array[h+ws:-ws:ws] + b*slave_array[h1+ws::ws]
-            else:
-                slave_aligned[i+wm::wm] = a*slave_array[h+ws:-ws:ws] + b*slave_array[h1+ws:1-ws:ws]
-            # We can't interpolate the inital values as we are outside the
-            # range of the slave parameters.
-            # Treat ends as "padding"; Value of 0 and Masked.
-            slave_aligned[i] = 0
-            slave_aligned[i] = np.ma.masked
-        elif h1 >= ws:
-            slave_aligned[i:-wm:wm] = a*slave_array[h:-ws:ws] + b*slave_array[h1::ws]
-            # At the other end, we run out of slave parameter values so need to
-            # pad to the end of the array.
-            # Treat ends as "padding"; Value of 0 and Masked.
-            slave_aligned[i-wm] = 0
-            slave_aligned[i-wm] = np.ma.masked
-        else:
-            # Sheer bliss. We can compute slave_aligned across the whole
-            # range of the data without having to take special care at the
-            # ends of the array.
-            slave_aligned[i::wm] = a*slave_array[h::ws] + b*slave_array[h1::ws]
+    TODO: Upscaling MappedArrays should result in transitions at midpoints rather
+          than simply repeating the array as the exact time is unknown, e.g.
+          ['-', '-', 'Up'] * 4 == ['-', '-', '-', '-',
+                                   '-', '-' 'Up', 'Up', # currently '-', '-', '-', '-'
+                                   'Up', 'Up', 'Up', 'Up']
+          This is arguably more accurate, as the state could have changed
+          anywhere between the sample where the state changed and the previous
+          one.
+
+    :type slave_array: np.ma.masked_array
+    :type slave_frequency: int or float
+    :type slave_offset: int or float
+    :type master_frequency: int or float
+    :type master_offset: int or float
+    :type interpolate: bool
+    :returns: Slave array aligned to master.
+    :rtype: array of same type as slave_array
+    '''
+
+    original_array = slave_array
+    if slave_array.dtype.type is np.string_:
+        # by converting string arrays to multistate arrays we can use
+        # established aligning process
+        slave_array = string_array_to_mapped_array(slave_array)
+
+    if isinstance(slave_array, MappedArray):  # Multi-state array.
+        # force disable interpolate!
+        mappings = slave_array.values_mapping
+        slave_array = slave_array.raw
+        interpolate = False
+        _dtype = slave_array.dtype
+    elif isinstance(slave_array, np.ma.MaskedArray):
+        _dtype = float
+    else:
+        raise ValueError('Cannot align slave array of unknown type.')
+
+    if len(slave_array) == 0:
+        # No elements to align.
+        return slave_array
+    if slave_frequency == master_frequency and slave_offset == master_offset:
+        # No alignment is required, return the slave's array unchanged.
+        return slave_array
+
+    wm, ws, r, delta = _align_ratio(slave_frequency, slave_offset,
+                                    master_frequency, master_offset)
+    slave_aligned = _align_data(slave_array, slave_frequency,
+                                master_frequency, wm, ws, r, delta,
+                                interpolate, _dtype)
 
     if isinstance(original_array, MappedArray) or original_array.dtype.type is np.string_:
         # return back to mapped array
@@ -504,6 +678,50 @@ def align_args(slave_array, slave_frequency, slave_offset, master_frequency, mas
     return slave_aligned
 
 
+def align_arrays(slave_arrays, slave_frequency, slave_offset,
+                 master_frequency, master_offset=0, interpolate=True):
+    '''
+    Align a stack of arrays which share the same frequency, offset and
+    length, e.g. the arrays of Eng (1) N1 to Eng (4) N1, within a single
+    operation. Equivalent to calling align_args for each array.
+
+    :param slave_arrays: Masked arrays to align or a 2D masked array with one
+        row per array. MappedArrays are not supported.
+    :type slave_arrays: [np.ma.masked_array] or np.ma.masked_array
+    :type slave_frequency: int or float
+    :type slave_offset: int or float
+    :type master_frequency: int or float
+    :type master_offset: int or float
+    :type interpolate: bool
+    :returns: 2D masked array with one row of each aligned array.
+    :rtype: np.ma.masked_array
+    '''
+    if any(isinstance(a, MappedArray) for a in slave_arrays):
+        raise ValueError('Cannot align MappedArrays with align_arrays.')
+    slave_arrays = np.ma.vstack(slave_arrays) if len(slave_arrays) else \
+        np.ma.zeros((0, 0))
+    if not slave_arrays.size or (slave_frequency == master_frequency and
+                                 slave_offset == master_offset):
+        return slave_arrays
+    wm, ws, r, delta = _align_ratio(slave_frequency, slave_offset,
+                                    master_frequency, master_offset)
+    if slave_arrays.size <= _ALIGN_BLOCK_SIZE:
+        return _align_data(slave_arrays, slave_frequency, master_frequency,
+                           wm, ws, r, delta, interpolate, float)
+    # Aligning long arrays is limited by memory bandwidth rather than the
+    # number of NumPy operations, so align each row in turn to keep
+    # intermediate arrays within the CPU cache.
+    shape = (len(slave_arrays), int(slave_arrays.shape[-1] * r))
+    data = np.empty(shape)
+    mask = np.empty(shape, dtype=bool)
+    for index, slave_array in enumerate(slave_arrays):
+        aligned = _align_data(slave_array, slave_frequency, master_frequency,
+                              wm, ws, r, delta, interpolate, float)
+        data[index] = aligned.data
+        mask[index] = np.ma.getmaskarray(aligned)
+    return np.ma.MaskedArray(data, mask=mask)
+
+
 def align_slices(slave, master, slices):
     '''
     :param slave: The node to align the slices to.
@@ -2758,8 +2976,8 @@ def ground_track(lat_fix, lon_fix, gspd, hdg, frequency, mode):
     # otherwise overwrite the result mask.
     result = np.ma.copy(result)
 
-    repair_mask(gspd, repair_duration=None)
-    repair_mask(hdg, repair_duration=None)
+    gspd = repair_mask(gspd, repair_duration=None)
+    hdg = repair_mask(hdg, repair_duration=None)
 
     if mode == 'takeoff':
         direction = 'backwards'
@@ -2931,42 +3149,142 @@ def hysteresis(array, hysteresis):
         return array
 
     quarter_range = hysteresis / 4.0
-    # Length is going to be used often, so prepare here:
-    length = len(array)
-    half_done = np.zeros(length)
-    result = np.zeros(length)
-    length = length-1 #  To be used for array indexing next
-
-    # get a list of the unmasked data - allow for array.mask = False (not an array)
-    if array.mask is np.False_:
-        notmasked = np.arange(length+1)
-    else:
-        notmasked = np.ma.where(~array.mask)[0]
-    # The starting point for the computation is the first notmasked sample.
-    old = array[notmasked[0]]
-    for index in notmasked:
-        new = array[index]
-
-        if new - old > quarter_range:
-            old = new  - quarter_range
-        elif new - old < -quarter_range:
-            old = new + quarter_range
-        half_done[index] = old
-
+    notmasked = np.flatnonzero(~np.ma.getmaskarray(array))
+    half_done = _hysteresis_pass(np.ma.getdata(array)[notmasked],
+                                 quarter_range)
     # Repeat the process in the "backwards" sense to remove phase effects.
-    for index in notmasked[::-1]:
-        new = half_done[index]
-        if new - old > quarter_range:
-            old = new  - quarter_range
-        elif new - old < -quarter_range:
-            old = new + quarter_range
-        result[index] = old
+    result = np.zeros(len(array))
+    result[notmasked] = _hysteresis_pass(half_done[::-1],
+                                         quarter_range)[::-1]
 
     # At the end of the process we reinstate the mask, although the data
     # values may have affected the result.
     return np.ma.array(result, mask=array.mask)
 
 
+def _hysteresis_pass(values, quarter_range, chunk_size=65536):
+    '''
+    Applies hysteresis to values in one direction. Equivalent to:
+
+        old = values[0]
+        for new in values:
+            if new - old > quarter_range:
+                old = new - quarter_range
+            elif new - old < -quarter_range:
+                old = new + quarter_range
+            yield old
+
+    Each step clamps old between new - quarter_range and new +
+    quarter_range. Clamps compose into clamps, so the steps are combined
+    with a parallel prefix scan (_clamp_scan) over chunks of the values.
+    The scan's result is checked against the comparisons above, which may
+    round differently, and the chunk is scanned again after the first
+    sample which differs.
+
+    :param values: Unmasked data.
+    :type values: np.ndarray
+    :param quarter_range: Quarter of the level of hysteresis.
+    :type quarter_range: float
+    :param chunk_size: Number of values scanned at once.
+    :type chunk_size: int
+    :returns: Values with hysteresis applied.
+    :rtype: np.ndarray of float
+    '''
+    result = np.empty(len(values))
+    if not len(values):
+        return result
+    old = values[0]
+    # old keeps the type of the values until it first changes.
+    start = _hysteresis_hold(values, old, quarter_range)
+    result[:start] = old
+    if start == len(values):
+        return result
+
+    floats = values.astype(type(values[0] - quarter_range))
+    lower = floats - quarter_range
+    upper = floats + quarter_range
+    old = lower[start] if values[start] - old > quarter_range \
+        else upper[start]
+    result[start] = old
+    start += 1
+    # Comparisons with NaN are False, so old is held.
+    invalid = np.isnan(floats)
+    lower_bound = np.where(invalid, -np.inf, lower)
+    upper_bound = np.where(invalid, np.inf, upper)
+    while start < len(values):
+        stop = min(start + chunk_size, len(values))
+        scanned = _clamp_scan(old, lower_bound[start:stop],
+                              upper_bound[start:stop])
+        previous = np.concatenate(([old], scanned[:-1]))
+        difference = floats[start:stop] - previous
+        expected = np.where(difference > quarter_range, lower[start:stop],
+                            np.where(difference < -quarter_range,
+                                     upper[start:stop], previous))
+        differs = (expected != scanned) | \
+            (np.signbit(expected) != np.signbit(scanned))
+        correct = np.argmax(differs) if differs.any() else len(scanned)
+        result[start:start + correct] = scanned[:correct]
+        if correct < len(scanned):
+            old = expected[correct]
+            result[start + correct] = old
+            start += correct + 1
+        else:
+            old = scanned[-1]
+            start = stop
+    return result
+
+
+def _hysteresis_hold(values, old, quarter_range, window=64):
+    '''
+    Finds where values first differ from old by more than quarter_range,
+    searching windows of increasing size.
+
+    :returns: Index of the first difference or len(values) if none.
+    :rtype: int
+    '''
+    index = 0
+    while index < len(values):
+        difference = values[index:index + window] - old
+        exceeded = (difference > quarter_range) | \
+            (difference < -quarter_range)
+        if exceeded.any():
+            return index + np.argmax(exceeded)
+        index += window
+        window *= 2
+    return len(values)
+
+
+def _clamp_scan(initial, lower, upper):
+    '''
+    Clamps a value between each lower and upper bound in turn, returning
+    the value after each clamp. A clamp followed by a clamp is a clamp, so
+    the clamps are composed by recursive doubling in log2(n) vectorised
+    steps.
+
+    :param initial: Value before the first clamp.
+    :type initial: float
+    :type lower: np.ndarray
+    :type upper: np.ndarray
+    :rtype: np.ndarray
+    '''
+    lower = lower.copy()
+    upper = upper.copy()
+    shift = 1
+    while shift < len(lower):
+        # Compose the clamps ending shift samples earlier with each clamp.
+        earlier_lower = lower[:-shift]
+        earlier_upper = upper[:-shift]
+        later_lower = lower[shift:]
+        later_upper = upper[shift:]
+        composed_lower = np.minimum(np.maximum(earlier_lower, later_lower),
+                                    later_upper)
+        upper[shift:] = np.minimum(np.maximum(earlier_upper, later_lower),
+                                   later_upper)
+        lower[shift:] = composed_lower
+        shift *= 2
+    return np.minimum(np.maximum(initial, lower), upper)
+
+
 def ils_established(array, _slice, hz, point='established'):
     '''
     Helper function for ILS established computations
@@ -3481,6 +3799,33 @@ def is_index_within_slices(index, slices):
     return False
 
 
+def indices_within_slices(indices, slices):
+    '''
+    Vectorised is_index_within_slices.
+
+    :type indices: np.ndarray
+    :type slices: [slice]
+    :returns: whether each index is within any of the slices.
+    :rtype: np.ndarray(dtype=bool)
+    '''
+    indices = np.asarray(indices, dtype=float)
+    within = np.zeros(indices.shape, dtype=bool)
+    for _slice in slices:
+        negative_step = _slice.step is not None and _slice.step < 0
+        if _slice.start is None and _slice.stop is None:
+            within[:] = True
+            break
+        condition = np.ones(indices.shape, dtype=bool)
+        if _slice.start is not None:
+            condition &= (indices <= _slice.start) if negative_step \
+                else (indices >= _slice.start)
+        if _slice.stop is not None:
+            condition &= (indices > _slice.stop) if negative_step \
+                else (indices < _slice.stop)
+        within |= condition
+    return within
+
+
 def filter_slices_length(slices, length):
     '''
     :param slices: List of slices to filter.
@@ -3642,6 +3987,222 @@ def slices_overlap(first_slice, second_slice):
            ((first_slice.stop is None) or ((second_slice.start or 0) < first_slice.stop))
 
 
+class IntervalSet(object):
+    '''
+    Set of half-open intervals [start, stop) of indices held as NumPy arrays
+    of starts and stops, for set operations on many slices at once.
+
+    The intervals are ordered by start and do not overlap. Intervals which
+    only touch are kept apart, as with slices_or. Limits keep their type, so
+    intervals of integer slices remain integers.
+    '''
+
+    def __init__(self, starts=(), stops=()):
+        '''
+        :param starts: Start of each interval.
+        :type starts: iterable of int or float
+        :param stops: Stop of each interval.
+        :type stops: iterable of int or float
+        '''
+        starts = np.asarray(starts)
+        stops = np.asarray(stops)
+        if starts.size == 0:
+            starts = stops = np.array([], dtype=np.int64)
+        dtype = np.result_type(starts, stops)
+        starts = starts.astype(dtype)
+        stops = stops.astype(dtype)
+        non_empty = starts < stops
+        starts = starts[non_empty]
+        stops = stops[non_empty]
+        order = np.argsort(starts, kind='mergesort')
+        starts = starts[order]
+        stops = stops[order]
+        if len(starts):
+            # Merge intervals overlapping those before them.
+            reach = np.maximum.accumulate(stops)
+            first = np.concatenate(([True], starts[1:] >= reach[:-1]))
+            stops = np.maximum.reduceat(stops, np.flatnonzero(first))
+            starts = starts[first]
+        self.starts = starts
+        self.stops = stops
+
+    @classmethod
+    def from_slices(cls, slices):
+        '''
+        :param slices: Slices with a step of 1, or a SectionNode.
+        :type slices: [slice] or SectionNode
+        :raises ValueError: If a slice has a step other than 1 or no start or stop.
+        :rtype: IntervalSet
+        '''
+        if hasattr(slices, 'get_slices'):
+            slices = slices.get_slices()
+        slices = [s for s in slices if s is not None]
+        if any(s.step not in (None, 1) for s in slices):
+            raise ValueError('IntervalSet requires slices with a step of 1')
+        if any(s.start is None or s.stop is None for s in slices):
+            raise ValueError('IntervalSet requires slices with a start and stop')
+        return cls([s.start for s in slices], [s.stop for s in slices])
+
+    def to_slices(self):
+        '''
+        :returns: Slice of each interval.
+        :rtype: [slice]
+        '''
+        return [slice(start, stop) for start, stop in
+                zip(self.starts.tolist(), self.stops.tolist())]
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __iter__(self):
+        return iter(self.to_slices())
+
+    def __eq__(self, other):
+        return isinstance(other, IntervalSet) and \
+            np.array_equal(self.starts, other.starts) and \
+            np.array_equal(self.stops, other.stops)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return '%s(%s)' % (self.__class__.__name__, self.to_slices())
+
+    def durations(self, hz=1):
+        '''
+        :param hz: Frequency of the indices.
+        :type hz: int or float
+        :returns: Duration of each interval.
+        :rtype: np.ndarray
+        '''
+        return (self.stops - self.starts) / float(hz)
+
+    def union(self, other):
+        '''
+        :type other: IntervalSet
+        :returns: Indices within either set.
+        :rtype: IntervalSet
+        '''
+        return IntervalSet(np.concatenate((self.starts, other.starts)),
+                           np.concatenate((self.stops, other.stops)))
+
+    def intersection(self, other):
+        '''
+        :type other: IntervalSet
+        :returns: Indices within both sets.
+        :rtype: IntervalSet
+        '''
+        # The intervals of other overlapping each interval. Both starts and
+        # stops are ordered as intervals do not overlap.
+        first = np.searchsorted(other.stops, self.starts, side='right')
+        last = np.searchsorted(other.starts, self.stops, side='left')
+        counts = np.maximum(last - first, 0)
+        others, positions = _run_indices(first, counts)
+        selves = np.repeat(np.arange(len(self)), counts)
+        return IntervalSet(np.maximum(self.starts[selves],
+                                      other.starts[others]),
+                           np.minimum(self.stops[selves],
+                                      other.stops[others]))
+
+    def complement(self, begin, end):
+        '''
+        :param begin: Start of the range to complement within.
+        :type begin: int or float
+        :param end: Stop of the range to complement within.
+        :type end: int or float
+        :returns: Indices within begin and end which are not within the set.
+        :rtype: IntervalSet
+        '''
+        starts = np.concatenate(([begin], self.stops))
+        stops = np.concatenate((self.starts, [end]))
+        return IntervalSet(np.clip(starts, begin, end),
+                           np.clip(stops, begin, end))
+
+    def difference(self, other):
+        '''
+        :type other: IntervalSet
+        :returns: Indices within the set but not within other.
+        :rtype: IntervalSet
+        '''
+        if not len(self):
+            return self
+        return self.intersection(other.complement(self.starts[0],
+                                                  self.stops[-1]))
+
+    __or__ = union
+    __and__ = intersection
+    __sub__ = difference
+
+    def remove_small_gaps(self, time_limit=10, hz=1, count=None):
+        '''
+        Joins intervals separated by gaps shorter than the limit.
+
+        :param time_limit: Tolerance below which intervals will be joined.
+        :type time_limit: int or float (sec)
+        :param hz: Frequency of the indices.
+        :type hz: int or float
+        :param count: Tolerance based on count, not time.
+        :type count: int or None
+        :rtype: IntervalSet
+        '''
+        if len(self) < 2:
+            return self
+        sample_limit = count if count is not None else time_limit * hz
+        joined = self.starts[1:] - self.stops[:-1] < sample_limit
+        first = np.concatenate(([True], ~joined))
+        last = np.concatenate((~joined, [True]))
+        return IntervalSet(self.starts[first], self.stops[last])
+
+    def remove_small_slices(self, time_limit=10, hz=1, count=None):
+        '''
+        Removes intervals no longer than the limit.
+
+        :param time_limit: Tolerance below which intervals will be removed.
+        :type time_limit: int or float (sec)
+        :param hz: Frequency of the indices.
+        :type hz: int or float
+        :param count: Tolerance based on count, not time.
+        :type count: int or None
+        :rtype: IntervalSet
+        '''
+        sample_limit = count if count is not None else time_limit * hz
+        keep = self.stops - self.starts > sample_limit
+        return IntervalSet(self.starts[keep], self.stops[keep])
+
+
+def _integer_slices(slices):
+    '''
+    :type slices: [slice]
+    :returns: Whether all slices have non-negative integer limits and a step
+        of 1.
+    :rtype: bool
+    '''
+    integers = six.integer_types + (np.integer,)
+    return all(isinstance(s, slice) and s.step in (None, 1) and
+               isinstance(s.start, integers) and
+               isinstance(s.stop, integers) and
+               s.start >= 0 and s.stop >= 0 for s in slices)
+
+
+def _interval_slices(slices):
+    '''
+    Starts and stops of slices which an IntervalSet holds unchanged:
+    non-empty slices with non-negative integer limits and a step of 1,
+    ordered by start and not overlapping.
+
+    :type slices: [slice]
+    :returns: Starts and stops or None if the slices would be changed.
+    :rtype: (np.ndarray, np.ndarray) or None
+    '''
+    if not _integer_slices(slices):
+        return None
+    starts = np.array([s.start for s in slices], dtype=np.int64)
+    stops = np.array([s.stop for s in slices], dtype=np.int64)
+    if np.any(starts >= stops) or np.any(starts[1:] < stops[:-1]):
+        return None
+    return starts, stops
+
+
 def slices_overlap_merge(first_list, second_list, extend_stop=0):
     '''
     Where slices from the second list overlap the first, the first slice is
@@ -3655,6 +4216,27 @@ def slices_overlap_merge(first_list, second_list, extend_stop=0):
     :param extend_stop: Increment at stop end of the resulting slices_above
     :type extend_stop: Integer
     '''
+    first_list = list(first_list)
+    second_list = list(second_list)
+    second = _interval_slices(second_list)
+    if second is not None and _integer_slices(first_list):
+        # The first overlapping slice is the first to stop after the start.
+        second_starts, second_stops = second
+        candidates = np.searchsorted(
+            second_stops, [s.start for s in first_list], side='right')
+        result_list = []
+        for first_slice, candidate in zip(first_list, candidates.tolist()):
+            if candidate < len(second_starts) and \
+                    second_list[candidate].start < first_slice.stop:
+                second_slice = second_list[candidate]
+                result_list.append(slice(min(first_slice.start, second_slice.start),
+                                         max(first_slice.stop, second_slice.stop) + extend_stop))
+            elif extend_stop:
+                result_list.append(slice(first_slice.start, first_slice.stop + extend_stop))
+            else:
+                result_list.append(first_slice)
+        return result_list
+
     result_list = []
 
     for first_slice in first_list:
@@ -3687,6 +4269,13 @@ def slices_and(first_list, second_list):
 
     :returns: List of slices where first and second lists overlap.
     '''
+    first_list = list(first_list)
+    first = _interval_slices(first_list)
+    second = _interval_slices(second_list) if first is not None else None
+    if second is not None:
+        # Ordered slices which do not overlap intersect in the same order.
+        return (IntervalSet(*first) & IntervalSet(*second)).to_slices()
+
     def fwd(_slice):
         if (_slice.step is not None and _slice.step < 0):
             return slice(_slice.stop+1, max(_slice.start+1,0), -_slice.step)
@@ -3769,6 +4358,13 @@ def slices_not(slice_list, begin_at=None, end_at=None):
     if end_at is not None and end_at > endpoint:
         endpoint = end_at
 
+    integers = six.integer_types + (np.integer,)
+    # The loop below returns an empty slice when the range is empty.
+    if _integer_slices(slice_list) and isinstance(startpoint, integers) and \
+            isinstance(endpoint, integers) and startpoint < endpoint:
+        return IntervalSet.from_slices(slice_list).complement(
+            startpoint, endpoint).to_slices()
+
     workspace = np.ma.zeros(endpoint)
     for each_slice in slice_list:
         workspace[each_slice] = 1
@@ -4982,8 +5578,7 @@ def nearest_neighbour_mask_repair(array, copy=True, repair_gap_size=None, direct
     """
     if direction not in ('both', 'forward', 'backward'):
         raise ValueError('Unexpected direction value provided: %s' % direction)
-    if copy:
-        array = array.copy()
+    array = writeable(array, copy=copy)
     def next_neighbour(start=1):
         """
         Generates incrementing positive and negative pairs from start
@@ -5030,8 +5625,7 @@ def normalise(array, normalise_max=1.0, scale_max=None, copy=True, axis=None):
     :returns: Array containing normalised values.
     :rtype: np.ma.masked_array
     """
-    if copy:
-        array = array.copy()
+    array = writeable(array, copy=copy)
     scaling = normalise_max / (scale_max or array.max(axis=axis))
     if axis == 1:
         # transpose
@@ -5665,6 +6259,97 @@ def fill_masked_edges(array, fill_value):
     return array
 
 
+def read_only_view(array):
+    '''
+    Create a view of a masked array whose data and mask cannot be modified.
+    The array itself remains writeable.
+
+    :param array: Array to create a view of.
+    :type array: np.ma.MaskedArray
+    :returns: Read-only view sharing the data and mask of array.
+    :rtype: np.ma.MaskedArray
+    '''
+    view = array.view()
+    view.flags.writeable = False
+    mask = np.ma.getmask(array)
+    if mask is not np.ma.nomask:
+        mask = mask.view()
+        mask.flags.writeable = False
+        view._mask = mask
+        # Raise rather than copying the mask when modified.
+        view._sharedmask = False
+    return view
+
+
+def writeable(array, copy=False):
+    '''
+    Copy-on-write access to an array. Functions which modify arrays in place
+    use this so that read-only arrays (see settings.READ_ONLY_DEPENDENCIES)
+    are copied rather than modified.
+
+    :param array: Array to be modified.
+    :type array: np.ma.MaskedArray
+    :param copy: Whether to always copy array.
+    :type copy: bool
+    :returns: array if it can be modified, otherwise a copy of array.
+    :rtype: np.ma.MaskedArray
+    '''
+    mask = np.ma.getmask(array)
+    if copy or not array.flags.writeable or (
+            mask is not np.ma.nomask and not mask.flags.writeable):
+        return array.copy()
+    return array
+
+
+def _run_indices(starts, durations):
+    '''
+    :type starts: np.ndarray of int
+    :type durations: np.ndarray of int
+    :returns: Concatenated indices of each run and the position of each index
+        within its run.
+    :rtype: (np.ndarray, np.ndarray)
+    '''
+    offsets = np.cumsum(durations) - durations
+    positions = np.arange(np.sum(durations)) - np.repeat(offsets, durations)
+    return np.repeat(starts, durations) + positions, positions
+
+
+def _interpolate_sections(array, starts, lengths, start_values,
+                          stop_values):
+    '''
+    Interpolates linearly across sections of the array in place. Each
+    section's values are bit-identical to
+    np.linspace(start_value, stop_value, length + 2)[1:-1].
+
+    :type array: np.ma.MaskedArray
+    :type starts: np.ndarray of int
+    :type lengths: np.ndarray of int
+    :param start_values: Value before each section.
+    :type start_values: np.ndarray
+    :param stop_values: Value after each section.
+    :type stop_values: np.ndarray
+    '''
+    if not len(starts):
+        return
+    dtype = np.linspace(start_values[0], stop_values[0], 0).dtype
+    indices, positions = _run_indices(starts, lengths)
+    start_values = start_values.astype(dtype)
+    delta = stop_values.astype(dtype) - start_values
+    divisions = (lengths + 1).astype(dtype)
+    steps = delta / divisions
+    values = (positions + 1).astype(dtype)
+    if np.any(steps == 0):
+        # linspace divides before multiplying by denormal steps.
+        denormal = np.repeat(steps == 0, lengths)
+        values[denormal] /= np.repeat(divisions, lengths)[denormal]
+        values *= np.repeat(np.where(steps == 0, delta, steps), lengths)
+    else:
+        values *= np.repeat(steps, lengths)
+    values += np.repeat(start_values, lengths)
+    array.data[indices] = values
+    array.mask[indices] = False
+
+
 def repair_mask(array, frequency=1, repair_duration=REPAIR_DURATION,
                 copy=False, extrapolate=False, repair_above=None,
                 method='interpolate', raise_duration_exceedance=False,
@@ -5674,7 +6359,7 @@ def repair_mask(array, frequency=1, repair_duration=REPAIR_DURATION,
     It is not intended to be used for key point computations, where invalid data
     should remain masked.
 
-    :param copy: If True, returns modified copy of array, otherwise modifies the array in-place.
+    :param copy: If True, returns modified copy of array, otherwise modifies the array in-place (read-only arrays are copied).
     :param method: Repair method to apply in masked sections, either interpolate, fill_start (fill with value at start of masked section), fill_stop (fill with stop of masked section).
     :param raise_entirely_masked: If True, an exception is raised if the incoming data is entirely masked.
     :param repair_duration: If None, any length of masked data will be repaired.
@@ -5693,58 +6378,74 @@ def repair_mask(array, frequency=1, repair_duration=REPAIR_DURATION,
         # Array entirely unmasked - nothing to do.
         return array
 
-    if copy:
-        array = array.copy()
+    array = writeable(array, copy=copy)
 
     if repair_duration:
         repair_samples = repair_duration * frequency
     else:
         repair_samples = None
 
-    masked_sections = np.ma.clump_masked(array)
-
-    for section in masked_sections:
-        length = section.stop - section.start
-        if repair_samples and length > repair_samples:
-            if raise_duration_exceedance:
-                raise ValueError("Length of masked section '%s' exceeds "
-                                 "repair duration '%s'." % (length * frequency,
-                                                            repair_duration))
-            else:
-                continue # Too long to repair
-        elif section.start == 0:
-            if extrapolate or method == 'fill_stop':
-                # TODO: Does it make sense to subtract 1 from the section stop??
-                #array.data[section] = array.data[section.stop - 1]
-                array[section] = array[section.stop]
-            else:
-                continue # Can't interpolate if we don't know the first sample
-
-        elif section.stop == len(array):
-            if extrapolate or method == 'fill_start':
-                array[section] = array[section.start - 1]
-            else:
-                continue # Can't interpolate if we don't know the last sample
-
-        else:
-            start_value = array[section.start - 1]
-            stop_value = array[section.stop]
-            if method == 'interpolate':
-                if (repair_above is None or
-                    (start_value > repair_above and stop_value > repair_above)):
-                    # XXX: Find neater solution, potentially
-                    # scipy.interpolate.InterpolatedUnivariateSpline, as
-                    # optimisation.
-                    array.data[section] = np.linspace(start_value, stop_value,
-                                                      length+2)[1:-1]
-                    array.mask[section] = False
-            elif method == 'fill_start':
-                array[section] = start_value
-            elif method == 'fill_stop':
-                array[section] = stop_value
-            else:
-                raise NotImplementedError('Repair method %s not implemented.',
-                                          method)
+    # All masked sections are repaired at once. Sections are separated by
+    # unmasked samples, so each repair is independent of the others.
+    bounded = np.concatenate(([False], np.ma.getmaskarray(array), [False]))
+    changes = np.flatnonzero(np.diff(bounded.astype(np.int8)))
+    starts = changes[::2]
+    stops = changes[1::2]
+    lengths = stops - starts
+    first = starts == 0
+    last = stops == len(array)
+    interior = ~first & ~last
+    if repair_samples:
+        too_long = lengths > repair_samples
+    else:
+        too_long = np.zeros(len(starts), dtype=bool)
+
+    # Sections before the first which raises an exception are repaired.
+    raising = np.zeros(len(starts), dtype=bool)
+    if raise_duration_exceedance:
+        raising |= too_long
+    if method not in ('interpolate', 'fill_start', 'fill_stop'):
+        raising |= interior & ~too_long
+    repaired = ~too_long
+    if raising.any():
+        repaired[np.argmax(raising):] = False
+
+    # Can't interpolate at the start or end of the array without knowing the
+    # first or last sample.
+    fill_stop = first & repaired & (extrapolate or method == 'fill_stop')
+    fill_start = last & repaired & (extrapolate or method == 'fill_start')
+    interior &= repaired
+    if method == 'fill_start':
+        fill_start |= interior
+    elif method == 'fill_stop':
+        fill_stop |= interior
+    elif method == 'interpolate':
+        start_values = array.data[starts[interior] - 1]
+        stop_values = array.data[stops[interior]]
+        if repair_above is not None:
+            above = (start_values > repair_above) & \
+                (stop_values > repair_above)
+            start_values = start_values[above]
+            stop_values = stop_values[above]
+            interior[interior] = above
+        _interpolate_sections(array, starts[interior], lengths[interior],
+                              start_values, stop_values)
+
+    for fill, sources in ((fill_start, starts - 1), (fill_stop, stops)):
+        if fill.any():
+            indices = _run_indices(starts[fill], lengths[fill])[0]
+            array[indices] = np.repeat(array.data[sources[fill]],
+                                       lengths[fill])
+
+    if raising.any():
+        section = np.argmax(raising)
+        if too_long[section]:
+            raise ValueError("Length of masked section '%s' exceeds "
+                             "repair duration '%s'." % (
+                                 lengths[section] * frequency,
+                                 repair_duration))
+        raise NotImplementedError('Repair method %s not implemented.',
+                                  method)
 
     return array
 
@@ -6964,20 +7665,30 @@ def smooth_track_cost_function(lat_s, lon_s, lat, lon, ac_type, hz):
     from_straight = np.sum(np.convolve(lat_s,slider,'valid')**2) + \
         np.sum(np.convolve(lon_s,slider,'valid')**2)
 
+    cost = from_data + smooth_track_weight(ac_type, hz)*from_straight
+    return cost
+
+
+def smooth_track_weight(ac_type, hz):
+    '''
+    :param ac_type: Aircraft type attribute (aeroplane or helicopter).
+    :type ac_type: Attribute or None
+    :param hz: Sample rate of the latitude and longitude.
+    :type hz: float
+    :returns: Weight of the deviation from a straight line relative to the deviation from the recorded data within smooth_track_cost_function.
+    :rtype: int
+    '''
     if ac_type and ac_type.value=='helicopter':
-        weight = 100 # As helicopters fly more slowly so we don't need such smoothing.
+        return 100 # As helicopters fly more slowly so we don't need such smoothing.
     elif hz == 1.0:
-        weight = 1000
+        return 1000
     elif hz == 0.5:
-        weight = 300
+        return 300
     elif hz == 0.25:
-        weight = 100
+        return 100
     else:
         raise ValueError('Lat/Lon sample rate not recognised in smooth_track_cost_function.')
 
-    cost = from_data + weight*from_straight
-    return cost
-
 
 def smooth_signal(array, window_len=11, window='hanning'):
     """
@@ -7035,13 +7746,53 @@ def smooth_signal(array, window_len=11, window='hanning'):
     return np.ma.MaskedArray(out[extra_start:-(extra-extra_start)], array.mask)
 
 
-def smooth_track(lat, lon, ac_type, hz):
+def _smooth_track_banded(array, weight):
+    '''
+    Minimise the smooth_track_cost_function terms of one coordinate with the
+    first and last two samples held at their recorded values.
+
+    Setting the gradient of the cost to zero gives the normal equations
+    (I + weight * D'D) s = array, where D takes second differences. For the
+    samples between the held ends the matrix is symmetric, positive definite
+    and pentadiagonal with constant diagonals, so the optimum is found with a
+    single banded Cholesky solve.
+
+    :param array: Recorded coordinate, at least six samples long.
+    :type array: np.ndarray
+    :param weight: Weight of the second differences (see smooth_track_weight).
+    :type weight: int
+    :returns: Smoothed coordinate.
+    :rtype: np.ndarray
+    '''
+    array = np.asarray(array, dtype=np.float64)
+    size = len(array) - 4
+    # Move the terms of the held ends to the right hand side.
+    ends = array.copy()
+    ends[2:-2] = 0.0
+    slider = np.array([1.0, -2.0, 1.0])
+    ends = np.convolve(np.convolve(ends, slider, 'valid'), slider, 'full')
+    # Upper form of the banded matrix for solveh_banded.
+    bands = np.empty((3, size))
+    bands[0] = weight
+    bands[1] = -4.0 * weight
+    bands[2] = 1.0 + 6.0 * weight
+    smoothed = array.copy()
+    smoothed[2:-2] = solveh_banded(
+        bands, array[2:-2] - weight * ends[2:-2], check_finite=False)
+    return smoothed
+
+
+def smooth_track(lat, lon, ac_type, hz, method='banded'):
     """
     Input:
     lat = Recorded latitude array
     lon = Recorded longitude array
     ac_type = aircraft type (aeroplane or helicopter)
     hz = sample rate
+    method = 'banded' to solve for the minimum of the cost function directly,
+             or 'iterative' to approach it by repeated convolution until the
+             cost stops decreasing. In both cases the first and last two
+             samples are unchanged.
 
     Returns:
     lat_last = Optimised latitude array
@@ -7052,6 +7803,18 @@ def smooth_track(lat, lon, ac_type, hz):
     if len(lat) <= 5:
         return lat, lon, 0.0 # Polite return of data too short to smooth.
 
+    if method == 'banded':
+        weight = smooth_track_weight(ac_type, hz)
+        lat_last = np.ma.copy(lat)
+        lon_last = np.ma.copy(lon)
+        lat_last.data[:] = _smooth_track_banded(lat_last.data, weight)
+        lon_last.data[:] = _smooth_track_banded(lon_last.data, weight)
+        cost = smooth_track_cost_function(lat_last, lon_last, lat, lon,
+                                          ac_type, hz)
+        return lat_last, lon_last, cost
+    elif method != 'iterative':
+        raise ValueError("Unrecognised smooth_track method '%s'." % method)
+
     lat_s = np.ma.copy(lat)
     lon_s = np.ma.copy(lon)
 
@@ -7148,8 +7911,7 @@ def straighten(array, estimate, limit, copy):
     :returns: Straightened parameter
     :rtype: numpy masked array
     '''
-    if copy:
-        array = array.copy()
+    array = writeable(array, copy=copy)
     last_value = None
     for clump in np.ma.clump_unmasked(array):
         start_value = array[clump.start]
@@ -7380,6 +8142,40 @@ def index_closest_value(array, threshold, _slice=slice(None)):
     return index_at_value(array, threshold, _slice, endpoint='closing')
 
 
+def _index_at_value_limits(max_index, _slice):
+    '''
+    Arrange the limits of the scan of index_at_value, ensuring that we stay
+    inside the array.
+
+    :param max_index: Length of the array.
+    :type max_index: int
+    :type _slice: slice
+    :returns: Index the scan begins and ends at, step and slices of the left
+        and right samples of each pair of samples scanned.
+    :rtype: (int, int, int, slice, slice)
+    :raises ValueError: If the slice's step is not 1 or -1.
+    '''
+    step = _slice.step or 1
+    if step == 1:
+        begin = max(int(round(_slice.start or 0)), 0)
+        end = min(int(round(_slice.stop or max_index)), max_index)
+        left, right = slice(begin, end - 1, step), slice(begin + 1, end,step)
+
+    elif step == -1:
+        begin = min(int(round(_slice.start or max_index)), max_index-1)
+        # Indexing from the end of the array results in an array length
+        # mismatch. There is a failing test to cover this case which may work
+        # with array[:end:-1] construct, but using slices appears insoluble.
+        end = max(int(_slice.stop or 0),0)
+        left = slice(begin, end, step)
+        right = slice(begin - 1, end - 1 if end > 0 else None, step)
+
+    else:
+        raise ValueError('Step length not 1 in index_at_value')
+
+    return begin, end, step, left, right
+
+
 def index_at_value(array, threshold, _slice=slice(None), endpoint='exact'):
     '''
     This function seeks the moment when the parameter in question first crosses
@@ -7406,26 +8202,7 @@ def index_at_value(array, threshold, _slice=slice(None), endpoint='exact'):
     :returns type: Float or None
     '''
     assert endpoint in ['exact', 'closing', 'nearest', 'first_closing']
-    step = _slice.step or 1
-    max_index = len(array)
-
-    # Arrange the limits of our scan, ensuring that we stay inside the array.
-    if step == 1:
-        begin = max(int(round(_slice.start or 0)), 0)
-        end = min(int(round(_slice.stop or max_index)), max_index)
-        left, right = slice(begin, end - 1, step), slice(begin + 1, end,step)
-
-    elif step == -1:
-        begin = min(int(round(_slice.start or max_index)), max_index-1)
-        # Indexing from the end of the array results in an array length
-        # mismatch. There is a failing test to cover this case which may work
-        # with array[:end:-1] construct, but using slices appears insoluble.
-        end = max(int(_slice.stop or 0),0)
-        left = slice(begin, end, step)
-        right = slice(begin - 1, end - 1 if end > 0 else None, step)
-
-    else:
-        raise ValueError('Step length not 1 in index_at_value')
+    begin, end, step, left, right = _index_at_value_limits(len(array), _slice)
 
     if begin == end:
         logger.warning('No range for seek function to scan across')
@@ -7510,6 +8287,164 @@ def index_at_value(array, threshold, _slice=slice(None), endpoint='exact'):
     return (begin + step * (n + r))
 
 
+def index_at_values(array, thresholds, _slice=slice(None), endpoint='exact'):
+    '''
+    index_at_value for many thresholds within the same slice of an array. The
+    array is indexed once (see ValueCrossings) and the crossings of all the
+    thresholds are found together.
+
+    :param array: input data
+    :type array: masked array
+    :param thresholds: values that we expect the array to cross in this slice.
+    :type thresholds: [float]
+    :param _slice: slice where we want to seek the threshold transits.
+    :type _slice: slice
+    :param endpoint: type of end condition being sought (see index_at_value).
+    :type endpoint: str
+    :returns: index_at_value of each threshold.
+    :rtype: [float or None]
+    '''
+    if not len(thresholds):
+        return []
+    return ValueCrossings(array, _slice).indices_at_values(thresholds,
+                                                           endpoint=endpoint)
+
+
+class ValueCrossings(object):
+    '''
+    Index of where an array crosses values within a slice, which answers
+    index_at_value for any number of thresholds.
+
+    index_at_value finds the first pair of unmasked samples within the slice
+    whose values span the threshold. Within a run of unmasked samples, the
+    values spanned by the pairs up to each sample are the running minimum
+    and maximum of the run, which only ever extend. The first crossing of a
+    threshold within each run is therefore found by binary search of the
+    running minimum (thresholds below the first value of the run) or the
+    running maximum (thresholds above).
+
+    Thresholds which are not crossed are passed to index_at_value for the
+    'closing', 'first_closing' and 'nearest' endpoints.
+    '''
+
+    def __init__(self, array, _slice=slice(None)):
+        '''
+        :param array: input data
+        :type array: masked array
+        :param _slice: slice to seek threshold transits within. The step may
+            be 1 or -1 (to scan backwards).
+        :type _slice: slice
+        '''
+        self.array = array
+        self.slice = _slice
+        self._runs = None
+        try:
+            self._begin, end, self._step, left, right = \
+                _index_at_value_limits(len(array), _slice)
+        except ValueError:
+            return
+        if self._begin == end or (_slice.stop == _slice.start and
+                                  _slice.start is not None):
+            # No range to scan across.
+            return
+        # Samples in the order they are scanned.
+        if self._step == 1:
+            samples = array[self._begin:end]
+        else:
+            samples = array[self._begin:end - 1 if end > 0 else None:-1]
+        if len(samples) < 2:
+            return
+
+        data = np.ma.getdata(samples)
+        mask = np.ma.getmaskarray(samples)
+        nan = np.isnan(data) if data.dtype.kind == 'f' else \
+            np.zeros(len(data), dtype=bool)
+        # index_at_value treats unmasked pairs including NaN as crossings of
+        # any threshold.
+        nan_pairs = np.flatnonzero(~mask[:-1] & ~mask[1:] &
+                                   (nan[:-1] | nan[1:]))
+        self._nan_pair = nan_pairs[0] if len(nan_pairs) else None
+
+        valid = ~mask & ~nan
+        bounded = np.concatenate(([False], valid[:-1] & valid[1:], [False]))
+        changes = np.flatnonzero(np.diff(bounded.astype(np.int8)))
+        self._runs = []
+        for start, stop in zip(changes[::2], changes[1::2]):
+            values = data[start:stop + 1]
+            self._runs.append((start, values[0],
+                               -np.minimum.accumulate(values),
+                               np.maximum.accumulate(values)))
+        self._data = data
+
+    def index_at_value(self, threshold, endpoint='exact'):
+        '''
+        :param threshold: the value that we expect the array to cross.
+        :type threshold: float
+        :param endpoint: type of end condition being sought (see library.index_at_value).
+        :type endpoint: str
+        :returns: interpolated index when the array values crossed the threshold.
+        :rtype: float or None
+        '''
+        return self.indices_at_values([threshold], endpoint=endpoint)[0]
+
+    def indices_at_values(self, thresholds, endpoint='exact'):
+        '''
+        :param thresholds: values that we expect the array to cross.
+        :type thresholds: [float]
+        :param endpoint: type of end condition being sought (see library.index_at_value).
+        :type endpoint: str
+        :returns: interpolated index when the array values crossed each threshold.
+        :rtype: [float or None]
+        '''
+        assert endpoint in ['exact', 'closing', 'nearest', 'first_closing']
+        if self._runs is None:
+            return [index_at_value(self.array, threshold, self.slice,
+                                   endpoint=endpoint)
+                    for threshold in thresholds]
+
+        threshold_values = list(thresholds)
+        thresholds = np.asarray(threshold_values)
+        pairs = np.full(len(thresholds), -1, dtype=np.int64)
+        unresolved = np.arange(len(thresholds))
+        for offset, first_value, negative_minimum, maximum in self._runs:
+            values = thresholds[unresolved]
+            below = values < first_value
+            ends = np.where(below,
+                            np.searchsorted(negative_minimum, -values),
+                            np.searchsorted(maximum, values))
+            # The first pair spans a threshold equal to the first value.
+            ends = np.maximum(ends, 1)
+            crossed = ends < len(maximum)
+            pairs[unresolved[crossed]] = offset + ends[crossed] - 1
+            unresolved = unresolved[~crossed]
+            if not len(unresolved):
+                break
+
+        crossed = pairs >= 0
+        if self._nan_pair is not None:
+            # Pairs including NaN are only found before a crossing.
+            pairs[crossed] = np.minimum(pairs[crossed], self._nan_pair)
+        a = self._data[pairs[crossed]]
+        b = self._data[pairs[crossed] + 1]
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            ratios = np.where(
+                np.isnan(a) | np.isnan(b) | (a == b), 0.5,
+                (thresholds[crossed].astype(np.float64) - a) / (b - a))
+        indices = self._begin + self._step * (pairs[crossed] + ratios)
+
+        results = []
+        crossings = iter(indices)
+        for threshold, threshold_crossed in zip(threshold_values, crossed):
+            if threshold_crossed:
+                results.append(next(crossings))
+            elif endpoint == 'exact':
+                results.append(None)
+            else:
+                results.append(index_at_value(self.array, threshold,
+                                              self.slice, endpoint=endpoint))
+        return results
+
+
 def index_at_value_or_level_off(array, frequency, value, _slice, abs_threshold=None):
     '''
     Find the index closest to the value unless it doesn't get within 10% of
@@ -7587,6 +8522,147 @@ def _value(array, _slice, operator, start_edge=None, stop_edge=None):
         return Value(None, None)
 
 
+def values_within_slices(array, slices, function, start_edges=None,
+                         stop_edges=None):
+    '''
+    Applies function (e.g. max_value) to the array within each slice.
+
+    max_value, min_value and max_abs_value are evaluated for all of the
+    slices in a single pass: the samples within the slices are gathered and
+    reduced per slice with ufunc.reduceat and the start and stop edges are
+    interpolated with value_at_indices. The results are those of calling the
+    function for each slice. Other functions, non-numeric arrays and slices
+    with a step or negative bounds are evaluated for each slice.
+
+    :param array: masked array
+    :type array: np.ma.array
+    :param slices: Slices to apply to the array.
+    :type slices: [slice]
+    :param function: Function returning a Value from the array within a slice, e.g. max_value.
+    :type function: function
+    :param start_edges: Index for precise start timing of each slice.
+    :type start_edges: [float or None] or None
+    :param stop_edges: Index for precise end timing of each slice.
+    :type stop_edges: [float or None] or None
+    :returns: Value named tuple of index and value for each slice.
+    :rtype: [Value]
+    '''
+    start_edges = list(start_edges or [None] * len(slices))
+    stop_edges = list(stop_edges or [None] * len(slices))
+    ufunc = _SLICE_VALUE_UFUNCS.get(function)
+    data = np.ma.getdata(array)
+
+    def per_slice():
+        return [function(array, _slice, start_edge=start_edge,
+                         stop_edge=stop_edge) for _slice, start_edge, stop_edge
+                in zip(slices, start_edges, stop_edges)]
+
+    if ufunc is None or data.dtype.kind not in 'iuf' or any(
+            _slice.step not in (None, 1) or
+            (_slice.start is not None and _slice.start < 0) or
+            (_slice.stop is not None and _slice.stop < 0)
+            for _slice in slices):
+        return per_slice()
+
+    if not slices:
+        return []
+
+    search_array = np.ma.abs(array) if function is max_abs_value else array
+    data = np.ma.getdata(search_array)
+    mask = np.ma.getmaskarray(search_array)
+    starts = np.empty(len(slices), dtype=np.int64)
+    stops = np.empty(len(slices), dtype=np.int64)
+    # Equivalent to the handling of sections within _value.
+    for number, _slice in enumerate(slices):
+        slice_start = _slice.start
+        slice_stop = _slice.stop
+        if slice_start and slice_start % 1:
+            start_edges[number] = slice_start
+            slice_start = ceil(slice_start)
+        if slice_stop and slice_stop % 1:
+            stop_edges[number] = slice_stop
+            slice_stop = floor(slice_stop)
+        starts[number] = slice_start or 0
+        stops[number] = len(data) if slice_stop is None else slice_stop
+    starts = np.minimum(starts, len(data))
+    lengths = np.maximum(np.minimum(stops, len(data)) - starts, 0)
+
+    # Gather the samples within each slice so that reduceat reduces each
+    # slice separately, even where the slices overlap.
+    searched = lengths > 0
+    offsets = np.cumsum(lengths) - lengths
+    indices = _run_indices(starts, lengths)[0]
+    positions = np.arange(len(indices))
+    gathered_mask = mask[indices]
+    if data.dtype.kind == 'f' and np.isnan(data[indices][~gathered_mask]).any():
+        # NaN breaks the comparison with the reduced values.
+        return per_slice()
+    fill_value = (np.ma.maximum_fill_value if ufunc is np.maximum
+                  else np.ma.minimum_fill_value)(data)
+    gathered = np.where(gathered_mask, fill_value, data[indices])
+
+    found = np.zeros(len(slices), dtype=bool)
+    value_indices = np.zeros(len(slices), dtype=np.int64)
+    if searched.any():
+        reduce_offsets = offsets[searched]
+        found[searched] = np.add.reduceat(~gathered_mask, reduce_offsets) > 0
+        extremes = ufunc.reduceat(gathered, reduce_offsets)
+        # The first sample of each slice equal to its extreme value, matching
+        # argmax and argmin.
+        hits = (gathered == np.repeat(extremes, lengths[searched])) & \
+            ~gathered_mask
+        first = np.minimum.reduceat(np.where(hits, positions, len(positions)),
+                                    reduce_offsets)
+        value_indices[searched] = indices[np.minimum(first,
+                                                     len(positions) - 1)]
+    if not found.any():
+        return [Value(None, None)] * len(slices)
+
+    # Candidate values of each slice are its start edge, the extreme value
+    # within the slice and its stop edge.
+    edges = np.array([[edge or np.nan for edge in start_edges],
+                      [edge or np.nan for edge in stop_edges]],
+                     dtype=np.float64)
+    edge_values = value_at_indices(search_array, edges)
+    candidates = np.ma.column_stack([
+        edge_values[0],
+        np.ma.array(data[value_indices].astype(np.float64), mask=~found),
+        edge_values[1],
+    ])
+    candidate_mask = np.ma.getmaskarray(candidates)
+    filled = np.ma.getdata(candidates)
+    extremes = ufunc.reduce(np.where(candidate_mask, fill_value, filled),
+                            axis=1)
+    columns = np.argmax((filled == extremes[:, None]) & ~candidate_mask,
+                        axis=1)
+
+    values = []
+    for number, column in enumerate(columns):
+        if not found[number]:
+            values.append(Value(None, None))
+            continue
+        if column == 0:
+            index = start_edges[number]
+            value = edge_values[0][number]
+        elif column == 1:
+            index = value_indices[number]
+            value = data[index]
+        else:
+            index = stop_edges[number]
+            value = edge_values[1][number]
+        if function is max_abs_value:
+            value = array[index]  # Recover sign of the value.
+        values.append(Value(index, value))
+    return values
+
+
+_SLICE_VALUE_UFUNCS = {
+    max_abs_value: np.maximum,
+    max_value: np.maximum,
+    min_value: np.minimum,
+}
+
+
 def value_at_time(array, hz, offset, time_index):
     '''
     Finds the value of the data in array at the time given by the time_index.
@@ -7653,6 +8729,8 @@ def value_at_index(array, index, interpolate=True):
     :type interpolate: boolean
     :returns: interpolated value from the array
     '''
+    if np.ndim(index):
+        return value_at_indices(array, index, interpolate=interpolate)
 
     if index < 0.0:  # True if index is None
         return array[0]
@@ -7685,6 +8763,57 @@ def value_at_index(array, index, interpolate=True):
         return r * high_value + (1 - r) * low_value
 
 
+def value_at_indices(array, indices, interpolate=True):
+    '''
+    Finds the values of the data in array at many indices in a single pass.
+    Equivalent to calling value_at_index for each index, except that values
+    which value_at_index would return as None or masked are masked.
+
+    Samples outside the array boundaries are permitted and take the value of
+    the first or last sample.
+
+    :param array: input data
+    :type array: masked array
+    :param indices: indices into the array where we want to find the array
+        values. NaN indices are masked.
+    :type indices: list or np.array of float
+    :param interpolate: whether to interpolate the values at float indices.
+    :type interpolate: boolean
+    :returns: interpolated values from the array.
+    :rtype: np.ma.array of float
+    '''
+    indices = np.asarray(indices, dtype=np.float64)
+    if not len(array):
+        return np.ma.masked_all(indices.shape)
+
+    invalid = np.isnan(indices)
+    clipped = np.clip(np.where(invalid, 0, indices), 0, len(array) - 1)
+    low = clipped.astype(np.int64)
+    high = np.minimum(low + 1, len(array) - 1)
+    r = clipped - low
+    exact = r == 0
+
+    data = np.ma.getdata(array)
+    mask = np.ma.getmaskarray(array)
+    low_value = data[low].astype(np.float64)
+    high_value = data[high].astype(np.float64)
+    low_mask = mask[low]
+    high_mask = mask[high]
+
+    if interpolate:
+        with np.errstate(invalid='ignore', over='ignore'):
+            values = r * high_value + (1 - r) * low_value
+    else:
+        # Nearest sample, rounding half up.
+        values = np.where(r >= 0.5, high_value, low_value)
+    # Where only one of the samples is masked, use the other.
+    values = np.where(exact, low_value, values)
+    values = np.where(~exact & low_mask & ~high_mask, high_value, values)
+    values = np.where(~exact & high_mask & ~low_mask, low_value, values)
+    result_mask = np.where(exact, low_mask, low_mask & high_mask) | invalid
+    return np.ma.array(values, mask=result_mask)
+
+
 def vstack_params(*params):
     '''
     Create a multi-dimensional masked array with a dimension per param.
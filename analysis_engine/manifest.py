@@ -0,0 +1,253 @@
+'''
+Manifest of the Nodes defined within node modules, allowing the node
+registry to be built and processing to be planned without importing the
+modules which define the Nodes.
+
+The manifest of each module is stored within settings.NODE_MANIFEST_PATH as
+JSON and is rebuilt (by importing the module) whenever the modification time
+of the module changes. Each Node is represented by a LazyNode which provides
+the information held within the manifest and imports the module defining
+the Node once the Node class itself is required, e.g. to derive the Node or
+to call an overridden can_operate method.
+
+Note: Only the modification time of the module defining a Node is checked.
+Delete the manifest after changing a base class defined within a different
+module.
+'''
+import importlib
+import logging
+import os
+import pkgutil
+import simplejson as json
+import sys
+
+from analysis_engine import node, __version__
+from analysis_engine.library import all_deps
+
+
+logger = logging.getLogger(name=__name__)
+
+
+def module_path(module_name):
+    '''
+    Find the path of a module without importing it.
+
+    :param module_name: Module path, e.g. 'analysis_engine.flight_phase'.
+    :type module_name: str
+    :returns: Path of the module's file or None if it cannot be found.
+    :rtype: str or None
+    '''
+    module = sys.modules.get(module_name)
+    if module is not None:
+        return getattr(module, '__file__', None)
+    try:
+        loader = pkgutil.get_loader(module_name)
+    except ImportError:
+        return None
+    try:
+        return loader.get_filename(module_name)
+    except (AttributeError, ImportError):
+        return None
+
+
+def module_mtime(module_name):
+    '''
+    :param module_name: Module path.
+    :type module_name: str
+    :returns: Modification time of the module's file or None if it cannot be
+        found.
+    :rtype: float or None
+    '''
+    path = module_path(module_name)
+    try:
+        return os.path.getmtime(path) if path else None
+    except OSError:
+        return None
+
+
+def node_manifest_entry(node_class):
+    '''
+    :param node_class: Node class.
+    :type node_class: class
+    :returns: Manifest entry describing node_class.
+    :rtype: dict
+    '''
+    base = node_class.__base__
+    try:
+        dependencies = node_class.get_dependency_names()
+    except (AttributeError, NotImplementedError, TypeError, ValueError):
+        # Raised again once the Node class is imported.
+        dependencies = None
+    try:
+        attribute_names = list(node_class.get_can_operate_attribute_names())
+    except TypeError:
+        attribute_names = None
+    can_operate = getattr(node_class.can_operate, '__func__', None)
+    return {
+        'name': node_class.get_name(),
+        'module': node_class.__module__,
+        'class_name': node_class.__name__,
+        # Node types other than those within analysis_engine.node require
+        # importing the Node class.
+        'node_type': base.__name__ if base.__module__ == node.__name__
+        else None,
+        'dependencies': dependencies,
+        'can_operate_attributes': attribute_names,
+        'default_can_operate': can_operate is node.Node.can_operate.__func__,
+        'names': node_class.names() if hasattr(node_class, 'names') else None,
+    }
+
+
+class LazyNode(object):
+    '''
+    Stands in for a Node class described by a manifest entry. The module
+    defining the Node class is imported once the class is required, after
+    which unknown attributes are those of the Node class.
+    '''
+
+    def __init__(self, entry):
+        '''
+        :param entry: Manifest entry (see node_manifest_entry).
+        :type entry: dict
+        '''
+        self.entry = entry
+        self.__name__ = entry['class_name']
+        self.__module__ = entry['module']
+        self._node_class = None
+
+    def __repr__(self):
+        return '%s(%s.%s)' % (self.__class__.__name__, self.__module__,
+                              self.__name__)
+
+    def __call__(self, *args, **kwargs):
+        return self.node_class(*args, **kwargs)
+
+    def __getattr__(self, name):
+        if name.startswith('__') or name in ('entry', '_node_class'):
+            raise AttributeError(name)
+        return getattr(self.node_class, name)
+
+    def __getstate__(self):
+        return self.entry
+
+    def __setstate__(self, entry):
+        self.__init__(entry)
+
+    @property
+    def node_class(self):
+        '''
+        :returns: Node class, importing the module defining it if required.
+        :rtype: class
+        '''
+        if self._node_class is None:
+            logger.debug("Importing '%s' for Node '%s'.", self.__module__,
+                         self.entry['name'])
+            module = importlib.import_module(self.__module__)
+            self._node_class = getattr(module, self.__name__)
+        return self._node_class
+
+    @property
+    def __base__(self):
+        if self.entry['node_type']:
+            return getattr(node, self.entry['node_type'])
+        return self.node_class.__base__
+
+    @property
+    def __bases__(self):
+        if self.entry['node_type']:
+            return (self.__base__,)
+        return self.node_class.__bases__
+
+    def get_name(self):
+        return self.entry['name']
+
+    def names(self):
+        if self.entry['names'] is None:
+            return self.node_class.names()
+        return list(self.entry['names'])
+
+    def get_dependency_names(self):
+        if self.entry['dependencies'] is None:
+            return self.node_class.get_dependency_names()
+        return list(self.entry['dependencies'])
+
+    def get_can_operate_attribute_names(self):
+        if self.entry['can_operate_attributes'] is None:
+            return self.node_class.get_can_operate_attribute_names()
+        return tuple(self.entry['can_operate_attributes'])
+
+    def can_operate(self, available, *args, **kwargs):
+        if self.entry['default_can_operate']:
+            return all_deps(self, available)
+        return self.node_class.can_operate(available, *args, **kwargs)
+
+
+def _manifest_path(path, module_name):
+    return os.path.join(path, module_name + '.json')
+
+
+def load_module_manifest(module_name, path, scan):
+    '''
+    Load the manifest of a module, rebuilding it if the module has been
+    modified since the manifest was stored.
+
+    :param module_name: Module path.
+    :type module_name: str
+    :param path: Directory the manifest is stored within.
+    :type path: str
+    :param scan: Function which imports a list of modules and returns their
+        Node classes keyed by name (e.g. get_derived_nodes).
+    :type scan: callable
+    :returns: Manifest entries of each Node within the module.
+    :rtype: [dict]
+    '''
+    manifest_path = _manifest_path(path, module_name)
+    mtime = module_mtime(module_name)
+    try:
+        with open(manifest_path) as manifest_file:
+            manifest = json.load(manifest_file)
+    except (IOError, OSError, ValueError):
+        manifest = None
+    if manifest and mtime is not None and manifest['mtime'] == mtime and \
+            manifest['version'] == __version__:
+        return manifest['nodes']
+
+    logger.info("Building node manifest of '%s'.", module_name)
+    entries = [node_manifest_entry(node_class) for name, node_class in
+               sorted(scan([module_name]).items())]
+    manifest = {'mtime': mtime, 'version': __version__, 'nodes': entries}
+    try:
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        # Write to a temporary file so that concurrent processes do not read
+        # a partial manifest.
+        temp_path = '%s.%d.tmp' % (manifest_path, os.getpid())
+        with open(temp_path, 'w') as manifest_file:
+            json.dump(manifest, manifest_file)
+        os.rename(temp_path, manifest_path)
+    except (IOError, OSError):
+        logger.warning("Unable to store node manifest of '%s' within '%s'.",
+                       module_name, path)
+    return entries
+
+
+def lazy_derived_nodes(module_names, path, scan):
+    '''
+    Create LazyNodes for all Nodes within the modules from their manifests.
+    Equivalent to get_derived_nodes without importing the modules.
+
+    :param module_names: Module paths.
+    :type module_names: [str]
+    :param path: Directory the manifests are stored within.
+    :type path: str
+    :param scan: Function which imports a list of modules and returns their
+        Node classes keyed by name (e.g. get_derived_nodes).
+    :type scan: callable
+    :returns: LazyNode of each Node name.
+    :rtype: dict
+    '''
+    nodes = {}
+    for module_name in module_names:
+        for entry in load_module_manifest(module_name, path, scan):
+            nodes[entry['name']] = LazyNode(entry)
+    return nodes
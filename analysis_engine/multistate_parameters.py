@@ -572,8 +572,8 @@ class DualInput(MultistateDerivedParameterNode):
                stick_fo=P('Sidestick Angle (FO)')):
 
         array = np_ma_zeros_like(pilot.array)
-        array[pilot.array == 'Captain'] = stick_fo.array[pilot.array == 'Captain']
-        array[pilot.array == 'First Officer'] = stick_capt.array[pilot.array == 'First Officer']
+        array[pilot.state_mask('Captain')] = stick_fo.array[pilot.state_mask('Captain')]
+        array[pilot.state_mask('First Officer')] = stick_capt.array[pilot.state_mask('First Officer')]
         array = np.ma.array(array > 2.0, mask=array.mask, dtype=int)
 
         '''
@@ -5,27 +5,34 @@ except ImportError:
     import _pickle as cPickle
 import gzip
 import inspect
+import itertools
 import logging
 import math
 import numpy as np
 import pprint
 import re
 import six
+import threading
 
 from abc import ABCMeta
 from collections import namedtuple, Iterable, OrderedDict
 from functools import total_ordering
 from itertools import product
 from operator import attrgetter
+from six.moves import intern
+from timeit import default_timer
 
 from analysis_engine.library import (
     align,
     align_slices,
     all_deps,
     find_edges,
+    IntervalSet,
+    indices_within_slices,
     is_index_within_slice,
     is_index_within_slices,
     is_slice_within_slice,
+    read_only_view,
     repair_mask,
     runs_of_ones,
     slice_duration,
@@ -37,10 +44,17 @@ from analysis_engine.library import (
     slices_from_to,
     slices_remove_small_gaps,
     value_at_index,
+    value_at_indices,
     value_at_time,
+    values_within_slices,
 )
 from analysis_engine.recordtype import recordtype
-from analysis_engine.settings import NODE_CACHE_OFFSET_DP
+from analysis_engine.settings import (
+    CAN_OPERATE_CACHE_SIZE,
+    CHECK_DEPENDENCY_WRITES,
+    NODE_CACHE_OFFSET_DP,
+    READ_ONLY_DEPENDENCIES,
+)
 
 # FIXME: a better place for this class
 from hdfaccess.parameter import MappedArray
@@ -60,6 +74,27 @@ KeyTimeInstance = recordtype('KeyTimeInstance',
                              default=None)
 Section = namedtuple('Section', 'name slice start_edge stop_edge')  # Q: rename mask -> slice/section
 
+# Dependency names of each Node class (see Node.get_dependency_names).
+_dependency_names = {}
+# Attribute names of each Node class' can_operate method (see
+# Node.get_can_operate_attribute_names).
+_can_operate_attribute_names = {}
+# Results of can_operate keyed by Node class, available dependencies and
+# attribute values (see can_operate).
+_can_operate_results = OrderedDict()
+# Names of the dependencies each Node has modified within derive keyed by Node
+# name (see settings.CHECK_DEPENDENCY_WRITES).
+dependency_writes = {}
+# Compiled state tables keyed by values mapping (see state_table).
+_state_tables = {}
+# Names of each FormattedNameNode class with the NAME_FORMAT and NAME_VALUES
+# they were formatted from (see FormattedNameNode.name_set).
+_name_sets = {}
+# Item names interned within this process and their ids (see intern_name).
+_name_ids = {}
+_interned_names = []
+_intern_lock = threading.Lock()
+
 
 # Ref: django/db/models/options.py:20
 # Calculate the verbose_name by converting from InitialCaps to "lowercase with spaces".
@@ -281,12 +316,45 @@ class Node(six.with_metaclass(ABCMeta, object)):
         :returns: A list of dependency names.
         :rtype: [str]
         """
+        # OPT: Inspecting the derive method is slow, therefore memoise per
+        # class. Copy as callers may modify the returned list.
+        try:
+            return list(_dependency_names[cls])
+        except KeyError:
+            pass
         # TypeError:'ABCMeta' object is not iterable?
         # this probably means dependencies for this class isn't a list!
         params = get_param_kwarg_names(cls.derive)
         # Here due to an AttributeError? Derive kwarg is a string not a Node:
         # e.g. derive(a='String') instead of derive(a=P('String'))
-        return [d.name or d.get_name() for d in params]
+        names = [d.name or d.get_name() for d in params]
+        _dependency_names[cls] = names
+        return list(names)
+
+    @classmethod
+    def get_can_operate_attribute_names(cls):
+        """
+        :returns: Names of the Attributes passed into the can_operate method.
+        :rtype: tuple of str
+        :raises TypeError: If a keyword argument of can_operate is not an
+            Attribute.
+        """
+        try:
+            return _can_operate_attribute_names[cls]
+        except KeyError:
+            pass
+        # NOTE: Raises "Unbound method" here due to can_operate being
+        # overridden without wrapping with @classmethod decorator
+        argspec = inspect.getargspec(cls.can_operate)
+        names = []
+        for default in argspec.defaults or ():
+            if not isinstance(default, Attribute):
+                raise TypeError('Only Attributes may be keyword '
+                                'arguments in can_operate methods.')
+            names.append(default.name)
+        names = tuple(names)
+        _can_operate_attribute_names[cls] = names
+        return names
 
     @classmethod
     def can_operate(cls, available):
@@ -364,7 +432,7 @@ def can_operate(cls, available, actype=A('Aircraft Type')):
         :returns: Cached Node if it exists, else None.
         :rtype: Node or None
         '''
-        return self._cache.get(key) if self._cache else None
+        return self._cache.get(key) if self._cache is not None else None
 
     def set_cache(self, key, node):
         '''
@@ -386,7 +454,7 @@ def can_operate(cls, available, actype=A('Aircraft Type')):
         """
         raise NotImplementedError("Abstract Method")
 
-    def get_derived(self, args):
+    def get_derived(self, args, copy_dependencies=False):
         """
         Accessor for derive method which first aligns all parameters to the
         first to ensure parameter data and indices are consistent.
@@ -395,11 +463,17 @@ def can_operate(cls, available, actype=A('Aircraft Type')):
 
         :param args: List of available Parameter objects
         :type args: list
+        :param copy_dependencies: Pass copies of the aligned dependencies to
+            derive so that modifications made by derive are not visible to
+            other Nodes sharing the dependencies, e.g. when deriving Nodes
+            concurrently.
+        :type copy_dependencies: bool
         :returns: self after having aligned dependencies and called derive.
         :rtype: self
         """
         assert len(args) == len(self.get_dependency_names()), \
             '%s: incorrect number of arguments for derive() method' % self.__class__.__name__
+        align_start = default_timer()
         dependencies_to_align = \
             [d for d in args if d is not None and d.frequency]
 
@@ -443,6 +517,16 @@ def can_operate(cls, available, actype=A('Aircraft Type')):
             self.frequency = dependencies_to_align[0].frequency
             self.offset = dependencies_to_align[0].offset
 
+        # Recorded for the optional profiling of derive_parameters.
+        self._align_time = default_timer() - align_start
+
+        if READ_ONLY_DEPENDENCIES:
+            args = [_read_only_dependency(arg) for arg in args]
+        elif copy_dependencies:
+            args = [_copied_dependency(arg) for arg in args]
+        if CHECK_DEPENDENCY_WRITES:
+            digests = _dependency_digests(args)
+
         try:
             res = self.derive(*args)
         except Exception:
@@ -457,6 +541,14 @@ def can_operate(cls, available, actype=A('Aircraft Type')):
         elif res:
             raise UserWarning("Class '%s' should not have returned anything. Got: %s" % (
                 self.__class__.__name__, res))
+        if CHECK_DEPENDENCY_WRITES:
+            modified = [name for name, digest in
+                        _dependency_digests(args).items()
+                        if digests.get(name) != digest]
+            if modified:
+                self.warning("Node '%s' modified dependencies: %s",
+                             self.name, ', '.join(sorted(modified)))
+                dependency_writes[self.name] = sorted(modified)
         return self
 
     def derive(self, **kwargs):
@@ -667,6 +759,27 @@ class DerivedParameterNode(Node):
             secs = float(secs)
         return value_at_time(self.array, self.frequency, self.offset, secs)
 
+    def at_many(self, secs):
+        """
+        Gets the values within the array at many times in a single vectorised
+        pass. Equivalent to calling at for each time, except that values which
+        at would return as None or masked are masked.
+
+        :param secs: times from start of data in seconds. None is masked.
+        :type secs: list or np.array of float
+        :returns: The interpolated values of the array at times secs.
+        :rtype: np.ma.array of float
+        """
+        if isinstance(secs, np.ndarray):
+            secs = secs.astype(np.float64)
+        else:
+            secs = np.array([np.nan if s is None else s for s in secs],
+                            dtype=np.float64)
+        # Timedelta truncates to 6 digits, therefore round offset down (as
+        # value_at_time).
+        indices = (secs - round(self.offset - 0.0000005, 6)) * self.frequency
+        return value_at_indices(self.array, indices)
+
     def get_aligned(self, param):
         '''
         :param param: Node to align copy to.
@@ -790,6 +903,78 @@ class DerivedParameterNode(Node):
 P = Parameter = DerivedParameterNode  # shorthand
 
 
+class StateTable(object):
+    '''
+    Lookup table between the states and raw values of a values mapping,
+    shared by all multistate parameters with the same mapping (see
+    state_table).
+    '''
+
+    def __init__(self, values_mapping):
+        '''
+        :param values_mapping: Mapping of raw values to states.
+        :type values_mapping: dict
+        '''
+        self.state = {v: k for k, v in six.iteritems(values_mapping)}
+        states = sorted(self.state)
+        # Sorted states and their raw values for converting arrays of states
+        # with searchsorted.
+        self.states = np.array(states)
+        self.raw = np.array([self.state[s] for s in states], dtype=int)
+
+    def raw_values(self, states):
+        '''
+        :param states: States to look up.
+        :type states: [str]
+        :returns: Raw values of the states.
+        :rtype: [int]
+        :raises ValueError: If a state is not within the mapping.
+        '''
+        try:
+            return [self.state[s] for s in states]
+        except KeyError as err:
+            raise ValueError("State %s not within values_mapping." % err)
+
+    def lookup(self, data):
+        '''
+        Convert an array of states to raw values.
+
+        :param data: Array of states.
+        :type data: np.ndarray
+        :returns: Raw values (0 where not found) and whether each state was
+            found within the mapping.
+        :rtype: (np.ndarray, np.ndarray)
+        '''
+        raw = np.zeros(data.shape, dtype=int)
+        if not len(self.states):
+            return raw, np.zeros(data.shape, dtype=bool)
+        if data.dtype.kind == self.states.dtype.kind:
+            index = np.searchsorted(self.states, data)
+            found = np.take(self.states, index, mode='clip') == data
+            raw[found] = np.take(self.raw, index[found])
+        else:
+            # e.g. object arrays of mixed states and raw values.
+            values = [self.state.get(v) if isinstance(v, six.string_types)
+                      else None for v in data.tolist()]
+            found = np.array([v is not None for v in values], dtype=bool)
+            raw[found] = [v for v in values if v is not None]
+        return raw, found
+
+
+def state_table(values_mapping):
+    '''
+    :param values_mapping: Mapping of raw values to states.
+    :type values_mapping: dict
+    :returns: Compiled state table of values_mapping.
+    :rtype: StateTable
+    '''
+    key = frozenset(six.iteritems(values_mapping))
+    table = _state_tables.get(key)
+    if table is None:
+        table = _state_tables[key] = StateTable(values_mapping)
+    return table
+
+
 def multistate_string_to_integer(string_array, mapping):
     """
     Converts (['one', 'two'], {1:'one', 2:'two'}) to [1, 2]
@@ -811,19 +996,23 @@ def multistate_string_to_integer(string_array, mapping):
     if not len(string_array):
         return string_array
 
-    output_array = string_array.copy()
-    # values need converting using mapping
-    for int_value, str_value in six.iteritems(mapping):
-        output_array.data[string_array.data == str_value] = int_value
-    output_array.fill_value = 999999  # NB: only 999 will be stored by dtype
-    # apply fill_value to all masked values
-    output_array.data[np.ma.where(output_array.mask)] = output_array.fill_value
-    try:
-        int_array = output_array.astype(int)
-    except ValueError as err:
-        msg = "No value in values_mapping found for %s" % str(err).split("'")[-2]
-        raise ValueError(msg)
-    return int_array
+    data = np.ma.getdata(string_array)
+    mask = np.ma.getmask(string_array)
+    raw, found = state_table(mapping).lookup(data)
+    # values not within the mapping must already be numeric
+    unmapped = ~(found | np.ma.getmaskarray(string_array))
+    if unmapped.any():
+        try:
+            raw[unmapped] = data[unmapped].astype(int)
+        except ValueError as err:
+            msg = "No value in values_mapping found for %s" % str(err).split("'")[-2]
+            raise ValueError(msg)
+    # NB: only 999 will be stored by dtype
+    fill_value = 999999
+    if mask is not np.ma.nomask:
+        raw[mask] = fill_value
+        mask = mask.copy()
+    return np.ma.array(raw, mask=mask, fill_value=fill_value)
 
 
 class MultistateDerivedParameterNode(DerivedParameterNode):
@@ -861,7 +1050,7 @@ class MultistateDerivedParameterNode(DerivedParameterNode):
         elif not hasattr(self, 'values_mapping'):
             self.values_mapping = {}
 
-        self.state = {v: k for k, v in six.iteritems(self.values_mapping)}
+        self.state = state_table(self.values_mapping).state
 
         super(MultistateDerivedParameterNode, self).__init__(
             name, array, frequency, offset, data_type, *args,
@@ -874,6 +1063,8 @@ class MultistateDerivedParameterNode(DerivedParameterNode):
             raise ValueError(
                 "'%s' requires either values_mapping passed into constructor "
                 "or as a class attribute." % self.__class__.__name__)
+        # derive may have modified the array after requesting state masks
+        object.__setattr__(self, '_state_masks', {})
         return node
 
     def __setattr__(self, name, value):
@@ -899,6 +1090,7 @@ class MultistateDerivedParameterNode(DerivedParameterNode):
         if name == 'values_mapping':
             if hasattr(self, 'array'):
                 self.array.values_mapping = value
+            object.__setattr__(self, '_state_masks', {})
             return object.__setattr__(self, name, value)
         # setting 'self.array'
         if isinstance(value, MappedArray):
@@ -935,7 +1127,7 @@ class MultistateDerivedParameterNode(DerivedParameterNode):
             value = MappedArray(value, values_mapping=self.values_mapping)
         elif isinstance(value, Iterable):
             # assume a list of mapped values
-            reversed_mapping = {v: k for k, v in self.values_mapping.items()}
+            reversed_mapping = state_table(self.values_mapping).state
             #Q: change "int" to "float"
             data = [int(reversed_mapping[v]) for v in value]
             value = MappedArray(data, values_mapping=self.values_mapping)
@@ -943,8 +1135,42 @@ class MultistateDerivedParameterNode(DerivedParameterNode):
             raise ValueError('Invalid argument type assigned to array: %s'
                              % type(value))
 
+        # state masks of the previous array are no longer valid
+        object.__setattr__(self, '_state_masks', {})
         return object.__setattr__(self, name, value)
 
+    def state_mask(self, *states):
+        '''
+        Where the parameter is in any of the states, equivalent to
+        self.array == state for a single state. Masks are cached by the
+        parameter and returned as read-only arrays, so all nodes depending
+        upon the parameter share them. Only request state masks once the
+        array will no longer be modified, i.e. not within this parameter's
+        own derive method.
+
+        :param states: States to compare against.
+        :type states: str
+        :returns: Boolean array masked where the parameter is masked.
+        :rtype: np.ma.MaskedArray
+        :raises ValueError: If a state is not within values_mapping.
+        '''
+        state_masks = self.__dict__.setdefault('_state_masks', {})
+        state_mask = state_masks.get(states)
+        if state_mask is None:
+            raw = state_table(self.values_mapping).raw_values(states)
+            data = np.ma.getdata(self.array)
+            if len(raw) == 1:
+                condition = data == raw[0]
+            else:
+                condition = np.in1d(data, raw).reshape(data.shape)
+            mask = np.ma.getmask(self.array)
+            if mask is not np.ma.nomask:
+                condition &= ~mask
+                mask = mask.copy()
+            state_mask = read_only_view(np.ma.array(condition, mask=mask))
+            state_masks[states] = state_mask
+        return state_mask
+
     def __getstate__(self):
         '''
         Get the state of the object for pickling.
@@ -952,6 +1178,7 @@ class MultistateDerivedParameterNode(DerivedParameterNode):
         :rtype: dict
         '''
         odict = self.__dict__.copy()
+        odict.pop('_state_masks', None)
         return odict
 
     def __setstate__(self, state):
@@ -995,6 +1222,106 @@ def derived_param_from_hdf(hdf_parameter, cache=None):
         )
 
 
+class SectionIndex(object):
+    '''
+    Slice starts and stops of a SectionNode's sections ordered by start and
+    by stop for logarithmic next, previous and containment lookups. Lookups
+    fall back to vectorised scans where sections overlap.
+    '''
+
+    def __init__(self, start, stop):
+        '''
+        :param start: Slice start of each section.
+        :type start: np.ndarray
+        :param stop: Slice stop of each section.
+        :type stop: np.ndarray
+        '''
+        self.start = start
+        self.stop = stop
+        # Stable sorts so that equal sections keep their order within the
+        # SectionNode, matching sorted().
+        self.order = {'start': np.argsort(start, kind='mergesort'),
+                      'stop': np.argsort(stop, kind='mergesort')}
+        self._values = {}
+
+    @classmethod
+    def from_sections(cls, sections):
+        '''
+        :param sections: Sections to index.
+        :type sections: [Section]
+        :returns: Index of the sections or None if a section has a start or
+            stop of None or a step.
+        :rtype: SectionIndex or None
+        '''
+        slices = [s.slice for s in sections]
+        if any(s.start is None or s.stop is None or s.step is not None
+               for s in slices):
+            return None
+        return cls(np.array([s.start for s in slices], dtype=float),
+                   np.array([s.stop for s in slices], dtype=float))
+
+    def _ordered(self, order_by, use):
+        '''
+        :returns: Values of use ordered by order_by and whether they are
+            sorted.
+        :rtype: (np.ndarray, bool)
+        '''
+        key = (order_by, use)
+        if key not in self._values:
+            values = getattr(self, use)[self.order[order_by]]
+            self._values[key] = (values, bool(np.all(values[1:] >= values[:-1])))
+        return self._values[key]
+
+    def next(self, index, order_by='start', use='start'):
+        '''
+        :returns: Position of the first section ordered by order_by whose use
+            is greater than index, or None.
+        :rtype: int or None
+        '''
+        values, monotonic = self._ordered(order_by, use)
+        if monotonic:
+            pos = np.searchsorted(values, index, side='right')
+        else:
+            above = np.flatnonzero(values > index)
+            pos = above[0] if len(above) else len(values)
+        return int(self.order[order_by][pos]) if pos < len(values) else None
+
+    def previous(self, index, order_by='start', use='stop'):
+        '''
+        :returns: Position of the last section ordered by order_by whose use
+            is less than index, or None.
+        :rtype: int or None
+        '''
+        values, monotonic = self._ordered(order_by, use)
+        if monotonic:
+            pos = np.searchsorted(values, index, side='left') - 1
+        else:
+            below = np.flatnonzero(values < index)
+            pos = below[-1] if len(below) else -1
+        return int(self.order[order_by][pos]) if pos >= 0 else None
+
+    def containing(self, index, inclusive=False):
+        '''
+        :param inclusive: Whether sections contain their slice stop.
+        :type inclusive: bool
+        :returns: Positions of the sections containing index in order.
+        :rtype: np.ndarray
+        '''
+        starts, _ = self._ordered('start', 'start')
+        stops, monotonic = self._ordered('start', 'stop')
+        # Sections starting at or before index.
+        count = np.searchsorted(starts, index, side='right')
+        if monotonic:
+            first = np.searchsorted(stops[:count], index,
+                                    side='left' if inclusive else 'right')
+            positions = self.order['start'][first:count]
+        else:
+            within = stops[:count] >= index if inclusive \
+                else stops[:count] > index
+            positions = self.order['start'][:count][within]
+        return np.sort(positions)
+
+
 class SectionNode(Node, list):
     '''
     Derives from list to implement iteration and list methods.
@@ -1016,6 +1343,19 @@ class SectionNode(Node, list):
             del kwargs['items']
         super(SectionNode, self).__init__(*args, **kwargs)
 
+    def _get_section_index(self):
+        '''
+        Index of the sections, built on first use and discarded when the
+        SectionNode is modified.
+
+        :rtype: SectionIndex or None
+        '''
+        section_index = self.__dict__.get('_section_index', False)
+        if section_index is False:
+            section_index = self._section_index = \
+                SectionIndex.from_sections(self)
+        return section_index
+
     def create_section(self, section_slice, name='', begin=None, end=None):
         """
         Create a slice of the data.
@@ -1117,8 +1457,7 @@ class SectionNode(Node, list):
                 # FIXME: This does not account for different offsets.
                 within_slice = slice_multiply(within_slice, param.hz)
             if containing_index is not None:
-                containing_index = \
-                    containing_index * (self.hz / param.hz) + (self.hz * param.offset)
+                containing_index = self._param_index(containing_index, param)
         if within_slice:
             within_func = lambda s, within: is_slice_within_slice(
                 s.slice, within, within_use=within_use)
@@ -1145,10 +1484,31 @@ class SectionNode(Node, list):
         :rtype: Section
         '''
         condition = self._get_condition(**kwargs)
-        matching = [s for s in self if condition(s)]
+        candidates = self
+        containing_index = kwargs.get('containing_index')
+        section_index = self._get_section_index() \
+            if containing_index is not None else None
+        if section_index is not None:
+            if kwargs.get('param') is not None:
+                containing_index = self._param_index(containing_index,
+                                                     kwargs['param'])
+            candidates = [self[i] for i in
+                          section_index.containing(containing_index).tolist()]
+        matching = [s for s in candidates if condition(s)]
         return self.__class__(name=self.name, frequency=self.frequency,
                               offset=self.offset, items=matching)
 
+    def _param_index(self, index, param):
+        '''
+        :param index: Index sourced from param.
+        :type index: int or float
+        :param param: Param which index is sourced from.
+        :type param: Node
+        :returns: index aligned to the frequency of self.
+        :rtype: float
+        '''
+        return index * (self.hz / param.hz) + (self.hz * param.offset)
+
     def get_first(self, first_by='start', **kwargs):
         '''
         :param first_by: Get the first by either 'start' or 'stop' of slice.
@@ -1208,6 +1568,11 @@ class SectionNode(Node, list):
         '''
         if frequency:
             index = index * (self.frequency / frequency)
+        section_index = self._get_section_index() \
+            if set(kwargs) <= {'order_by'} else None
+        if section_index is not None:
+            pos = section_index.next(index, use=use, **kwargs)
+            return None if pos is None else self[pos]
         ordered = self.get_ordered_by_index(**kwargs)
         for elem in ordered:
             if getattr(elem.slice, use) > index:
@@ -1231,6 +1596,11 @@ class SectionNode(Node, list):
         '''
         if frequency:
             index = index * (self.frequency / frequency)
+        section_index = self._get_section_index() \
+            if set(kwargs) <= {'order_by'} else None
+        if section_index is not None:
+            pos = section_index.previous(index, use=use, **kwargs)
+            return None if pos is None else self[pos]
         ordered = self.get_ordered_by_index(**kwargs)
         for elem in reversed(ordered):
             if getattr(elem.slice, use) < index:
@@ -1273,6 +1643,12 @@ class SectionNode(Node, list):
         :returns: List of surrounding sections
         :rtype: List of sections
         '''
+        section_index = self._get_section_index()
+        if section_index is not None:
+            surrounded = [self[i] for i in
+                          section_index.containing(index, inclusive=True).tolist()]
+            return self.__class__(name=self.name, frequency=self.frequency,
+                                  offset=self.offset, items=surrounded)
         surrounded = []
         for section in self:
             if section.slice.start <= index <= section.slice.stop or\
@@ -1296,6 +1672,35 @@ class SectionNode(Node, list):
             slices = [section.slice for section in self]
         return slices
 
+    def get_interval_set(self, edges=True):
+        '''
+        :param edges: Use start and stop edges rather than slice start and stop (see get_slices).
+        :type edges: bool
+        :returns: The sections as an IntervalSet for set operations with other slices.
+        :rtype: IntervalSet
+        '''
+        return IntervalSet.from_slices(self.get_slices(edges=edges))
+
+
+def _discard_section_index(method):
+    '''
+    Wrap a list method which modifies a SectionNode to discard its index.
+    '''
+    def modify(self, *args, **kwargs):
+        self.__dict__.pop('_section_index', None)
+        return method(self, *args, **kwargs)
+    modify.__name__ = method.__name__
+    modify.__doc__ = method.__doc__
+    return modify
+
+
+for _method_name in ('__delitem__', '__delslice__', '__iadd__', '__imul__',
+                     '__setitem__', '__setslice__', 'append', 'clear',
+                     'extend', 'insert', 'pop', 'remove', 'reverse', 'sort'):
+    if hasattr(list, _method_name):
+        setattr(SectionNode, _method_name,
+                _discard_section_index(getattr(list, _method_name)))
+
 
 class FlightPhaseNode(SectionNode):
     '''
@@ -1307,6 +1712,151 @@ class FlightPhaseNode(SectionNode):
     create_phases = SectionNode.create_sections
 
 
+def _item_column(column):
+    '''
+    :param column: Indices or values of items.
+    :type column: list
+    :returns: A float array if all of the column are floats, otherwise an
+        object array so that the types of the items' attributes (and of the
+        results of aligning them) are unchanged.
+    :rtype: np.ndarray
+    '''
+    if all(type(v) is float for v in column):
+        return np.array(column, dtype=float)
+    array = np.empty(len(column), dtype=object)
+    array[:] = column
+    return array
+
+
+class ItemColumns(object):
+    '''
+    Columns of KeyPointValues or KeyTimeInstances used to align and bounds
+    check the items of a node at once. Indices, values and name ids are held
+    within NumPy arrays; indices and values are float arrays when they are
+    all floats and object arrays otherwise, so that the types of the items'
+    attributes are unchanged. Items are only materialised when iterated or
+    indexed. Nodes themselves remain lists of items.
+    '''
+
+    def __init__(self, item_type, index, name_id, names, value=None,
+                 fields=None):
+        '''
+        :param item_type: Type of the items, e.g. KeyPointValue.
+        :type item_type: recordtype
+        :param index: Index of each item.
+        :type index: np.ndarray
+        :param name_id: Position of each item's name within names.
+        :type name_id: np.ndarray
+        :param names: Names indexed by name_id, usually the interned names
+            (see intern_name).
+        :type names: list
+        :param value: Value of each item (KeyPointValues only).
+        :type value: np.ndarray or None
+        :param fields: Remaining fields of the items which are not all
+            default, e.g. {'slice': np.array([...], dtype=object)}.
+        :type fields: dict or None
+        '''
+        self.item_type = item_type
+        self.index = index
+        self.name_id = name_id
+        self.names = names
+        self.value = value
+        self.fields = fields or {}
+
+    @classmethod
+    def from_items(cls, item_type, items):
+        '''
+        :param item_type: Type of the items.
+        :type item_type: recordtype
+        :param items: Items to store.
+        :type items: [KeyPointValue] or [KeyTimeInstance]
+        :returns: Columns of the items.
+        :rtype: ItemColumns
+        :raises TypeError: If an item is not of item_type.
+        '''
+        if any(type(item) is not item_type for item in items):
+            raise TypeError('Items are not all %s.' % item_type.__name__)
+        columns = {f: list(map(attrgetter(f), items))
+                   for f in item_type._fields}
+        name_id = np.array([intern_name(name) for name in columns.pop('name')],
+                           dtype=int)
+        index = _item_column(columns.pop('index'))
+        value = _item_column(columns.pop('value')) \
+            if 'value' in columns else None
+        default = item_type()
+        fields = {}
+        for field_name, column in six.iteritems(columns):
+            if column.count(getattr(default, field_name)) != len(column):
+                fields[field_name] = np.empty(len(column), dtype=object)
+                fields[field_name][:] = column
+        return cls(item_type, index, name_id, _interned_names, value, fields)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __iter__(self):
+        default = self.item_type()
+        columns = []
+        for field_name in self.item_type._fields:
+            if field_name == 'index':
+                columns.append(self.index.tolist())
+            elif field_name == 'value':
+                columns.append(self.value.tolist())
+            elif field_name == 'name':
+                columns.append([self.names[i] for i in self.name_id.tolist()])
+            elif field_name in self.fields:
+                columns.append(self.fields[field_name])
+            else:
+                columns.append(itertools.repeat(
+                    getattr(default, field_name), len(self)))
+        for row in zip(*columns):
+            yield self.item_type(*row)
+
+    def __getitem__(self, key):
+        '''
+        :param key: Position of an item, or a slice, positions or boolean
+            array selecting items.
+        :returns: Item at the position or columns of the selected items.
+        :rtype: KeyPointValue or KeyTimeInstance or ItemColumns
+        '''
+        if isinstance(key, six.integer_types + (np.integer,)):
+            items = list(self[key:(key + 1) or None])
+            if not items:
+                raise IndexError('%s index out of range' %
+                                 self.__class__.__name__)
+            return items[0]
+        return self.__class__(
+            self.item_type, self.index[key], self.name_id[key], self.names,
+            None if self.value is None else self.value[key],
+            {f: c[key] for f, c in six.iteritems(self.fields)})
+
+    def __repr__(self):
+        return '%s' % pprint.pformat(list(self))
+
+    def aligned(self, multiplier, offset):
+        '''
+        :param multiplier: Ratio of the aligned frequency to the frequency of
+            the items.
+        :type multiplier: float
+        :param offset: Offset added to the indices after the multiplier.
+        :type offset: float
+        :returns: Columns with aligned indices.
+        :rtype: ItemColumns
+        '''
+        return self.__class__(self.item_type, self.index * multiplier + offset,
+                              self.name_id, self.names, self.value,
+                              self.fields)
+
+    def outside(self, lower, upper):
+        '''
+        :returns: Positions of items with indices outside lower and upper
+            (inclusive).
+        :rtype: np.ndarray
+        '''
+        index = self.index.astype(float)
+        return np.flatnonzero(~((index >= lower) & (index <= upper)))
+
+
 class ListNode(Node, list):
     def __init__(self, *args, **kwargs):
         '''
@@ -1341,6 +1891,8 @@ class FormattedNameNode(ListNode):
     '''
     NAME_FORMAT = ""
     NAME_VALUES = {}
+    # Type of the items, held within ItemColumns when aligning.
+    item_type = None
 
     def __init__(self, *args, **kwargs):
         '''
@@ -1349,24 +1901,45 @@ class FormattedNameNode(ListNode):
         super(FormattedNameNode, self).__init__(*args, **kwargs)
         self.restrict_names = kwargs.get('restrict_names', True)
 
+    @classmethod
+    def _names(cls):
+        '''
+        :returns: Names of the class in order and as a set.
+        :rtype: (tuple, frozenset)
+        '''
+        cached = _name_sets.get(cls)
+        # Formatted again if NAME_FORMAT or NAME_VALUES are replaced.
+        if cached and cached[0] is cls.NAME_FORMAT and \
+                cached[1] is cls.NAME_VALUES:
+            return cached[2]
+        if not cls.NAME_FORMAT and not cls.NAME_VALUES:
+            names = [cls.get_name()]
+        else:
+            names = []
+            for a in product(*cls.NAME_VALUES.values()):
+                name = cls.NAME_FORMAT % dict(zip(cls.NAME_VALUES.keys(), a))
+                names.append(name)
+        names = tuple(interned_name(intern_name(n)) for n in names)
+        result = (names, frozenset(names))
+        _name_sets[cls] = (cls.NAME_FORMAT, cls.NAME_VALUES, result)
+        return result
+
     @classmethod
     def names(cls):
         """
         :returns: The product of all NAME_VALUES name combinations
         :rtype: list
         """
-        # XXX: cache option below disabled until required. Should we create this
-        # on init and remove the property instead?
-        ##if hasattr(cls, 'names'):
-        ##    return cls.names
-        if not cls.NAME_FORMAT and not cls.NAME_VALUES:
-            return [cls.get_name()]
-        names = []
-        for a in product(*cls.NAME_VALUES.values()):
-            name = cls.NAME_FORMAT % dict(zip(cls.NAME_VALUES.keys(), a))
-            names.append(name)
-        ##cls.names = names  #cache
-        return names
+        return list(cls._names()[0])
+
+    @classmethod
+    def name_set(cls):
+        '''
+        :returns: The product of all NAME_VALUES name combinations, formatted
+            once per class.
+        :rtype: frozenset
+        '''
+        return cls._names()[1]
 
     def _validate_name(self, name):
         """
@@ -1375,7 +1948,7 @@ class FormattedNameNode(ListNode):
         :type name: str
         :rtype: bool
         """
-        return name in self.names()
+        return name in self.name_set()
 
     def format_name(self, replace_values={}, **kwargs):
         """
@@ -1399,12 +1972,12 @@ class FormattedNameNode(ListNode):
         # validate name is allowed
         if not self._validate_name(name):
             raise ValueError("invalid name '%s'" % name)
-        return name  # return as a confirmation it was successful
+        # share the interned name between items
+        return interned_name(intern_name(name))
 
-    def _get_condition(self, within_slice=None, within_slices=None, name=None):
+    def _get_mask(self, within_slice=None, within_slices=None, name=None):
         '''
-        Returns a condition function which checks if the element is within
-        a slice or has a specified name if they are provided.
+        Condition of which elements are within_slice or have name.
 
         :param within_slice: Only return elements within this slice.
         :type within_slice: slice
@@ -1412,32 +1985,76 @@ class FormattedNameNode(ListNode):
         :type within_slices: [slice]
         :param name: Only return elements with this name.
         :type name: str
-        :returns: Either a condition function or None.
-        :rtype: func or None
+        :returns: Whether each element matches or None if there are no
+            conditions.
+        :rtype: np.ndarray(dtype=bool) or None
         '''
         if within_slice and within_slices:
-            within_slices.append(within_slice)
+            within_slices = list(within_slices) + [within_slice]
         elif within_slice:
             within_slices = [within_slice]
 
-        within_slices_func = \
-            lambda e: is_index_within_slices(e.index, within_slices)
-        name_func = lambda e: e.name == name
-
-        if within_slices and name:
-            return lambda e: within_slices_func(e) and name_func(e)
-        elif within_slices:
-            return within_slices_func
-        elif name:
-            #Q: If restrict names BUT the named item is in the list of objects
-            # contained, should we not return it anyway rather than raise?
-            if self.restrict_names and name not in self.names():
-                raise ValueError("Attempted to filter by invalid name '%s' "
-                                 "within '%s'." % (name,
-                                                   self.__class__.__name__))
-            return name_func
-        else:
+        if not within_slices and not name:
             return None
+        if name and not within_slices and self.restrict_names and \
+                name not in self.name_set():
+            raise ValueError("Attempted to filter by invalid name '%s' "
+                             "within '%s'." % (name, self.__class__.__name__))
+        mask = np.ones(len(self), dtype=bool)
+        if within_slices:
+            mask &= indices_within_slices(
+                list(map(attrgetter('index'), self)), within_slices)
+        if name:
+            mask &= np.array(list(map(attrgetter('name'), self)),
+                             dtype=object) == name
+        return mask
+
+    def columns(self):
+        '''
+        :returns: Columns of the items.
+        :rtype: ItemColumns
+        :raises TypeError: If the items are not all of item_type.
+        '''
+        if self.item_type is None:
+            raise TypeError("'%s' does not define item_type." %
+                            self.__class__.__name__)
+        return ItemColumns.from_items(self.item_type, self)
+
+    def get_aligned_columns(self, param):
+        '''
+        :param param: Node to align the items to.
+        :type param: Node subclass
+        :returns: Columns of the items aligned to the frequency and offset of
+            param.
+        :rtype: ItemColumns
+        :raises TypeError: If the items are not all of item_type.
+        '''
+        multiplier = param.frequency / self.frequency
+        offset = (self.offset - param.offset) * param.frequency
+        # TODO: check for negative index following downsampling if use
+        # case arrises
+        return self.columns().aligned(multiplier, offset)
+
+    def get_aligned(self, param):
+        '''
+        :param param: Node to align this node to.
+        :type param: Node subclass
+        :returns: A copy of the node with its contents aligned to the
+            frequency and offset of param.
+        :rtype: self.__class__
+        '''
+        aligned_node = self.__class__(self.name, param.frequency, param.offset)
+        try:
+            aligned_node.extend(self.get_aligned_columns(param))
+        except TypeError:
+            # Items of other types are copied individually.
+            multiplier = param.frequency / self.frequency
+            offset = (self.offset - param.offset) * param.frequency
+            for item in self:
+                aligned_item = copy.copy(item)
+                aligned_item.index = (item.index * multiplier) + offset
+                aligned_node.append(aligned_item)
+        return aligned_node
 
     def get(self, **kwargs):
         '''
@@ -1447,12 +2064,13 @@ class FormattedNameNode(ListNode):
         .get(name_values={'altitude': 20}) rather than
         .get(name='20 Ft Descending').
 
-        :param kwargs: Passed into _get_condition (see docstring).
+        :param kwargs: Passed into _get_mask (see docstring).
         :returns: An object of the same type as self containing elements ordered by index.
         :rtype: self.__class__
         '''
-        condition = self._get_condition(**kwargs)
-        matching = filter(condition, self) if condition else self
+        mask = self._get_mask(**kwargs)
+        matching = self if mask is None else \
+            [self[i] for i in np.flatnonzero(mask).tolist()]
         return self.__class__(name=self.name, frequency=self.frequency,
                               offset=self.offset, items=matching)
 
@@ -1461,7 +2079,7 @@ class FormattedNameNode(ListNode):
         Gets elements ordered by index (ascending) optionally filter
         within_slice or by name.
 
-        :param kwargs: Passed into _get_condition (see docstring).
+        :param kwargs: Passed into _get_mask (see docstring).
         :returns: An object of the same type as self containing elements ordered by index.
         :rtype: self.__class__
         '''
@@ -1475,7 +2093,7 @@ class FormattedNameNode(ListNode):
         Gets the element with the lowest index optionally filter within_slice or
         by name.
 
-        :param kwargs: Passed into _get_condition (see docstring).
+        :param kwargs: Passed into _get_mask (see docstring).
         :returns: First element matching conditions.
         :rtype: item within self or None
         '''
@@ -1490,7 +2108,7 @@ class FormattedNameNode(ListNode):
         Gets the element with the lowest index optionally filter within_slice or
         by name.
 
-        :param kwargs: Passed into _get_condition (see docstring).
+        :param kwargs: Passed into _get_mask (see docstring).
         :returns: Element with the lowest index matching criteria.
         :rtype: item within self or None
         '''
@@ -1509,7 +2127,7 @@ class FormattedNameNode(ListNode):
         :type index: int or float
         :param frequency: Frequency of index if it is not the same as the FormattedNameNode.
         :type frequency: int or float
-        :param kwargs: Passed into _get_condition (see docstring).
+        :param kwargs: Passed into _get_mask (see docstring).
         :returns: Element with the next index matching criteria.
         :rtype: item within self or None
         '''
@@ -1530,7 +2148,7 @@ class FormattedNameNode(ListNode):
         :type index: int or float
         :param frequency: Frequency of index if it is not the same as the FormattedNameNode.
         :type frequency: int or float
-        :param kwargs: Passed into _get_condition (see docstring).
+        :param kwargs: Passed into _get_mask (see docstring).
         :returns: Element with the previous index matching criteria.
         :rtype: item within self or None
         '''
@@ -1575,6 +2193,7 @@ class KeyTimeInstanceNode(FormattedNameNode):
 
     '''
     node_type_abbr = 'KTI'
+    item_type = KeyTimeInstance
 
     def __init__(self, *args, **kwargs):
         # place holder
@@ -1738,30 +2357,10 @@ class KeyTimeInstanceNode(FormattedNameNode):
                 state_changes(state, repaired_array, change, getattr(p, 'slice', p))
         return
 
-    def get_aligned(self, param):
-        '''
-        :param param: Node to align this KeyTimeInstanceNode to.
-        :type param: Node subclass
-        :returns: An copy of the KeyTimeInstanceNode with its contents aligned to the frequency and offset of param.
-        :rtype: KeyTimeInstanceNode
-        '''
-        multiplier = param.frequency / self.frequency
-        offset = (self.offset - param.offset) * param.frequency
-        aligned_node = self.__class__(self.name, param.frequency,
-                                      param.offset)
-        for kti in self:
-            aligned_kti = copy.copy(kti)
-            index_aligned = (kti.index * multiplier) + offset
-            # TODO: check for negative index following downsampling if use
-            # case arrises
-            aligned_kti.index = index_aligned
-            aligned_node.append(aligned_kti)
-
-        return aligned_node
-
 
 class KeyPointValueNode(FormattedNameNode):
     node_type_abbr = 'KPV'
+    item_type = KeyPointValue
 
     def __init__(self, *args, **kwargs):
         super(KeyPointValueNode, self).__init__(*args, **kwargs)
@@ -1839,32 +2438,12 @@ class KeyPointValueNode(FormattedNameNode):
         self.debug('KPV %s' % kpv)
         return kpv
 
-    def get_aligned(self, param):
-        '''
-        :param param: Node to align this KeyPointValueNode to.
-        :type param: Node subclass
-        :returns: An copy of the KeyPointValueNode with its contents aligned to the frequency and offset of param.
-        :rtype: KeyPointValueNode
-        '''
-        multiplier = param.frequency / self.frequency
-        offset = (self.offset - param.offset) * param.frequency
-        aligned_node = self.__class__(self.name, param.frequency, param.offset)
-        for kpv in self:
-            aligned_kpv = copy.copy(kpv)
-            aligned_kpv.index = (aligned_kpv.index * multiplier) + offset
-            # TODO: check for negative index following downsampling if use
-            # case arrises
-            ##if aligned_kpv.slice:
-            ##    aligned_kpv.slice = align_slice(param, self, aligned_kpv.slice)
-            aligned_node.append(aligned_kpv)
-        return aligned_node
-
     def get_max(self, **kwargs):
         '''
         Gets the KeyPointValue with the maximum value optionally filter
         within_slice or by name.
 
-        :param kwargs: Passed into _get_condition (see docstring).
+        :param kwargs: Passed into _get_mask (see docstring).
         :rtype: KeyPointValue
         '''
         matching = self.get(**kwargs)
@@ -1878,7 +2457,7 @@ class KeyPointValueNode(FormattedNameNode):
         Gets the KeyPointValue with the minimum value optionally filter
         within_slice or by name.
 
-        :param kwargs: Passed into _get_condition (see docstring).
+        :param kwargs: Passed into _get_mask (see docstring).
         :rtype: KeyPointValue
         '''
         matching = self.get(**kwargs)
@@ -1892,7 +2471,7 @@ class KeyPointValueNode(FormattedNameNode):
         Gets the element with the maximum value optionally filter within_slice
         or by name.
 
-        :param kwargs: Passed into _get_condition (see docstring).
+        :param kwargs: Passed into _get_mask (see docstring).
         :rtype: KeyPointValueNode
         '''
         matching = self.get(**kwargs)
@@ -1917,11 +2496,18 @@ class KeyPointValueNode(FormattedNameNode):
         :returns None:
         :rtype: None
         '''
-        for kti in ktis:
-            value = value_at_index(array, kti.index, interpolate=interpolate)
-
+        indices = [kti.index for kti in ktis]
+        if isinstance(array, MappedArray):
+            # Multistate values are states which create_kpv will reject.
+            values = [value_at_index(array, index, interpolate=interpolate)
+                      for index in indices]
+        else:
+            # Masked values are converted to None.
+            values = value_at_indices(array, indices,
+                                      interpolate=interpolate).tolist()
+        for index, value in zip(indices, values):
             if not suppress_zeros or value:
-                self.create_kpv(kti.index, value)
+                self.create_kpv(index, value)
 
     create_kpvs_at_kpvs = create_kpvs_at_ktis  # both will work the same!
 
@@ -1946,28 +2532,41 @@ class KeyPointValueNode(FormattedNameNode):
         if min_duration:
             assert freq
 
+        search_slices = []
+        start_edges = []
+        stop_edges = []
         for slice_ in slices:
 
             if isinstance(slice_, Section):
-                index, value = function(array, slice_.slice,
-                                        start_edge=slice_.start_edge,
-                                        stop_edge=slice_.stop_edge)
+                search_slice = slice_.slice
+                start_edge = slice_.start_edge
+                stop_edge = slice_.stop_edge
                 begin = slice_.start_edge
                 end = slice_.stop_edge
             else:
                 # Where slice.stop is not a whole number, it is assumed that the
                 # value is an stop_edge rather than an inclusive pythonic end to a
                 # range (stop+1) as a slice should be.
-                stop = slice_.stop if slice_.stop % 1 else None
-                index, value = function(array, slice_, start_edge=slice_.start,
-                                        stop_edge=stop)
+                search_slice = slice_
+                start_edge = slice_.start
+                stop_edge = slice_.stop if slice_.stop % 1 else None
                 begin = slice_.start
                 end = slice_.stop
 
             if min_duration:
                 duration = (end-begin)/freq
             if not min_duration or duration > min_duration:
-                self.create_kpv(index, value, **kwargs)
+                search_slices.append(search_slice)
+                start_edges.append(start_edge)
+                stop_edges.append(stop_edge)
+
+        # Common functions such as max_value are evaluated within all of the
+        # slices at once.
+        values = values_within_slices(array, search_slices, function,
+                                      start_edges=start_edges,
+                                      stop_edges=stop_edges)
+        for index, value in values:
+            self.create_kpv(index, value, **kwargs)
 
     def create_kpv_from_slices(self, array, slices, function, **kwargs):
         '''
@@ -2434,6 +3033,148 @@ class ApproachNode(ListNode):
 App = ApproachNode
 
 
+def can_operate(node_class, available, attributes=()):
+    '''
+    Memoised can_operate of a Node class. Results are shared between flights
+    (and NodeManagers) within the process, so planning frames which have
+    already been seen only evaluates can_operate for new combinations of
+    available dependencies and attribute values. can_operate methods must
+    therefore only depend upon their arguments.
+
+    :param node_class: Node class.
+    :type node_class: class
+    :param available: Available dependencies.
+    :type available: set or list of str
+    :param attributes: Attributes passed into can_operate in the order of
+        node_class.get_can_operate_attribute_names().
+    :type attributes: [Attribute or None]
+    :returns: Result of node_class.can_operate.
+    :rtype: bool
+    '''
+    if not CAN_OPERATE_CACHE_SIZE:
+        return node_class.can_operate(available, *attributes)
+    try:
+        key = (node_class, frozenset(available),
+               tuple(None if a is None else a.value for a in attributes))
+        return _can_operate_results[key]
+    except KeyError:
+        pass
+    except TypeError:
+        # Unhashable attribute values are not cached.
+        return node_class.can_operate(available, *attributes)
+    result = node_class.can_operate(available, *attributes)
+    _can_operate_results[key] = result
+    while len(_can_operate_results) > CAN_OPERATE_CACHE_SIZE:
+        try:
+            _can_operate_results.popitem(last=False)
+        except KeyError:
+            # Emptied by another thread.
+            break
+    return result
+
+
+def clear_can_operate_cache():
+    '''
+    Clear memoised can_operate results, e.g. after Node classes are reloaded.
+    '''
+    _can_operate_results.clear()
+
+
+def intern_name(name):
+    '''
+    Intern an item name, assigning it an id shared by all nodes within the
+    process.
+
+    :param name: Name of a KeyPointValue, KeyTimeInstance, etc.
+    :type name: str
+    :returns: Id of the name.
+    :rtype: int
+    '''
+    name_id = _name_ids.get(name)
+    if name_id is None:
+        with _intern_lock:
+            name_id = _name_ids.get(name)
+            if name_id is None:
+                try:
+                    name = intern(name)
+                except TypeError:
+                    # e.g. unicode within Python 2.
+                    pass
+                name_id = _name_ids[name] = len(_interned_names)
+                _interned_names.append(name)
+    return name_id
+
+
+def interned_name(name_id):
+    '''
+    :param name_id: Id of an interned name (see intern_name).
+    :type name_id: int
+    :returns: Interned name.
+    :rtype: str
+    '''
+    return _interned_names[name_id]
+
+
+def _read_only_dependency(dependency):
+    '''
+    Shallow copy of a dependency whose array is a read-only view (see
+    settings.READ_ONLY_DEPENDENCIES). The dependency itself is not modified
+    as it may be shared with other Nodes through the cache.
+
+    :param dependency: Dependency passed to derive.
+    :type dependency: Node or None
+    :returns: Copy of dependency with a read-only array or dependency if it
+        does not have a masked array.
+    :rtype: Node or None
+    '''
+    array = getattr(dependency, 'array', None)
+    if not isinstance(array, np.ma.MaskedArray):
+        return dependency
+    # copy.copy would rebuild MappedArrays through __getstate__.
+    read_only = object.__new__(dependency.__class__)
+    read_only.__dict__.update(dependency.__dict__)
+    read_only.__dict__['array'] = read_only_view(array)
+    return read_only
+
+
+def _copied_dependency(dependency):
+    '''
+    Copy of a dependency which derive may modify without affecting other
+    Nodes sharing the dependency through params or the cache.
+
+    :param dependency: Dependency passed to derive.
+    :type dependency: Node or None
+    :returns: Copy of dependency.
+    :rtype: Node or None
+    '''
+    if dependency is None:
+        return None
+    array = getattr(dependency, 'array', None)
+    if not isinstance(array, np.ma.MaskedArray):
+        return copy.deepcopy(dependency)
+    # copy.copy would rebuild MappedArrays through __getstate__.
+    copied = object.__new__(dependency.__class__)
+    copied.__dict__.update(dependency.__dict__)
+    copied.__dict__['array'] = array.copy()
+    if '_state_masks' in copied.__dict__:
+        # State masks are cached from the array and must not be shared.
+        copied.__dict__['_state_masks'] = {}
+    return copied
+
+
+def _dependency_digests(dependencies):
+    '''
+    :param dependencies: Dependencies passed to derive.
+    :type dependencies: [Node or None]
+    :returns: Fingerprint of each dependency array keyed by dependency name.
+    :rtype: dict
+    '''
+    # Imported here as analysis_engine.fingerprint depends upon this module.
+    from analysis_engine.fingerprint import array_fingerprint
+    return {d.name: array_fingerprint(d.array) for d in dependencies
+            if isinstance(getattr(d, 'array', None), np.ndarray)}
+
+
 class NodeManager(object):
     def __repr__(self):
         return 'NodeManager: x%d nodes in total' % (
@@ -2528,18 +3269,11 @@ class NodeManager(object):
             return True
         elif name in self.derived_nodes:
             derived_node = self.derived_nodes[name]
-            # NOTE: Raises "Unbound method" here due to can_operate being
-            # overridden without wrapping with @classmethod decorator
-            attributes = []
-            argspec = inspect.getargspec(derived_node.can_operate)
-            if argspec.defaults:
-                for default in argspec.defaults:
-                    if not isinstance(default, Attribute):
-                        raise TypeError('Only Attributes may be keyword '
-                                        'arguments in can_operate methods.')
-                    attributes.append(self.get_attribute(default.name))
+            attributes = [self.get_attribute(attribute_name) for
+                          attribute_name in
+                          derived_node.get_can_operate_attribute_names()]
             # can_operate expects attributes.
-            res = derived_node.can_operate(available, *attributes)
+            res = can_operate(derived_node, available, attributes)
             ##if not res:
             ##    logger.debug("Derived Node '%s' cannot operate with available nodes: %s",
             ##                 name, available)
@@ -0,0 +1,219 @@
+'''
+Cache of aligned Nodes passed into Nodes as cache= to avoid repeatedly
+aligning the same dependency to the same frequency and offset.
+'''
+import copy
+import logging
+import numpy as np
+import os
+import tempfile
+import threading
+
+from collections import OrderedDict
+
+
+logger = logging.getLogger(name=__name__)
+
+
+def _array_nbytes(array):
+    '''
+    :param array: Array of a cached Node (or None).
+    :type array: np.ma.MaskedArray or None
+    :returns: Bytes consumed by the array data and mask.
+    :rtype: int
+    '''
+    if array is None:
+        return 0
+    nbytes = array.nbytes
+    mask = np.ma.getmask(array)
+    if mask is not np.ma.nomask:
+        nbytes += mask.nbytes
+    return nbytes
+
+
+class NodeCache(object):
+    '''
+    Dictionary-like cache of aligned Nodes with a byte budget and least
+    recently used (LRU) eviction. Evicted arrays can optionally be spilled to
+    memory mapped files within a scratch directory rather than being
+    discarded so that they may still be reused without realignment.
+
+    Safe to use from multiple threads.
+    '''
+
+    def __init__(self, max_bytes=None, spill_path=None):
+        '''
+        :param max_bytes: Maximum bytes of arrays held in memory. None is
+            unbounded.
+        :type max_bytes: int or None
+        :param spill_path: Directory to spill evicted arrays to as np.memmap
+            files. None discards evicted Nodes.
+        :type spill_path: str or None
+        '''
+        self.max_bytes = max_bytes
+        self.spill_path = spill_path
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.spills = 0
+        self._nodes = OrderedDict()  # key: (node, nbytes), most recent last
+        self._spilled = {}  # key: node with memory mapped array
+        self._spill_files = []  # spill files which could not be unlinked
+        self._lock = threading.RLock()
+
+    def __repr__(self):
+        return '%s(%d nodes, %d bytes, %d spilled, hits=%d, misses=%d, ' \
+            'evictions=%d)' % (
+                self.__class__.__name__, len(self._nodes), self.nbytes,
+                len(self._spilled), self.hits, self.misses, self.evictions)
+
+    def __len__(self):
+        return len(self._nodes) + len(self._spilled)
+
+    def __contains__(self, key):
+        return key in self._nodes or key in self._spilled
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._nodes) + list(self._spilled))
+
+    def __getitem__(self, key):
+        node = self.get(key)
+        if node is None:
+            raise KeyError(key)
+        return node
+
+    def __setitem__(self, key, node):
+        nbytes = _array_nbytes(getattr(node, 'array', None))
+        with self._lock:
+            self._remove(key)
+            if self.max_bytes is not None and nbytes > self.max_bytes:
+                # Larger than the entire budget.
+                self.evictions += 1
+                self._spill(key, node)
+                return
+            self._nodes[key] = (node, nbytes)
+            self.nbytes += nbytes
+            self._evict()
+
+    def __delitem__(self, key):
+        with self._lock:
+            if not self._remove(key):
+                raise KeyError(key)
+
+    def get(self, key, default=None):
+        '''
+        :param key: Cache key (see Node.cache_key).
+        :type key: tuple
+        :returns: Cached Node, otherwise default.
+        :rtype: Node
+        '''
+        with self._lock:
+            try:
+                node, nbytes = self._nodes.pop(key)
+            except KeyError:
+                node = self._spilled.get(key)
+                if node is None:
+                    self.misses += 1
+                    return default
+            else:
+                # Mark as most recently used.
+                self._nodes[key] = (node, nbytes)
+            self.hits += 1
+            return node
+
+    def pop(self, key, default=None):
+        '''
+        Remove key from the cache.
+
+        :returns: The removed Node, otherwise default.
+        :rtype: Node
+        '''
+        with self._lock:
+            node = self._remove(key)
+        return default if node is None else node
+
+    def clear(self):
+        '''
+        Remove all Nodes and spill files.
+        '''
+        with self._lock:
+            self._nodes.clear()
+            self._spilled.clear()
+            self.nbytes = 0
+            for path in self._spill_files:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._spill_files = []
+
+    def _remove(self, key):
+        '''
+        :returns: The removed Node or None if not cached.
+        '''
+        try:
+            node, nbytes = self._nodes.pop(key)
+        except KeyError:
+            return self._spilled.pop(key, None)
+        self.nbytes -= nbytes
+        return node
+
+    def _evict(self):
+        '''
+        Evict least recently used Nodes until within the byte budget.
+        '''
+        if self.max_bytes is None:
+            return
+        while self.nbytes > self.max_bytes and self._nodes:
+            key, (node, nbytes) = self._nodes.popitem(last=False)
+            self.nbytes -= nbytes
+            self.evictions += 1
+            self._spill(key, node)
+
+    def _spill(self, key, node):
+        '''
+        Keep a copy of an evicted node with its array memory mapped if a
+        spill_path is configured. Only np.ma.MaskedArray arrays are spilled
+        as subclasses (e.g. MappedArray) carry additional state.
+        '''
+        array = getattr(node, 'array', None)
+        if not self.spill_path or type(array) is not np.ma.MaskedArray:
+            return
+        try:
+            data = self._memmap(array.data)
+            mask = np.ma.getmask(array)
+            if mask is not np.ma.nomask:
+                mask = self._memmap(mask)
+        except (IOError, OSError):
+            logger.warning("Unable to spill '%s' to '%s'.", key,
+                           self.spill_path)
+            return
+        # Copy the node as it may still be in use by the node it was aligned
+        # for.
+        node = copy.copy(node)
+        node.array = np.ma.MaskedArray(data, mask=mask, copy=False)
+        self._spilled[key] = node
+        self.spills += 1
+
+    def _memmap(self, array):
+        '''
+        :returns: Copy of array within a memory mapped file.
+        :rtype: np.memmap
+        '''
+        if not array.size:
+            return array.copy()
+        if not os.path.isdir(self.spill_path):
+            os.makedirs(self.spill_path)
+        fd, path = tempfile.mkstemp(dir=self.spill_path, suffix='.npy')
+        os.close(fd)
+        mm = np.memmap(path, dtype=array.dtype, mode='w+', shape=array.shape)
+        mm[:] = array
+        mm.flush()
+        try:
+            # The mapping remains valid after unlinking on POSIX systems.
+            os.remove(path)
+        except OSError:
+            self._spill_files.append(path)
+        return mm
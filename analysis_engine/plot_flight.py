@@ -19,7 +19,7 @@ from analysis_engine.library import (
     bearing_and_distance, 
     latitudes_and_longitudes, 
     repair_mask, 
-    value_at_index,
+    value_at_indices,
 )
 from analysis_engine.node import derived_param_from_hdf, Parameter
 
@@ -107,15 +107,13 @@ def add_track(kml, track_name, lat, lon, colour, alt_param=None, alt_mode=None,
     ##scope_lat = np.ma.flatnotmasked_edges(lat.array)
     ##begin = max(scope_lon[0], scope_lat[0])+1
     ##end = min(scope_lon[1], scope_lat[1])-1
-    for i in range(0, len(lon.array)):
-        _lon = value_at_index(lon.array, i)
-        _lat = value_at_index(lat.array, i)
-        if alt_param:
-            _alt = value_at_index(alt_param.array, i)
-            coords = (_lon, _lat, _alt)
-        else:
-            coords = (_lon, _lat)
-            
+    indices = np.arange(len(lon.array))
+    # Masked values are converted to None.
+    coord_arrays = [value_at_indices(lon.array, indices).tolist(),
+                    value_at_indices(lat.array, indices).tolist()]
+    if alt_param:
+        coord_arrays.append(value_at_indices(alt_param.array, indices).tolist())
+    for coords in zip(*coord_arrays):
         if not all(coords) or any(np.isnan(coords)):
             continue
         track_coords.append(coords)
@@ -248,7 +246,11 @@ def track_to_kml(hdf_path, kti_list, kpv_list, approach_list,
                 best_lon = derived_param_from_hdf(lon).get_aligned(one_hz)
     
     # Add KTIs.
-    for kti in kti_list:
+    if alt:
+        kti_altitudes = alt.at_many([kti.index for kti in kti_list]).tolist()
+    else:
+        kti_altitudes = [None] * len(kti_list)
+    for kti, altitude in zip(kti_list, kti_altitudes):
         kti_point_values = {'name': kti.name}
         
         if not KEEP_KTIS and kti.name in SKIP_KTIS:
@@ -256,7 +258,7 @@ def track_to_kml(hdf_path, kti_list, kpv_list, approach_list,
         elif len(KEEP_KTIS)>0 and (kti.name not in KEEP_KTIS):
             continue
         
-        altitude = alt.at(kti.index) if alt else None
+
         kti_point_values['altitudemode'] = altitude_mode
         if altitude:
             kti_point_values['coords'] = ((kti.longitude, kti.latitude, altitude),)
@@ -265,13 +267,19 @@ def track_to_kml(hdf_path, kti_list, kpv_list, approach_list,
         kml.newpoint(**kti_point_values)
     
     # Add KPVs.
-    for kpv in kpv_list:
+    kpv_indices = [kpv.index for kpv in kpv_list]
+    kpv_lats = best_lat.at_many(kpv_indices).tolist()
+    kpv_lons = best_lon.at_many(kpv_indices).tolist()
+    if alt:
+        kpv_altitudes = alt.at_many(kpv_indices).tolist()
+    else:
+        kpv_altitudes = [None] * len(kpv_list)
+    for kpv, kpv_lat, kpv_lon, altitude in zip(kpv_list, kpv_lats, kpv_lons,
+                                               kpv_altitudes):
 
         # Trap kpvs with invalid latitude or longitude data (normally happens
         # at the start of the data where accelerometer offsets are declared,
         # and this avoids casting kpvs into the Atlantic.
-        kpv_lat = best_lat.at(kpv.index)
-        kpv_lon = best_lon.at(kpv.index)
         if kpv_lat is None or kpv_lon is None or \
            (kpv_lat == 0.0 and kpv_lon == 0.0):
             continue
@@ -284,7 +292,6 @@ def track_to_kml(hdf_path, kti_list, kpv_list, approach_list,
         style = simplekml.Style()
         style.iconstyle.color = simplekml.Color.red
         kpv_point_values = {'name': '%s (%.3f)' % (kpv.name, kpv.value)}
-        altitude = alt.at(kpv.index) if alt else None
         kpv_point_values['altitudemode'] = altitude_mode
         if altitude:
             kpv_point_values['coords'] = ((kpv_lon, kpv_lat, altitude),)
@@ -535,8 +542,10 @@ def csv_flight_details(hdf_path, kti_list, kpv_list, phase_list,
             p = hdf[param]
             dp = Parameter(name=p.name, array=p.array, 
                            frequency=p.frequency, offset=p.offset)
-            for row in rows:
-                row[param] = dp.at(row['index'])
+            # Masked values are converted to None.
+            values = dp.at_many([row['index'] for row in rows]).tolist()
+            for row, value in zip(rows, values):
+                row[param] = value
 
     # sort rows
     rows = sorted(rows, key=lambda x: x['index'])
@@ -1,15 +1,22 @@
 from __future__ import print_function
 
 import argparse
+import heapq
 import itertools
 import json
 import logging
+import multiprocessing
+import numpy as np
 import os
 import six
 import sys
+import traceback
 
+from collections import defaultdict
 from datetime import datetime, timedelta
+from multiprocessing.pool import ThreadPool
 from networkx.readwrite import json_graph
+from six.moves import queue
 
 from flightdatautilities.filesystem_tools import copy_file
 
@@ -17,6 +24,8 @@ from hdfaccess.file import hdf_file
 
 from analysis_engine import hooks, settings, __version__
 from analysis_engine.dependency_graph import dependency_order
+from analysis_engine.fingerprint import (NODE_FINGERPRINTS_ATTR,
+                                         node_fingerprints, unchanged_nodes)
 from analysis_engine.json_tools import json_to_process_flight, process_flight_to_nodes
 from analysis_engine.library import np_ma_masked_zeros, repair_mask
 from analysis_engine.node import (ApproachNode, Attribute,
@@ -27,8 +36,11 @@ from analysis_engine.node import (ApproachNode, Attribute,
                                   KeyTimeInstanceNode,
                                   NodeManager, P, Section, SectionNode,
                                   NODE_SUBCLASSES)
-from analysis_engine.settings import NODE_CACHE
+from analysis_engine.node_cache import NodeCache
+from analysis_engine.profiling import NodeProfiler, PROFILE_FIELDS
+from analysis_engine.settings import NODE_CACHE, NODE_RELEASE
 from analysis_engine.utils import get_aircraft_info, get_derived_nodes
+from analysis_engine.write_behind import WriteBehindHDF
 
 
 logger = logging.getLogger(__name__)
@@ -63,9 +75,14 @@ def geo_locate(hdf, items):
     lat_pos.array = repair_mask(lat_pos.array, repair_duration=None, extrapolate=True)
     lon_pos.array = repair_mask(lon_pos.array, repair_duration=None, extrapolate=True)
     
-    for item in itertools.chain.from_iterable(six.itervalues(items)):
-        item.latitude = lat_pos.at(item.index) or None
-        item.longitude = lon_pos.at(item.index) or None
+    item_list = list(itertools.chain.from_iterable(six.itervalues(items)))
+    indices = [item.index for item in item_list]
+    # Masked values are converted to None.
+    latitudes = lat_pos.at_many(indices).tolist()
+    longitudes = lon_pos.at_many(indices).tolist()
+    for item, latitude, longitude in zip(item_list, latitudes, longitudes):
+        item.latitude = latitude or None
+        item.longitude = longitude or None
     return items
 
 
@@ -94,7 +111,446 @@ def get_node_type(node, node_subclasses):
     return node.__class__.__name__
 
 
-def derive_parameters(hdf, node_mgr, process_order, params=None, force=False):
+def _use_initial_node(param_name, node_mgr, params, results):
+    '''
+    Populate the results with a Node which does not need to be derived, i.e.
+    it is an HDF parameter, an attribute or was provided within the initial
+    params.
+
+    :returns: Whether the Node does not need to be derived.
+    :rtype: bool
+    '''
+    ktis, kpvs, sections, approaches, flight_attrs = results
+
+    if param_name in node_mgr.hdf_keys:
+        return True
+
+    elif param_name in params:
+        node = params[param_name]
+        # populate output already at 1Hz
+        if node.node_type is KeyPointValueNode:
+            kpvs[param_name] = list(node)
+        elif node.node_type is KeyTimeInstanceNode:
+            ktis[param_name] = list(node)
+        elif node.node_type is FlightAttributeNode:
+            flight_attrs[param_name] = [Attribute(node.name, node.value)]
+        elif node.node_type is SectionNode:
+            sections[param_name] = list(node)
+        # DerivedParameterNodes are not supported in initial data.
+        return True
+
+    elif node_mgr.get_attribute(param_name) is not None:
+        # add attribute to dictionary of available params
+        ###params[param_name] = node_mgr.get_attribute(param_name)
+        #TODO: optimise with only one call to get_attribute
+        return True
+
+    return False
+
+
+def _get_dependencies(hdf, node_mgr, node_class, params, cache,
+                      unavailable=()):
+    '''
+    Build the ordered list of dependencies for the derive method of
+    node_class.
+
+    :param unavailable: Dependency names which must not be provided even if
+        they have already been derived (used to keep the parallel scheduler
+        consistent with process_order).
+    :type unavailable: set of str
+    :returns: Dependencies in the order of the derive method's arguments, with
+        None where a dependency is not available.
+    :rtype: list
+    '''
+    deps = []
+    node_deps = node_class.get_dependency_names()
+    for dep_name in node_deps:
+        if dep_name in unavailable:
+            deps.append(None)
+        elif dep_name in params:  # already calculated KPV/KTI/Phase
+            deps.append(params[dep_name])
+        elif node_mgr.get_attribute(dep_name) is not None:
+            deps.append(node_mgr.get_attribute(dep_name))
+        elif dep_name in node_mgr.hdf_keys:
+            # LFL/Derived parameter
+            # all parameters (LFL or other) need get_aligned which is
+            # available on DerivedParameterNode
+            try:
+                dp = derived_param_from_hdf(hdf.get_param(
+                    dep_name, valid_only=True), cache=cache)
+            except KeyError:
+                # Parameter is invalid.
+                dp = None
+            deps.append(dp)
+        else:  # dependency not available
+            deps.append(None)
+    if all([d is None for d in deps]):
+        raise RuntimeError(
+            "No dependencies available - Nodes cannot "
+            "operate without ANY dependencies available! "
+            "Node: %s" % node_class.__name__)
+    return deps
+
+
+def _derive_node(node_class, param_name, deps, params, hdf, node_mgr, cache,
+                 force=False, profiler=None, copy_dependencies=False):
+    '''
+    Initialise node_class and derive it from deps.
+
+    :param profiler: Records the cost of deriving the node if provided.
+    :type profiler: NodeProfiler or None
+    :param copy_dependencies: Derive from copies of deps (see
+        Node.get_derived).
+    :type copy_dependencies: bool
+    :returns: The derived Node.
+    :rtype: Node
+    '''
+    # initialise node
+    node = node_class(cache=cache)
+    # shhh, secret accessors for developing nodes in debug mode
+    node._p = params
+    node._h = hdf
+    node._n = node_mgr
+    logger.debug("Processing %s `%s`", get_node_type(node, NODE_SUBCLASSES), param_name)
+    # Derive the resulting value
+    if profiler:
+        profile = profiler.begin()
+
+    try:
+        node = node.get_derived(deps, copy_dependencies=copy_dependencies)
+    except:
+        if not force:
+            raise
+
+    if profiler:
+        profiler.end(profile, param_name, node)
+
+    del node._p
+    del node._h
+    del node._n
+    node.__dict__.pop('_align_time', None)
+    return node
+
+
+def _one_hz_items(node, duration):
+    '''
+    Align the items of a KeyPointValueNode or KeyTimeInstanceNode to 1Hz and
+    check their indices are within the duration of the flight.
+
+    :type node: KeyPointValueNode or KeyTimeInstanceNode
+    :param duration: Duration of the flight in seconds.
+    :type duration: float
+    :returns: Items aligned to 1Hz.
+    :rtype: list
+    :raises IndexError: If an aligned index is not within the duration.
+    '''
+    one_hz = P(frequency=1, offset=0)
+    try:
+        aligned = node.get_aligned_columns(one_hz)
+        indices = aligned.index
+    except TypeError:
+        aligned = node.get_aligned(one_hz)
+        indices = np.array([item.index for item in aligned], dtype=float)
+    outside = np.flatnonzero(~((indices >= 0) & (indices <= duration + 4)))
+    if len(outside):
+        item = aligned[outside[0]]
+        raise IndexError(
+            "%s '%s' index %.2f is not between 0 and %d" %
+            (node.node_type_abbr, item.name, item.index, duration))
+    return list(aligned)
+
+
+def _store_node(hdf, node_mgr, param_name, node, params, results, force=False):
+    '''
+    Validate a derived Node, align it to 1Hz and store it within params and
+    results. DerivedParameterNodes are saved to the HDF file.
+    '''
+    ktis, kpvs, sections, approaches, flight_attrs = results
+    duration = hdf.duration
+
+    if node.node_type is KeyPointValueNode:
+        params[param_name] = node
+        kpvs[param_name] = _one_hz_items(node, duration)
+    elif node.node_type is KeyTimeInstanceNode:
+        params[param_name] = node
+        ktis[param_name] = _one_hz_items(node, duration)
+    elif node.node_type is FlightAttributeNode:
+        params[param_name] = node
+        try:
+            # only has one Attribute node, store as a list for consistency
+            flight_attrs[param_name] = [Attribute(node.name, node.value)]
+        except:
+            logger.warning("Flight Attribute Node '%s' returned empty "
+                           "handed.", param_name)
+    elif issubclass(node.node_type, SectionNode):
+        aligned_section = node.get_aligned(P(frequency=1, offset=0))
+        for index, one_hz in enumerate(aligned_section):
+            # SectionNodes allow slice starts and stops being None which
+            # signifies the beginning and end of the data. To avoid
+            # TypeErrors in subsequent derive methods which perform
+            # arithmetic on section slice start and stops, replace with 0
+            # or hdf.duration.
+            fallback = lambda x, y: x if x is not None else y
+
+            duration = fallback(duration, 0)
+
+            start = fallback(one_hz.slice.start, 0)
+            stop = fallback(one_hz.slice.stop, duration)
+            start_edge = fallback(one_hz.start_edge, 0)
+            stop_edge = fallback(one_hz.stop_edge, duration)
+
+            slice_ = slice(start, stop)
+            one_hz = Section(one_hz.name, slice_, start_edge, stop_edge)
+            aligned_section[index] = one_hz
+
+            if not (0 <= start <= duration and 0 <= stop <= duration + 4):
+                msg = "Section '%s' (%.2f, %.2f) not between 0 and %d"
+                raise IndexError(
+                    msg % (one_hz.name, start, stop, duration))
+            if not 0 <= start_edge <= duration:
+                msg = "Section '%s' start_edge (%.2f) not between 0 and %d"
+                raise IndexError(msg % (one_hz.name, start_edge, duration))
+            if not 0 <= stop_edge <= duration + 4:
+                msg = "Section '%s' stop_edge (%.2f) not between 0 and %d"
+                raise IndexError(msg % (one_hz.name, stop_edge, duration))
+            #section_list.append(one_hz)
+        params[param_name] = aligned_section
+        sections[param_name] = list(aligned_section)
+    elif issubclass(node.node_type, DerivedParameterNode):
+        if duration:
+            # check that the right number of nodes were returned Allow a
+            # small tolerance. For example if duration in seconds is 2822,
+            # then there will be an array length of  1411 at 0.5Hz and 706
+            # at 0.25Hz (rounded upwards). If we combine two 0.25Hz
+            # parameters then we will have an array length of 1412.
+            expected_length = duration * node.frequency
+            if node.array is None or (force and len(node.array) == 0):
+                logger.warning("No array set; creating a fully masked "
+                               "array for %s", param_name)
+                array_length = expected_length
+                # Where a parameter is wholly masked, we fill the HDF
+                # file with masked zeros to maintain structure.
+                node.array = \
+                    np_ma_masked_zeros(expected_length)
+            else:
+                array_length = len(node.array)
+            length_diff = array_length - expected_length
+            if length_diff == 0:
+                pass
+            elif 0 < length_diff < 5:
+                logger.warning("Cutting excess data for parameter '%s'. "
+                               "Expected length was '%s' while resulting "
+                               "array length was '%s'.", param_name,
+                               expected_length, len(node.array))
+                node.array = node.array[:expected_length]
+            else:
+                raise ValueError("Array length mismatch for parameter "
+                                 "'%s'. Expected '%s', resulting array "
+                                 "length '%s'." % (param_name,
+                                                   expected_length,
+                                                   array_length))
+
+        hdf.set_param(node)
+        # Keep hdf_keys up to date.
+        node_mgr.hdf_keys.append(param_name)
+    elif issubclass(node.node_type, ApproachNode):
+        aligned_approach = node.get_aligned(P(frequency=1, offset=0))
+        for approach in aligned_approach:
+            # Does not allow slice start or stops to be None.
+            valid_turnoff = (not approach.turnoff or
+                             (0 <= approach.turnoff <= duration))
+            valid_slice = ((0 <= approach.slice.start <= duration) and
+                           (0 <= approach.slice.stop <= duration))
+            valid_gs_est = (not approach.gs_est or
+                            ((0 <= approach.gs_est.start <= duration) and
+                             (0 <= approach.gs_est.stop <= duration)))
+            valid_loc_est = (not approach.loc_est or
+                             ((0 <= approach.loc_est.start <= duration) and
+                              (0 <= approach.loc_est.stop <= duration)))
+            if not all([valid_turnoff, valid_slice, valid_gs_est,
+                        valid_loc_est]):
+                raise ValueError('ApproachItem contains index outside of '
+                                 'flight data: %s' % approach)
+        params[param_name] = aligned_approach
+        approaches[param_name] = list(aligned_approach)
+    else:
+        raise NotImplementedError("Unknown Type %s" % node.__class__)
+
+
+def _count_consumers(node_mgr, process_order, params):
+    '''
+    Determine the dependencies consumed by each node which will be derived
+    and the number of nodes which will consume each dependency. Dependencies
+    which appear later within process_order are not consumed.
+
+    :returns: Dependency names consumed by each node to be derived and the
+        number of consumers of each node.
+    :rtype: (dict, defaultdict)
+    '''
+    position = {name: pos for pos, name in enumerate(process_order)}
+    consumed = {}
+    consumers = defaultdict(int)
+    for param_name in process_order:
+        if param_name in node_mgr.hdf_keys or param_name in params \
+           or node_mgr.get_attribute(param_name) is not None:
+            continue
+        node_class = node_mgr.derived_nodes[param_name]
+        consumed[param_name] = [
+            d for d in set(node_class.get_dependency_names())
+            if position.get(d, len(position)) < position[param_name]]
+        for dep_name in consumed[param_name]:
+            consumers[dep_name] += 1
+    return consumed, consumers
+
+
+def _release_nodes(param_name, consumed, consumers, hdf, params, cache):
+    '''
+    Called once param_name has been derived to release the nodes which no
+    longer have any remaining consumers (including param_name itself if it
+    has none). Aligned copies are removed from the node cache, parameters
+    from the HDF file's cache and nodes derived within this run from params.
+    '''
+    release = [] if consumers.get(param_name) else [param_name]
+    for dep_name in consumed[param_name]:
+        consumers[dep_name] -= 1
+        if not consumers[dep_name]:
+            release.append(dep_name)
+
+    for name in release:
+        if cache:
+            # Copy keys as worker threads may be adding to the cache.
+            for key in [k for k in list(cache) if k[0] == name]:
+                cache.pop(key, None)
+        if name in consumed:
+            params.pop(name, None)
+        if name in hdf.cache_param_list:
+            # Saving a parameter may update the cache, so hold the lock of a
+            # WriteBehindHDF writer thread.
+            lock = getattr(hdf, 'hdf_lock', None)
+            if lock is None:
+                _uncache_param(hdf, name)
+            else:
+                with lock:
+                    _uncache_param(hdf, name)
+
+
+def _uncache_param(hdf, name):
+    '''
+    Stop caching name within the HDF file and release its cached copy.
+    hdf_file does not provide a method to evict a cached parameter, so it is
+    removed from the file's cache directly.
+    '''
+    if name in hdf.cache_param_list:
+        hdf.cache_param_list.remove(name)
+    cache = getattr(hdf, '_cache', None)
+    if cache is not None:
+        cache.pop(name, None)
+
+
+def _derive_task(completed, *args, **kwargs):
+    '''
+    Derive a node within a worker thread and put the outcome onto the
+    completed queue as (param_name, node, exc_info).
+    '''
+    param_name = args[1]
+    try:
+        node = _derive_node(*args, **kwargs)
+    except Exception:
+        completed.put((param_name, None, sys.exc_info()))
+    else:
+        completed.put((param_name, node, None))
+
+
+def _derive_parameters_parallel(hdf, node_mgr, process_order, gr_st, params,
+                                results, cache, force, workers, profiler,
+                                consumed, consumers):
+    '''
+    Derives nodes concurrently on a pool of worker threads. A node is
+    submitted once all of its dependencies which precede it within
+    process_order have been stored.
+
+    Dependencies which appear later within process_order (circular
+    dependencies avoided by the dependency tree) are withheld from the node
+    so that the results match those of the serial implementation.
+
+    Only the derive step runs within the worker threads; reading
+    dependencies from and saving parameters to the HDF file are performed by
+    the calling thread as the HDF file is not thread-safe. Each node derives
+    from its own copies of its dependencies, as many nodes modify their
+    dependencies in place and the dependencies are shared between threads.
+    '''
+    position = {}
+    for param_name in process_order:
+        if _use_initial_node(param_name, node_mgr, params, results):
+            continue
+        position[param_name] = len(position)
+
+    waiting = {}
+    unavailable = {}
+    dependants = defaultdict(list)
+    ready = []
+    for param_name, pos in six.iteritems(position):
+        #NB raises KeyError if Node is "unknown"
+        node_class = node_mgr.derived_nodes[param_name]
+        if gr_st is not None:
+            dep_names = gr_st.successors(param_name)
+        else:
+            dep_names = node_class.get_dependency_names()
+        waiting[param_name] = set()
+        for dep_name in dep_names:
+            if dep_name not in position:
+                continue
+            elif position[dep_name] < pos:
+                waiting[param_name].add(dep_name)
+                dependants[dep_name].append(param_name)
+        unavailable[param_name] = {
+            d for d in node_class.get_dependency_names()
+            if position.get(d, -1) > pos}
+        if not waiting[param_name]:
+            heapq.heappush(ready, (pos, param_name))
+
+    completed = queue.Queue()
+    pool = ThreadPool(workers)
+    running = 0
+    try:
+        while ready or running:
+            while ready:
+                pos, param_name = heapq.heappop(ready)
+                node_class = node_mgr.derived_nodes[param_name]
+                deps = _get_dependencies(hdf, node_mgr, node_class, params,
+                                         cache, unavailable[param_name])
+                pool.apply_async(
+                    _derive_task,
+                    (completed, node_class, param_name, deps, params, hdf,
+                     node_mgr, cache),
+                    {'force': force, 'profiler': profiler,
+                     'copy_dependencies': True})
+                running += 1
+
+            param_name, node, exc_info = completed.get()
+            running -= 1
+            if exc_info:
+                six.reraise(*exc_info)
+            _store_node(hdf, node_mgr, param_name, node, params, results,
+                        force=force)
+            if consumed is not None:
+                _release_nodes(param_name, consumed, consumers, hdf, params,
+                               cache)
+            for dependant in dependants.pop(param_name, []):
+                waiting[dependant].discard(param_name)
+                if not waiting[dependant]:
+                    heapq.heappush(ready, (position[dependant], dependant))
+    except:
+        pool.terminate()
+        raise
+    else:
+        pool.close()
+    finally:
+        pool.join()
+
+
+def derive_parameters(hdf, node_mgr, process_order, params=None, force=False,
+                      gr_st=None, workers=1, profiler=None):
     '''
     Derives parameters in process_order. Dependencies are sourced via the
     node_mgr.
@@ -107,12 +563,19 @@ def derive_parameters(hdf, node_mgr, process_order, params=None, force=False):
     :param process_order: Parameter / Node class names in the required order to
         be processed
     :type process_order: list of strings
+    :param gr_st: Spanning tree of active nodes as returned by
+        dependency_order. Used to schedule nodes when workers > 1.
+    :type gr_st: SpanningTree
+    :param workers: Number of threads to derive nodes with. Nodes whose
+        dependencies are satisfied are derived concurrently when greater
+        than 1.
+    :type workers: int
+    :param profiler: Records the time and memory spent deriving each node.
+    :type profiler: NodeProfiler or None
     '''
     if not params:
         params = {}
-    # OPT: local lookup is faster than module-level (small).
-    node_subclasses = NODE_SUBCLASSES
-    
+
     # store all derived params that aren't masked arrays
     approaches = {}
     # duplicate storage, but maintaining types
@@ -121,208 +584,69 @@ def derive_parameters(hdf, node_mgr, process_order, params=None, force=False):
     # 'Node Name' : node()  pass in node.get_accessor()
     sections = {}
     flight_attrs = {}
+    results = (ktis, kpvs, sections, approaches, flight_attrs)
     # cache of nodes to avoid repeated array alignment
-    cache = {} if NODE_CACHE else None
-    duration = hdf.duration
-
-    for param_name in process_order:
-        if param_name in node_mgr.hdf_keys:
-            continue
-        
-        elif param_name in params:
-            node = params[param_name]
-            # populate output already at 1Hz
-            if node.node_type is KeyPointValueNode:
-                kpvs[param_name] = list(node)
-            elif node.node_type is KeyTimeInstanceNode:
-                ktis[param_name] = list(node)
-            elif node.node_type is FlightAttributeNode:
-                flight_attrs[param_name] = [Attribute(node.name, node.value)]
-            elif node.node_type is SectionNode:
-                sections[param_name] = list(node)
-            # DerivedParameterNodes are not supported in initial data.
-            continue
-
-        elif node_mgr.get_attribute(param_name) is not None:
-            # add attribute to dictionary of available params
-            ###params[param_name] = node_mgr.get_attribute(param_name)
-            #TODO: optimise with only one call to get_attribute
-            continue
-
-        #NB raises KeyError if Node is "unknown"
-        node_class = node_mgr.derived_nodes[param_name]
-
-        # build ordered dependencies
-        deps = []
-        node_deps = node_class.get_dependency_names()
-        for dep_name in node_deps:
-            if dep_name in params:  # already calculated KPV/KTI/Phase
-                deps.append(params[dep_name])
-            elif node_mgr.get_attribute(dep_name) is not None:
-                deps.append(node_mgr.get_attribute(dep_name))
-            elif dep_name in node_mgr.hdf_keys:
-                # LFL/Derived parameter
-                # all parameters (LFL or other) need get_aligned which is
-                # available on DerivedParameterNode
-                try:
-                    dp = derived_param_from_hdf(hdf.get_param(
-                        dep_name, valid_only=True), cache=cache)
-                except KeyError:
-                    # Parameter is invalid.
-                    dp = None
-                deps.append(dp)
-            else:  # dependency not available
-                deps.append(None)
-        if all([d is None for d in deps]):
-            raise RuntimeError(
-                "No dependencies available - Nodes cannot "
-                "operate without ANY dependencies available! "
-                "Node: %s" % node_class.__name__)
-
-        # initialise node
-        node = node_class(cache=cache)
-        # shhh, secret accessors for developing nodes in debug mode
-        node._p = params
-        node._h = hdf
-        node._n = node_mgr
-        logger.debug("Processing %s `%s`", get_node_type(node, node_subclasses), param_name)
-        # Derive the resulting value
-        
-        try:
-            node = node.get_derived(deps)
-        except:
-            if not force:
-                raise
-        
-        del node._p
-        del node._h
-        del node._n
+    cache = NodeCache(max_bytes=settings.NODE_CACHE_MAX_BYTES,
+                      spill_path=settings.NODE_CACHE_SPILL_PATH) \
+        if NODE_CACHE else None
+    # remaining consumers of each node to release nodes once no longer used
+    if NODE_RELEASE:
+        consumed, consumers = _count_consumers(node_mgr, process_order, params)
+    else:
+        consumed = consumers = None
+
+    if profiler:
+        if workers > 1 and profiler.trace_memory:
+            logger.warning('Peak memory is not profiled when deriving nodes '
+                           'concurrently.')
+            profiler.trace_memory = False
+        profiler.start()
+    # save derived parameters to the HDF file from a writer thread
+    writer = None
+    if settings.HDF_WRITE_BEHIND:
+        hdf = writer = WriteBehindHDF(
+            hdf, queue_size=settings.HDF_WRITE_BEHIND_QUEUE_SIZE)
+
+    try:
+        if workers > 1:
+            _derive_parameters_parallel(hdf, node_mgr, process_order, gr_st,
+                                        params, results, cache, force,
+                                        workers, profiler, consumed, consumers)
+            return results
+
+        for param_name in process_order:
+            if _use_initial_node(param_name, node_mgr, params, results):
+                continue
 
-        if node.node_type is KeyPointValueNode:
-            params[param_name] = node
-            
-            aligned_kpvs = []
-            for one_hz in node.get_aligned(P(frequency=1, offset=0)):
-                if not (0 <= one_hz.index <= duration+4):
-                    raise IndexError(
-                        "KPV '%s' index %.2f is not between 0 and %d" %
-                        (one_hz.name, one_hz.index, duration))
-                aligned_kpvs.append(one_hz)
-            kpvs[param_name] = aligned_kpvs
-        elif node.node_type is KeyTimeInstanceNode:
-            params[param_name] = node
-            
-            aligned_ktis = []
-            for one_hz in node.get_aligned(P(frequency=1, offset=0)):
-                if not (0 <= one_hz.index <= duration+4):
-                    raise IndexError(
-                        "KTI '%s' index %.2f is not between 0 and %d" %
-                        (one_hz.name, one_hz.index, duration))
-                aligned_ktis.append(one_hz)
-            ktis[param_name] = aligned_ktis
-        elif node.node_type is FlightAttributeNode:
-            params[param_name] = node
-            try:
-                # only has one Attribute node, store as a list for consistency
-                flight_attrs[param_name] = [Attribute(node.name, node.value)]
-            except:
-                logger.warning("Flight Attribute Node '%s' returned empty "
-                               "handed.", param_name)
-        elif issubclass(node.node_type, SectionNode):
-            aligned_section = node.get_aligned(P(frequency=1, offset=0))
-            for index, one_hz in enumerate(aligned_section):
-                # SectionNodes allow slice starts and stops being None which
-                # signifies the beginning and end of the data. To avoid
-                # TypeErrors in subsequent derive methods which perform
-                # arithmetic on section slice start and stops, replace with 0
-                # or hdf.duration.
-                fallback = lambda x, y: x if x is not None else y
-
-                duration = fallback(duration, 0)
-
-                start = fallback(one_hz.slice.start, 0)
-                stop = fallback(one_hz.slice.stop, duration)
-                start_edge = fallback(one_hz.start_edge, 0)
-                stop_edge = fallback(one_hz.stop_edge, duration)
-
-                slice_ = slice(start, stop)
-                one_hz = Section(one_hz.name, slice_, start_edge, stop_edge)
-                aligned_section[index] = one_hz
-
-                if not (0 <= start <= duration and 0 <= stop <= duration + 4):
-                    msg = "Section '%s' (%.2f, %.2f) not between 0 and %d"
-                    raise IndexError(
-                        msg % (one_hz.name, start, stop, duration))
-                if not 0 <= start_edge <= duration:
-                    msg = "Section '%s' start_edge (%.2f) not between 0 and %d"
-                    raise IndexError(msg % (one_hz.name, start_edge, duration))
-                if not 0 <= stop_edge <= duration + 4:
-                    msg = "Section '%s' stop_edge (%.2f) not between 0 and %d"
-                    raise IndexError(msg % (one_hz.name, stop_edge, duration))
-                #section_list.append(one_hz)
-            params[param_name] = aligned_section
-            sections[param_name] = list(aligned_section)
-        elif issubclass(node.node_type, DerivedParameterNode):
-            if duration:
-                # check that the right number of nodes were returned Allow a
-                # small tolerance. For example if duration in seconds is 2822,
-                # then there will be an array length of  1411 at 0.5Hz and 706
-                # at 0.25Hz (rounded upwards). If we combine two 0.25Hz
-                # parameters then we will have an array length of 1412.
-                expected_length = duration * node.frequency
-                if node.array is None or (force and len(node.array) == 0):
-                    logger.warning("No array set; creating a fully masked "
-                                   "array for %s", param_name)
-                    array_length = expected_length
-                    # Where a parameter is wholly masked, we fill the HDF
-                    # file with masked zeros to maintain structure.
-                    node.array = \
-                        np_ma_masked_zeros(expected_length)
-                else:
-                    array_length = len(node.array)
-                length_diff = array_length - expected_length
-                if length_diff == 0:
-                    pass
-                elif 0 < length_diff < 5:
-                    logger.warning("Cutting excess data for parameter '%s'. "
-                                   "Expected length was '%s' while resulting "
-                                   "array length was '%s'.", param_name,
-                                   expected_length, len(node.array))
-                    node.array = node.array[:expected_length]
-                else:
-                    raise ValueError("Array length mismatch for parameter "
-                                     "'%s'. Expected '%s', resulting array "
-                                     "length '%s'." % (param_name,
-                                                       expected_length,
-                                                       array_length))
-
-            hdf.set_param(node)
-            # Keep hdf_keys up to date.
-            node_mgr.hdf_keys.append(param_name)
-        elif issubclass(node.node_type, ApproachNode):
-            aligned_approach = node.get_aligned(P(frequency=1, offset=0))
-            for approach in aligned_approach:
-                # Does not allow slice start or stops to be None.
-                valid_turnoff = (not approach.turnoff or
-                                 (0 <= approach.turnoff <= duration))
-                valid_slice = ((0 <= approach.slice.start <= duration) and
-                               (0 <= approach.slice.stop <= duration))
-                valid_gs_est = (not approach.gs_est or
-                                ((0 <= approach.gs_est.start <= duration) and
-                                 (0 <= approach.gs_est.stop <= duration)))
-                valid_loc_est = (not approach.loc_est or
-                                 ((0 <= approach.loc_est.start <= duration) and
-                                  (0 <= approach.loc_est.stop <= duration)))
-                if not all([valid_turnoff, valid_slice, valid_gs_est,
-                            valid_loc_est]):
-                    raise ValueError('ApproachItem contains index outside of '
-                                     'flight data: %s' % approach)
-            params[param_name] = aligned_approach
-            approaches[param_name] = list(aligned_approach)
-        else:
-            raise NotImplementedError("Unknown Type %s" % node.__class__)
-        continue
-    return ktis, kpvs, sections, approaches, flight_attrs
+            #NB raises KeyError if Node is "unknown"
+            node_class = node_mgr.derived_nodes[param_name]
+
+            # build ordered dependencies
+            deps = _get_dependencies(hdf, node_mgr, node_class, params, cache)
+            node = _derive_node(node_class, param_name, deps, params, hdf,
+                                node_mgr, cache, force=force,
+                                profiler=profiler)
+            _store_node(hdf, node_mgr, param_name, node, params, results,
+                        force=force)
+            if consumed is not None:
+                _release_nodes(param_name, consumed, consumers, hdf, params,
+                               cache)
+        return results
+    except:
+        if writer:
+            # Do not mask the original exception with a write error.
+            writer.close(raise_error=False)
+            writer = None
+        raise
+    finally:
+        if profiler:
+            profiler.stop()
+        if cache is not None:
+            logger.debug("Node cache: %r", cache)
+            cache.clear()
+        if writer:
+            # Save all parameters and raise any write error.
+            writer.close()
 
 
 def parse_analyser_profiles(analyser_profiles, filter_modules=None):
@@ -358,7 +682,8 @@ def parse_analyser_profiles(analyser_profiles, filter_modules=None):
 def process_flight(segment_info, tail_number, aircraft_info={}, achieved_flight_record={},
                    requested=[], required=[], include_flight_attributes=True,
                    additional_modules=[], pre_flight_kwargs={}, force=False,
-                   initial={}, reprocess=False):
+                   initial={}, reprocess=False, workers=None, profiler=None,
+                   incremental=False):
     '''
     Processes the HDF file (segment_info['File']) to derive the required_params (Nodes)
     within python modules (settings.NODE_MODULES).
@@ -389,6 +714,12 @@ def process_flight(segment_info, tail_number, aircraft_info={}, achieved_flight_
     :param initial: Initial content for nodes to avoid reprocessing (excluding parameter nodes which are saved to the hdf).
     :type initial: dict
     :param reprocess: Force reprocessing of all Nodes (including derived Nodes already saved to the HDF file).
+    :param workers: Number of threads used to derive independent nodes concurrently. Defaults to settings.DERIVE_PARAMETERS_WORKERS.
+    :type workers: int or None
+    :param profiler: Records the time and memory spent deriving each Node.
+    :type profiler: NodeProfiler or None
+    :param incremental: Reprocess only Nodes whose fingerprint has changed since the HDF file was last incrementally processed. Unchanged derived parameters are reused from the HDF file and other unchanged Nodes from initial. Nodes are otherwise derived from the LFL parameters as with reprocess.
+    :type incremental: bool
 
     :returns: See below:
     :rtype: Dict
@@ -584,8 +915,10 @@ def process_flight(segment_info, tail_number, aircraft_info={}, achieved_flight_
                 ['analysis_engine.flight_attribute']).keys())))
     
     initial = process_flight_to_nodes(initial)
-    for node_name in requested:
-        initial.pop(node_name, None)
+    if not incremental:
+        # Nodes within initial are reused if unchanged when incremental.
+        for node_name in requested:
+            initial.pop(node_name, None)
 
     # open HDF for reading
     with hdf_file(hdf_path) as hdf:
@@ -600,7 +933,7 @@ def process_flight(segment_info, tail_number, aircraft_info={}, achieved_flight_
             logger.info("No PRE_FLIGHT_ANALYSIS actions to perform")
 
         # Merge Params
-        param_names = hdf.valid_lfl_param_names() if reprocess else hdf.valid_param_names()
+        param_names = hdf.valid_lfl_param_names() if reprocess or incremental else hdf.valid_param_names()
         pre_process_parameters(hdf, segment_info, param_names, required,
                                aircraft_info, achieved_flight_record, force=force)
 
@@ -610,7 +943,8 @@ def process_flight(segment_info, tail_number, aircraft_info={}, achieved_flight_
             requested, required, derived_nodes, aircraft_info,
             achieved_flight_record)
         # calculate dependency tree
-        process_order, gr_st = dependency_order(node_mgr, draw=False)
+        process_order, gr_st = dependency_order(
+            node_mgr, draw=False, use_cache=settings.DEPENDENCY_ORDER_CACHE)
         if settings.CACHE_PARAMETER_MIN_USAGE:
             # find params used more than
             for node in gr_st.nodes():
@@ -622,9 +956,42 @@ def process_flight(segment_info, tail_number, aircraft_info={}, achieved_flight_
             logging.info("HDF set to cache parameters: %s",
                          hdf.cache_param_list)
 
+        stored_fingerprints = hdf.get_attr(NODE_FINGERPRINTS_ATTR) or {}
+        if incremental:
+            fingerprints = node_fingerprints(hdf, node_mgr, process_order)
+            unchanged = unchanged_nodes(fingerprints, stored_fingerprints)
+            derived_param_names = set(hdf.valid_param_names())
+            for node_name in process_order:
+                if node_name in unchanged:
+                    if node_name in derived_param_names \
+                       and node_name not in node_mgr.hdf_keys:
+                        # Reuse the derived parameter saved to the HDF file.
+                        node_mgr.hdf_keys.append(node_name)
+                elif node_name in fingerprints:
+                    initial.pop(node_name, None)
+            logger.info("%d of %d nodes are unchanged since last processed.",
+                        len(unchanged), len(fingerprints))
+
         # derive parameters
+        if workers is None:
+            workers = settings.DERIVE_PARAMETERS_WORKERS
         ktis, kpvs, sections, approaches, flight_attrs = \
-            derive_parameters(hdf, node_mgr, process_order, params=initial, force=force)
+            derive_parameters(hdf, node_mgr, process_order, params=initial,
+                              force=force, gr_st=gr_st, workers=workers,
+                              profiler=profiler)
+
+        if incremental:
+            # Store fingerprints of nodes which were reused or derived.
+            produced = set(node_mgr.hdf_keys).union(
+                ktis, kpvs, sections, approaches, flight_attrs)
+            stored_fingerprints.update(
+                (n, f) for n, f in six.iteritems(fingerprints) if n in produced)
+            hdf.set_attr(NODE_FINGERPRINTS_ATTR, stored_fingerprints)
+        elif stored_fingerprints:
+            # Nodes may have been derived from different sources.
+            for node_name in process_order:
+                stored_fingerprints.pop(node_name, None)
+            hdf.set_attr(NODE_FINGERPRINTS_ATTR, stored_fingerprints)
 
         # geo locate KTIs
         ktis = geo_locate(hdf, ktis)
@@ -637,7 +1004,8 @@ def process_flight(segment_info, tail_number, aircraft_info={}, achieved_flight_
         # Store version of FlightDataAnalyser
         hdf.analysis_version = __version__
         # Store dependency tree
-        hdf.dependency_tree = json.dumps(json_graph.node_link_data(gr_st))
+        hdf.dependency_tree = json.dumps(
+            json_graph.node_link_data(gr_st.to_networkx()))
         # Store aircraft info
         hdf.set_attr('aircraft_info', aircraft_info)
         hdf.set_attr('achieved_flight_record', achieved_flight_record)
@@ -666,12 +1034,148 @@ def pre_process_parameters(hdf, segment_info, param_names, required,
         segment_info, hdf.duration, param_names,
         requested, required, pre_processing_nodes, aircraft_info,
         achieved_flight_record)
-    process_order, gr_st = dependency_order(node_mgr, draw=False)
+    process_order, gr_st = dependency_order(
+        node_mgr, draw=False, use_cache=settings.DEPENDENCY_ORDER_CACHE)
 
     ktis, kpvs, sections, approaches, flight_attrs = \
         derive_parameters(hdf, node_mgr, process_order, force=force)
 
 
+def _init_batch_worker(node_modules):
+    '''
+    Import the node modules once when a batch worker process starts so that
+    the modules and node registry are reused by every segment the worker
+    processes.
+
+    Errors are logged rather than raised as the pool would otherwise
+    continually replace the worker; the error will be raised again and
+    reported when the worker processes a segment.
+    '''
+    try:
+        get_derived_nodes(node_modules)
+    except Exception:
+        logger.exception("Failed to import node modules within batch worker.")
+
+
+def _process_segment(args):
+    '''
+    Process a single segment of a batch, returning any error rather than
+    raising it so that the remaining segments continue to be processed.
+
+    :param args: Tuple of (segment_info, tail_number, process_flight kwargs).
+    :type args: tuple
+    :returns: Dictionary with keys 'segment_info', 'result' and 'error'.
+    :rtype: dict
+    '''
+    segment_info, tail_number, kwargs = args
+    try:
+        res = process_flight(segment_info, tail_number, **kwargs)
+    except Exception:
+        logger.exception("Failed to process segment '%s'.",
+                         segment_info.get('File'))
+        return {
+            'segment_info': segment_info,
+            'result': None,
+            'error': traceback.format_exc(),
+        }
+    return {
+        'segment_info': segment_info,
+        'result': res,
+        'error': None,
+    }
+
+
+def process_flights(segments, tail_number, aircraft_info={}, processes=None,
+                    **kwargs):
+    '''
+    Processes many segments (e.g. those created by split_hdf_to_segments)
+    across a pool of processes.
+
+    Aircraft information is fetched once for the batch and each worker
+    process imports the node modules once on start up. A segment which fails
+    to process is reported within its result rather than aborting the
+    batch.
+
+    :param segments: Details of each segment to process, see process_flight.
+    :type segments: [dict]
+    :param tail_number: Aircraft tail number of all segments.
+    :type tail_number: str
+    :param aircraft_info: Aircraft specific attributes, see process_flight.
+    :type aircraft_info: dict
+    :param processes: Number of worker processes. Defaults to
+        settings.BATCH_PROCESSES, or the number of CPUs when that is None. A
+        value of 1 processes the segments within the current process.
+    :type processes: int or None
+    :param kwargs: Keyword arguments passed into process_flight.
+    :returns: A dictionary for each segment, in the order provided, with keys
+        'segment_info', 'result' (process_flight return value or None) and
+        'error' (formatted traceback or None).
+    :rtype: [dict]
+    '''
+    if not aircraft_info:
+        aircraft_info = get_aircraft_info(tail_number)
+    kwargs['aircraft_info'] = aircraft_info
+
+    if aircraft_info.get('Aircraft Type') == 'helicopter':
+        node_modules = settings.NODE_MODULES + \
+            settings.NODE_HELICOPTER_MODULE_PATHS
+    else:
+        node_modules = list(settings.NODE_MODULES)
+    node_modules += kwargs.get('additional_modules', [])
+
+    if processes is None:
+        processes = settings.BATCH_PROCESSES or multiprocessing.cpu_count()
+    processes = min(processes, len(segments))
+
+    tasks = [(segment_info, tail_number, kwargs) for segment_info in segments]
+    if processes <= 1:
+        return [_process_segment(task) for task in tasks]
+
+    pool = multiprocessing.Pool(processes, initializer=_init_batch_worker,
+                                initargs=(node_modules,))
+    try:
+        results = list(pool.imap(_process_segment, tasks, chunksize=1))
+    except:
+        pool.terminate()
+        raise
+    else:
+        pool.close()
+    finally:
+        pool.join()
+
+    failed = [r['segment_info'].get('File') for r in results if r['error']]
+    if failed:
+        logger.warning("Failed to process %d of %d segments: %s",
+                       len(failed), len(results), failed)
+    return results
+
+
+def _process_copy(path, incremental=False):
+    '''
+    Copy an HDF file to a *_process file for processing.
+
+    When incremental, the *_process file written by the previous run is
+    reused if it is at least as recent as the original file as it holds the
+    derived parameters and node fingerprints stored by that run. A fresh copy
+    would hold neither, so every node would be derived again.
+
+    :param path: Path to the original HDF file.
+    :type path: str
+    :param incremental: Whether to reuse the previous *_process file.
+    :type incremental: bool
+    :returns: Path to the *_process file and whether it was reused.
+    :rtype: (str, bool)
+    '''
+    root, ext = os.path.splitext(path)
+    process_path = root + '_process' + ext
+    if incremental and os.path.exists(process_path) and \
+       os.path.getmtime(process_path) >= os.path.getmtime(path):
+        logger.info("Incrementally reprocessing existing file: %s",
+                    process_path)
+        return process_path, True
+    return copy_file(path, postfix='_process'), False
+
+
 def main():
     print('FlightDataAnalyzer (c) Copyright 2013 Flight Data Services, Ltd.')
     print('  - Powered by POLARIS')
@@ -682,8 +1186,9 @@ def main():
     logger.setLevel(logging.INFO)
     logger.addHandler(logging.StreamHandler(stream=sys.stdout))
     parser = argparse.ArgumentParser(description="Process a flight.")
-    parser.add_argument('file', type=str,
-                        help='Path of file to process.')
+    parser.add_argument('file', type=str, nargs='+',
+                        help='Path of file to process. Multiple segment '
+                        'files may be provided with --batch.')
     help = 'Disable writing a CSV of the processing results.'
     parser.add_argument('-disable-csv', dest='disable_csv',
                         action='store_true', help=help)
@@ -704,6 +1209,28 @@ def main():
                         help='Strip the HDF5 file to only the LFL parameters')
     parser.add_argument('-v', '--verbose', dest='verbose', action='store_true',
                         help='Verbose logging')
+    parser.add_argument('--workers', dest='workers', type=int, default=None,
+                        help='Number of threads used to derive nodes '
+                        'concurrently.')
+    parser.add_argument('--batch', dest='batch', action='store_true',
+                        help='Process each file as a segment across a pool '
+                        'of processes.')
+    parser.add_argument('--processes', dest='processes', type=int,
+                        default=None,
+                        help='Number of processes used with --batch.')
+    parser.add_argument('--incremental', dest='incremental',
+                        action='store_true',
+                        help='Only reprocess nodes which have changed since '
+                        'the file was last processed with --incremental. The '
+                        'existing *_process file is reused unless the '
+                        'original file is more recent.')
+    parser.add_argument('--profile', dest='profile', type=str, default=None,
+                        help='Path to write a report of the time and memory '
+                        'spent deriving each node (CSV if the path ends with '
+                        '.csv, otherwise JSON).')
+    parser.add_argument('--profile-sort', dest='profile_sort', type=str,
+                        default='wall_time', choices=PROFILE_FIELDS,
+                        help='Field to sort the profile report by.')
 
     # Aircraft info
     parser.add_argument('-aircraft-family', dest='aircraft_family', type=str,
@@ -800,11 +1327,21 @@ def main():
     if args.engine_type:
         aircraft_info['Engine Type'] = args.engine_type
 
+    if len(args.file) > 1 and not args.batch:
+        parser.error('Multiple files may only be processed with --batch.')
+    if args.profile and args.batch:
+        parser.error('--profile cannot be used with --batch.')
+
     # Derive parameters to new HDF
-    hdf_copy = copy_file(args.file, postfix='_process')
-    if args.strip:
-        with hdf_file(hdf_copy) as hdf:
-            hdf.delete_params(hdf.derived_keys())
+    hdf_copies = []
+    for path in args.file:
+        hdf_copy, reused = _process_copy(path, incremental=args.incremental)
+        # Derived parameters within a reused file are required to skip
+        # unchanged nodes.
+        if args.strip and not reused:
+            with hdf_file(hdf_copy) as hdf:
+                hdf.delete_params(hdf.derived_keys())
+        hdf_copies.append(hdf_copy)
     
     if args.initial:
         if not os.path.exists(args.initial):
@@ -813,34 +1350,55 @@ def main():
     else:
         initial = {}
 
-    segment_info = {
-        'File': hdf_copy,
-        'Segment Type': args.segment_type,
-    }
-    res = process_flight(
-        segment_info, args.tail_number, aircraft_info=aircraft_info,
+    segments = [{'File': hdf_copy, 'Segment Type': args.segment_type}
+                for hdf_copy in hdf_copies]
+    kwargs = dict(
         requested=args.requested, required=args.required, initial=initial,
-        include_flight_attributes=False,
+        include_flight_attributes=False, workers=args.workers,
+        incremental=args.incremental,
     )
-    # Flatten results.
-    res = {k: list(itertools.chain.from_iterable(six.itervalues(v)))
-           for k, v in six.iteritems(res)}
-    
-    logger.info("Derived parameters stored in hdf: %s", hdf_copy)
-    # Write CSV file
-    if not args.disable_csv:
-        csv_dest = os.path.splitext(hdf_copy)[0] + '.csv'
-        csv_flight_details(hdf_copy, res['kti'], res['kpv'], res['phases'],
-                           dest_path=csv_dest)
-        logger.info("KPV, KTI and Phases writen to csv: %s", csv_dest)
-    # Write KML file
-    if not args.disable_kml:
-        kml_dest = os.path.splitext(hdf_copy)[0] + '.kml'
-        dest = track_to_kml(
-            hdf_copy, res['kti'], res['kpv'], res['approach'],
-            dest_path=kml_dest)
-        if dest:
-            logger.info("Flight Track with attributes writen to kml: %s", dest)
+    if args.batch:
+        results = process_flights(
+            segments, args.tail_number, aircraft_info=aircraft_info,
+            processes=args.processes, **kwargs)
+    else:
+        profiler = NodeProfiler() if args.profile else None
+        results = [{
+            'segment_info': segments[0],
+            'result': process_flight(segments[0], args.tail_number,
+                                     aircraft_info=aircraft_info,
+                                     profiler=profiler, **kwargs),
+            'error': None,
+        }]
+        if profiler:
+            profiler.write(args.profile, sort_by=args.profile_sort)
+            logger.info("Node profile written to: %s", args.profile)
+
+    for result in results:
+        hdf_copy = result['segment_info']['File']
+        if result['error']:
+            logger.error("Failed to process hdf: %s\n%s", hdf_copy,
+                         result['error'])
+            continue
+        # Flatten results.
+        res = {k: list(itertools.chain.from_iterable(six.itervalues(v)))
+               for k, v in six.iteritems(result['result'])}
+        
+        logger.info("Derived parameters stored in hdf: %s", hdf_copy)
+        # Write CSV file
+        if not args.disable_csv:
+            csv_dest = os.path.splitext(hdf_copy)[0] + '.csv'
+            csv_flight_details(hdf_copy, res['kti'], res['kpv'], res['phases'],
+                               dest_path=csv_dest)
+            logger.info("KPV, KTI and Phases writen to csv: %s", csv_dest)
+        # Write KML file
+        if not args.disable_kml:
+            kml_dest = os.path.splitext(hdf_copy)[0] + '.kml'
+            dest = track_to_kml(
+                hdf_copy, res['kti'], res['kpv'], res['approach'],
+                dest_path=kml_dest)
+            if dest:
+                logger.info("Flight Track with attributes writen to kml: %s", dest)
 
     # - END -
 
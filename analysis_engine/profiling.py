@@ -0,0 +1,189 @@
+'''
+Instrumentation of derive_parameters recording the cost of deriving each
+Node. Enabled by passing a NodeProfiler into process_flight or with the
+--profile option of FlightDataAnalyzer.
+'''
+import csv
+import json
+import logging
+import numpy as np
+import six
+import time
+
+from timeit import default_timer
+
+try:
+    import tracemalloc
+except ImportError:
+    # Python 2 does not support tracing memory allocations.
+    tracemalloc = None
+
+
+logger = logging.getLogger(name=__name__)
+
+# CPU time of the calling thread where supported so that nodes derived
+# concurrently are not charged for each other.
+cpu_timer = getattr(time, 'thread_time', None) or \
+    getattr(time, 'process_time', None) or time.clock
+
+PROFILE_FIELDS = (
+    'name',         # Name of the Node.
+    'node_type',    # Abbreviated type of the Node, e.g. 'KPV'.
+    'wall_time',    # Seconds spent within get_derived.
+    'cpu_time',     # CPU seconds spent within get_derived.
+    'align_time',   # Seconds spent aligning dependencies within get_derived.
+    'peak_memory',  # Peak bytes allocated within get_derived.
+    'size',         # Length of the resulting array or list.
+    'nbytes',       # Bytes of the resulting array and mask.
+)
+
+
+def node_size(node):
+    '''
+    Determine the size of the result of a derived Node.
+
+    :param node: Derived Node.
+    :type node: Node
+    :returns: Length of the resulting array or list (None for attributes) and
+        the bytes consumed by the resulting array and its mask (None for
+        non-parameter Nodes).
+    :rtype: (int or None, int or None)
+    '''
+    array = getattr(node, 'array', None)
+    if array is not None:
+        mask = np.ma.getmask(array)
+        nbytes = array.nbytes
+        if mask is not np.ma.nomask:
+            nbytes += mask.nbytes
+        return len(array), nbytes
+    elif isinstance(node, list):
+        return len(node), None
+    return None, None
+
+
+class NodeProfiler(object):
+    '''
+    Records the time and memory spent deriving each Node.
+
+    profiler = NodeProfiler()
+    process_flight(segment_info, tail_number, profiler=profiler)
+    profiler.write('profile.csv', sort_by='peak_memory')
+    '''
+
+    def __init__(self, trace_memory=True):
+        '''
+        :param trace_memory: Whether to record the peak memory allocated while
+            deriving each Node using tracemalloc. Tracing allocations slows
+            processing considerably and is unavailable on Python 2.
+        :type trace_memory: bool
+        '''
+        if trace_memory and tracemalloc is None:
+            logger.warning('Peak memory cannot be profiled as tracemalloc is '
+                           'not available.')
+            trace_memory = False
+        self.trace_memory = trace_memory
+        self.records = []
+        self._tracing = False
+
+    def start(self):
+        '''
+        Start tracing memory allocations (if enabled).
+        '''
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+
+    def stop(self):
+        '''
+        Stop tracing memory allocations if started by this profiler.
+        '''
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+
+    def begin(self):
+        '''
+        Called immediately before deriving a Node.
+
+        :returns: State to pass into end.
+        :rtype: tuple
+        '''
+        if self.trace_memory and tracemalloc.is_tracing():
+            # Clearing traces also resets the peak size of traced memory.
+            tracemalloc.clear_traces()
+        return default_timer(), cpu_timer()
+
+    def end(self, state, name, node):
+        '''
+        Called immediately after deriving a Node to record its profile.
+
+        :param state: State returned from begin.
+        :type state: tuple
+        :param name: Name of the Node.
+        :type name: str
+        :param node: The derived Node.
+        :type node: Node
+        :returns: The recorded profile.
+        :rtype: dict
+        '''
+        wall_time = default_timer() - state[0]
+        cpu_time = cpu_timer() - state[1]
+        if self.trace_memory and tracemalloc.is_tracing():
+            peak_memory = tracemalloc.get_traced_memory()[1]
+        else:
+            peak_memory = None
+        size, nbytes = node_size(node)
+        record = {
+            'name': name,
+            'node_type': node.node_type_abbr,
+            'wall_time': wall_time,
+            'cpu_time': cpu_time,
+            'align_time': getattr(node, '_align_time', None),
+            'peak_memory': peak_memory,
+            'size': size,
+            'nbytes': nbytes,
+        }
+        self.records.append(record)
+        return record
+
+    def report(self, sort_by='wall_time', reverse=True):
+        '''
+        :param sort_by: Field within PROFILE_FIELDS to sort the report by.
+        :type sort_by: str
+        :param reverse: Sort in descending order.
+        :type reverse: bool
+        :returns: Profile of each Node sorted by the sort_by field.
+        :rtype: [dict]
+        '''
+        if sort_by not in PROFILE_FIELDS:
+            raise ValueError("Cannot sort profile by unknown field '%s'." %
+                             sort_by)
+        # Place missing values last regardless of order.
+        key = lambda r: (r[sort_by] is not None, r[sort_by]) if reverse \
+            else (r[sort_by] is None, r[sort_by])
+        return sorted(self.records, key=key, reverse=reverse)
+
+    def write(self, path, sort_by='wall_time', reverse=True):
+        '''
+        Write the report to path as CSV if the path has a .csv extension,
+        otherwise as JSON.
+
+        :param path: Path of report file.
+        :type path: str
+        :param sort_by: Field within PROFILE_FIELDS to sort the report by.
+        :type sort_by: str
+        :param reverse: Sort in descending order.
+        :type reverse: bool
+        :rtype: None
+        '''
+        report = self.report(sort_by=sort_by, reverse=reverse)
+        if path.lower().endswith('.csv'):
+            mode = 'wb' if six.PY2 else 'w'
+            kwargs = {} if six.PY2 else {'newline': ''}
+            with open(path, mode, **kwargs) as fh:
+                writer = csv.DictWriter(fh, PROFILE_FIELDS)
+                writer.writeheader()
+                writer.writerows(report)
+        else:
+            with open(path, 'w') as fh:
+                json.dump(report, fh, indent=2)
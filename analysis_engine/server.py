@@ -0,0 +1,464 @@
+'''
+Long-lived analysis server which keeps the node modules, node registry and
+aircraft information warm between jobs so that short segments (e.g. ground
+runs) are not dominated by start up time.
+
+Jobs are accepted as JSON objects, one per line, over a local UNIX socket
+(settings.SERVER_SOCKET_PATH) or as files within a watched spool directory
+(settings.SERVER_SPOOL_PATH). Sample job:
+
+{
+    "id": "optional identifier returned within the response",
+    "segment_info": {
+        "File": "/path/to/segment.hdf5",
+        "Start Datetime": "2013-01-01T00:00:00+00:00",
+        "Segment Type": "START_AND_STOP"
+    },
+    "tail_number": "G-FDSL",
+    "aircraft_info": {},  # optional, fetched by tail number otherwise
+    "kwargs": {"requested": [], "required": []}  # passed into process_flight
+}
+
+Each job is answered with a JSON object with keys 'id', 'segment_info',
+'result' (see json_tools.process_flight_to_jsondict) and 'error' (formatted
+traceback or null). Spooled jobs named <name>.job.json are answered within
+<name>.result.json in the same directory. Job files are claimed as soon as
+they appear, therefore clients must write them atomically, e.g. to
+<name>.job.json.tmp before renaming to <name>.job.json.
+'''
+from __future__ import print_function
+
+import argparse
+import copy
+import dateutil.parser
+import logging
+import multiprocessing
+import os
+import simplejson as json
+import six
+import socket
+import stat
+import sys
+import threading
+import time
+import traceback
+
+from six.moves import socketserver
+
+from analysis_engine import settings
+from analysis_engine.json_tools import (
+    json_to_process_flight, process_flight_to_jsondict)
+from analysis_engine.process_flight import (
+    _init_batch_worker, process_flight)
+from analysis_engine.utils import get_aircraft_info, get_derived_nodes
+
+
+logger = logging.getLogger(name=__name__)
+
+JOB_SUFFIX = '.job.json'
+CLAIMED_SUFFIX = '.job.processing'
+RESULT_SUFFIX = '.result.json'
+
+# Aircraft information fetched by this process and the time it was fetched
+# keyed by tail number.
+_aircraft_info = {}
+
+
+def _invalid_job_response(error):
+    return {'id': None, 'segment_info': None, 'result': None, 'error': error}
+
+
+def warm_up(additional_modules=[]):
+    '''
+    Import the node modules and build the node registries used by
+    process_flight for both aeroplanes and helicopters.
+
+    :param additional_modules: Module paths passed into process_flight.
+    :type additional_modules: [str]
+    '''
+    get_derived_nodes(settings.NODE_MODULES + additional_modules)
+    get_derived_nodes(settings.NODE_MODULES +
+                      settings.NODE_HELICOPTER_MODULE_PATHS +
+                      additional_modules)
+    get_derived_nodes(settings.NODE_MODULES)
+    get_derived_nodes(settings.PRE_PROCESSING_MODULE_PATHS)
+    get_derived_nodes(['analysis_engine.flight_attribute'])
+
+
+def clear_aircraft_info(tail_number=None):
+    '''
+    Discard aircraft information fetched by this process so that it is
+    fetched again by the next job, e.g. after the aircraft has been modified.
+
+    :param tail_number: Tail number to discard. All aircraft if None.
+    :type tail_number: str or None
+    '''
+    if tail_number is None:
+        _aircraft_info.clear()
+    else:
+        _aircraft_info.pop(tail_number, None)
+
+
+def _get_aircraft_info(tail_number):
+    '''
+    :returns: Copy of the aircraft information of tail_number, fetched again
+        once older than settings.SERVER_AIRCRAFT_INFO_TTL seconds.
+    :rtype: dict
+    '''
+    now = time.time()
+    ttl = settings.SERVER_AIRCRAFT_INFO_TTL
+    cached = _aircraft_info.get(tail_number)
+    if cached is None or (ttl is not None and now - cached[0] >= ttl):
+        cached = (now, get_aircraft_info(tail_number))
+        _aircraft_info[tail_number] = cached
+    # process_flight modifies aircraft_info.
+    return copy.deepcopy(cached[1])
+
+
+def process_job(job):
+    '''
+    Process a job, returning any error rather than raising it.
+
+    :param job: Job, see module docstring.
+    :type job: dict
+    :returns: Response with keys 'id', 'segment_info', 'result' and 'error'.
+    :rtype: dict
+    '''
+    job_id = job.get('id') if isinstance(job, dict) else None
+    try:
+        tail_number = job['tail_number']
+        # process_flight modifies segment_info.
+        segment_info = dict(job['segment_info'])
+        start_datetime = segment_info.get('Start Datetime')
+        if isinstance(start_datetime, six.string_types):
+            segment_info['Start Datetime'] = \
+                dateutil.parser.parse(start_datetime)
+        aircraft_info = job.get('aircraft_info') or \
+            _get_aircraft_info(tail_number)
+        kwargs = dict(job.get('kwargs') or {})
+        if kwargs.get('initial'):
+            kwargs['initial'] = json_to_process_flight(
+                json.dumps(kwargs['initial']))
+        logger.info("Processing job '%s': %s", job_id,
+                    segment_info.get('File'))
+        res = process_flight(segment_info, tail_number,
+                             aircraft_info=aircraft_info, **kwargs)
+        result = process_flight_to_jsondict(res)
+    except Exception:
+        logger.exception("Failed to process job '%s'.", job_id)
+        response = _invalid_job_response(traceback.format_exc())
+        response['id'] = job_id
+        if isinstance(job, dict):
+            response['segment_info'] = job.get('segment_info')
+        return response
+    return {
+        'id': job_id,
+        'segment_info': job['segment_info'],
+        'result': result,
+        'error': None,
+    }
+
+
+class _JobHandler(socketserver.StreamRequestHandler):
+    '''
+    Answers each line of a connection (a JSON job) with a line of JSON.
+    '''
+
+    def handle(self):
+        for line in self.rfile:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                job = json.loads(line.decode('utf-8'))
+            except ValueError:
+                response = _invalid_job_response(traceback.format_exc())
+            else:
+                response = self.server.analysis_server.submit(job)
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class _UnixStreamServer(socketserver.ThreadingMixIn,
+                        socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class AnalysisServer(object):
+    '''
+    Processes jobs received over a UNIX socket and from a spool directory
+    within a warm process, optionally across pre-forked processes.
+
+    server = AnalysisServer(socket_path='/tmp/analysis.sock')
+    server.serve_forever()
+    '''
+
+    def __init__(self, socket_path=None, spool_path=None, processes=None,
+                 poll_interval=None, additional_modules=[]):
+        '''
+        :param socket_path: Path of the UNIX socket to accept jobs on.
+            Defaults to settings.SERVER_SOCKET_PATH.
+        :type socket_path: str or None
+        :param spool_path: Directory to watch for job files. Defaults to
+            settings.SERVER_SPOOL_PATH.
+        :type spool_path: str or None
+        :param processes: Number of pre-forked processes. Defaults to
+            settings.SERVER_PROCESSES. A value of 1 processes jobs within
+            the server process.
+        :type processes: int or None
+        :param poll_interval: Seconds between checks of the spool
+            directory. Defaults to settings.SERVER_SPOOL_POLL_INTERVAL.
+        :type poll_interval: float or None
+        :param additional_modules: Module paths to import while warming up.
+        :type additional_modules: [str]
+        '''
+        self.socket_path = socket_path or settings.SERVER_SOCKET_PATH
+        self.spool_path = spool_path or settings.SERVER_SPOOL_PATH
+        self.processes = processes or settings.SERVER_PROCESSES
+        self.poll_interval = poll_interval or \
+            settings.SERVER_SPOOL_POLL_INTERVAL
+        self.additional_modules = additional_modules
+        self._pool = None
+        self._server = None
+        self._threads = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        '''
+        Warm up and start accepting jobs.
+        '''
+        if not self.socket_path and not self.spool_path:
+            raise ValueError('A socket path or spool path is required.')
+        warm_up(self.additional_modules)
+        if self.processes > 1:
+            # Forked after warming up so that processes share the imported
+            # modules.
+            self._pool = multiprocessing.Pool(
+                self.processes, initializer=_init_batch_worker,
+                initargs=(settings.NODE_MODULES + self.additional_modules,),
+                maxtasksperchild=settings.SERVER_MAX_JOBS_PER_PROCESS)
+        self._stopped.clear()
+        if self.socket_path:
+            self._remove_socket()
+            self._server = _UnixStreamServer(self.socket_path, _JobHandler)
+            self._server.analysis_server = self
+            self._start_thread(self._server.serve_forever, 'socket')
+            logger.info("Accepting jobs on socket: %s", self.socket_path)
+        if self.spool_path:
+            if not os.path.isdir(self.spool_path):
+                os.makedirs(self.spool_path)
+            self._start_thread(self._watch_spool, 'spool')
+            logger.info("Accepting jobs within spool: %s", self.spool_path)
+
+    def _start_thread(self, target, name):
+        thread = threading.Thread(target=target,
+                                  name='Analysis server %s' % name)
+        thread.daemon = True
+        thread.start()
+        self._threads.append(thread)
+
+    def _remove_socket(self):
+        '''
+        Remove a socket left by a previous server.
+        '''
+        try:
+            mode = os.stat(self.socket_path).st_mode
+        except OSError:
+            return
+        if not stat.S_ISSOCK(mode):
+            raise ValueError("'%s' exists and is not a socket." %
+                             self.socket_path)
+        os.remove(self.socket_path)
+
+    def serve_forever(self):
+        '''
+        Start and accept jobs until interrupted.
+        '''
+        self.start()
+        try:
+            while not self._stopped.wait(1):
+                pass
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self):
+        '''
+        Stop accepting jobs and wait for jobs in progress to complete.
+        '''
+        self._stopped.set()
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+            self._remove_socket()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        if self._pool:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def submit(self, job):
+        '''
+        Process a job, waiting for the response.
+
+        :param job: Job, see module docstring.
+        :type job: dict
+        :returns: Response, see process_job.
+        :rtype: dict
+        '''
+        if self._pool:
+            return self._pool.apply(process_job, (job,))
+        # Jobs from concurrent connections are processed one at a time.
+        with self._lock:
+            return process_job(job)
+
+    def _watch_spool(self):
+        while not self._stopped.is_set():
+            try:
+                self.process_spool()
+            except Exception:
+                logger.exception("Failed to process spool: %s",
+                                 self.spool_path)
+            self._stopped.wait(self.poll_interval)
+
+    def process_spool(self):
+        '''
+        Claim and process the job files within the spool directory.
+
+        :returns: Number of job files claimed.
+        :rtype: int
+        '''
+        claimed = 0
+        for filename in sorted(os.listdir(self.spool_path)):
+            if not filename.endswith(JOB_SUFFIX):
+                continue
+            name = filename[:-len(JOB_SUFFIX)]
+            job_path = os.path.join(self.spool_path, filename)
+            claimed_path = os.path.join(self.spool_path, name + CLAIMED_SUFFIX)
+            try:
+                # Renaming is atomic, therefore only one server claims a job.
+                os.rename(job_path, claimed_path)
+            except OSError:
+                continue
+            claimed += 1
+            try:
+                with open(claimed_path) as job_file:
+                    job = json.load(job_file)
+            except ValueError:
+                self._write_result(
+                    name, _invalid_job_response(traceback.format_exc()))
+                continue
+            if self._pool:
+                self._pool.apply_async(
+                    process_job, (job,),
+                    callback=lambda response, name=name:
+                        self._write_result(name, response),
+                    error_callback=lambda error, name=name, job=job:
+                        self._write_error(name, job, error))
+            else:
+                with self._lock:
+                    self._write_result(name, process_job(job))
+        return claimed
+
+    def _write_error(self, name, job, error):
+        '''
+        Write an error response for a spooled job which raised outside of
+        process_job, e.g. when its response could not be pickled.
+        '''
+        logger.error("Failed to process spooled job '%s': %r", name, error)
+        response = _invalid_job_response(''.join(
+            traceback.format_exception_only(type(error), error)))
+        if isinstance(job, dict):
+            response['id'] = job.get('id')
+            response['segment_info'] = job.get('segment_info')
+        self._write_result(name, response)
+
+    def _write_result(self, name, response):
+        '''
+        Write the response of a spooled job and remove the job file.
+        '''
+        result_path = os.path.join(self.spool_path, name + RESULT_SUFFIX)
+        temp_path = result_path + '.tmp'
+        with open(temp_path, 'w') as result_file:
+            json.dump(response, result_file)
+        # Results only appear once complete.
+        os.rename(temp_path, result_path)
+        try:
+            os.remove(os.path.join(self.spool_path, name + CLAIMED_SUFFIX))
+        except OSError:
+            pass
+
+
+def submit_job(job, socket_path=None):
+    '''
+    Submit a job to a running analysis server and wait for the response.
+
+    :param job: Job, see module docstring.
+    :type job: dict
+    :param socket_path: Path of the server's UNIX socket. Defaults to
+        settings.SERVER_SOCKET_PATH.
+    :type socket_path: str or None
+    :returns: Response, see process_job.
+    :rtype: dict
+    '''
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path or settings.SERVER_SOCKET_PATH)
+        sock.sendall(json.dumps(job).encode('utf-8') + b'\n')
+        with sock.makefile('rb') as response_file:
+            line = response_file.readline()
+    finally:
+        sock.close()
+    return json.loads(line.decode('utf-8'))
+
+
+def main():
+    print('FlightDataAnalyzerServer (c) Copyright 2013 Flight Data Services, Ltd.')
+    print('  - Powered by POLARIS')
+    print('  - http://www.flightdatacommunity.com')
+    print()
+    logger = logging.getLogger()
+    logger.setLevel(logging.INFO)
+    logger.addHandler(logging.StreamHandler(stream=sys.stdout))
+    parser = argparse.ArgumentParser(
+        description="Process flights within a long-lived process.")
+    parser.add_argument('--socket', dest='socket_path', type=str,
+                        default=None,
+                        help='Path of the UNIX socket to accept jobs on.')
+    parser.add_argument('--spool', dest='spool_path', type=str, default=None,
+                        help='Directory to watch for job files.')
+    parser.add_argument('--processes', dest='processes', type=int,
+                        default=None,
+                        help='Number of pre-forked processes to process jobs.')
+    parser.add_argument('--poll-interval', dest='poll_interval', type=float,
+                        default=None,
+                        help='Seconds between checks of the spool directory.')
+    parser.add_argument('-v', '--verbose', dest='verbose', action='store_true',
+                        help='Verbose logging')
+    args = parser.parse_args()
+
+    if args.verbose:
+        logger.setLevel(logging.DEBUG)
+    if not (args.socket_path or args.spool_path or
+            settings.SERVER_SOCKET_PATH or settings.SERVER_SPOOL_PATH):
+        parser.error('--socket or --spool is required.')
+
+    AnalysisServer(socket_path=args.socket_path, spool_path=args.spool_path,
+                   processes=args.processes,
+                   poll_interval=args.poll_interval).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
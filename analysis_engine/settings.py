@@ -105,6 +105,121 @@ NODE_CACHE = True
 # accurate to. A value of None will retain full accuracy.
 NODE_CACHE_OFFSET_DP = None
 
+# Maximum bytes of aligned arrays held within the node cache. Least recently
+# used Nodes are evicted once exceeded. A value of None is unbounded.
+NODE_CACHE_MAX_BYTES = 2 * 1024 ** 3
+
+# Scratch directory which Nodes evicted from the node cache are spilled to as
+# memory mapped files so that they can still be reused. A value of None
+# discards evicted Nodes.
+NODE_CACHE_SPILL_PATH = None
+
+# Maximum number of alignment kernels (gather indices and interpolation
+# coefficients for a combination of sample rates, offsets and array length)
+# cached by align.
+ALIGN_KERNEL_CACHE_SIZE = 32
+
+# Release cached Nodes, HDF cache entries and derived KPVs, KTIs and sections
+# once the last Node which depends upon them has been derived to reduce peak
+# memory usage.
+NODE_RELEASE = True
+
+
+##############################################################################
+# Node Manifest
+
+
+# Directory to store manifests of the Nodes within each node module. When
+# set, the node registry is built from the manifests and modules are only
+# imported once their Nodes are required. A value of None imports all node
+# modules.
+NODE_MANIFEST_PATH = None
+
+
+##############################################################################
+# Dependency Planning Cache
+
+
+# Whether process_flight reuses the processing order planned for previous
+# flights with the same parameters, attributes and requested nodes.
+DEPENDENCY_ORDER_CACHE = True
+
+# Maximum number of processing orders kept in memory.
+DEPENDENCY_ORDER_CACHE_SIZE = 64
+
+# Directory to persist planned processing orders to so that they are shared
+# between processes. A value of None only caches in memory.
+DEPENDENCY_ORDER_CACHE_PATH = None
+
+# Maximum number of can_operate results memoised per process and shared
+# between flights. 0 evaluates can_operate whenever it is required.
+CAN_OPERATE_CACHE_SIZE = 100000
+
+
+##############################################################################
+# Read-Only Dependencies
+
+
+# Pass parameter arrays to derive as read-only views of the data and mask
+# rather than the arrays shared with other Nodes. Nodes which modify their
+# dependencies must copy them (see library.writeable).
+READ_ONLY_DEPENDENCIES = False
+
+# Fingerprint parameter arrays before and after derive and report Nodes which
+# modify their dependencies (see node.dependency_writes). Slow - for
+# development only.
+CHECK_DEPENDENCY_WRITES = False
+
+
+##############################################################################
+# Parallel Processing
+
+
+# Number of threads used by derive_parameters to derive nodes whose
+# dependencies have been satisfied concurrently. A value of 1 derives nodes
+# serially in the processing order.
+DERIVE_PARAMETERS_WORKERS = 1
+
+# Save derived parameters to the HDF file from a dedicated writer thread so
+# that compression and disk I/O overlap with deriving subsequent Nodes.
+HDF_WRITE_BEHIND = False
+
+# Maximum number of derived parameters waiting to be saved by the writer
+# thread before deriving is paused. 0 is unbounded.
+HDF_WRITE_BEHIND_QUEUE_SIZE = 8
+
+# Number of processes used by process_flights to process segments
+# concurrently. None uses the number of CPUs.
+BATCH_PROCESSES = None
+
+
+##############################################################################
+# Analysis Server
+
+
+# Path of the UNIX socket the analysis server accepts jobs on. None disables
+# the socket.
+SERVER_SOCKET_PATH = None
+
+# Directory the analysis server watches for job files. None disables the
+# spool directory.
+SERVER_SPOOL_PATH = None
+
+# Seconds between checks of the spool directory for new job files.
+SERVER_SPOOL_POLL_INTERVAL = 1.0
+
+# Number of pre-forked processes which process jobs. A value of 1 processes
+# jobs within the server process.
+SERVER_PROCESSES = 1
+
+# Number of jobs processed by a pre-forked process before it is replaced to
+# release memory. None never replaces processes.
+SERVER_MAX_JOBS_PER_PROCESS = None
+
+# Seconds aircraft information fetched by the analysis server is reused for
+# before it is fetched again. None reuses it until the server is restarted.
+SERVER_AIRCRAFT_INFO_TTL = 3600
+
 
 ##############################################################################
 # Parameter Analysis
@@ -16,7 +16,9 @@ from hdfaccess.utils import strip_hdf
 
 from flightdatautilities import api
 
-from analysis_engine.dependency_graph import dependencies3, graph_nodes
+from analysis_engine.dependency_graph import (
+    compact_dependencies, compact_graph)
+from analysis_engine.manifest import lazy_derived_nodes
 # node classes required for unpickling
 from analysis_engine.node import (
     loads, save, Node, NodeManager,
@@ -27,6 +29,10 @@ from analysis_engine import settings
 
 logger = logging.getLogger(__name__)
 
+# Nodes within modules imported by name, keyed by tuple of module names and
+# the node manifest path.
+_derived_nodes_cache = {}
+
 
 def save_test_data(node, locals):
     '''
@@ -151,6 +157,36 @@ def get_derived_nodes(modules):
     :type module_names: [str or module]
     :returns: Modules or module name to Classes
     :rtype: dict
+
+    When settings.NODE_MANIFEST_PATH is set, modules provided by name are
+    not imported. Node classes are instead represented by LazyNodes created
+    from the node manifest (see analysis_engine.manifest).
+    '''
+    if isinstance(modules, six.string_types) or ismodule(modules):
+        # This has been done too often!
+        modules = [modules]
+    # OPT: Modules imported by name are only imported once, therefore reuse
+    # their nodes. Copy as callers may modify the returned dictionary.
+    if all(isinstance(m, six.string_types) for m in modules):
+        manifest_path = settings.NODE_MANIFEST_PATH
+        cache_key = (tuple(modules), manifest_path)
+        if cache_key not in _derived_nodes_cache:
+            if manifest_path:
+                nodes = lazy_derived_nodes(modules, manifest_path,
+                                           _get_derived_nodes)
+            else:
+                nodes = _get_derived_nodes(modules)
+            _derived_nodes_cache[cache_key] = nodes
+        return dict(_derived_nodes_cache[cache_key])
+    return _get_derived_nodes(modules)
+
+
+def _get_derived_nodes(modules):
+    '''
+    :param modules: Modules or module names to import.
+    :type modules: [str or module]
+    :returns: Node name to Node class.
+    :rtype: dict
     '''
     # OPT: local variable to avoid module-level lookup.
     node_subclasses = NODE_SUBCLASSES
@@ -165,9 +201,6 @@ def get_derived_nodes(modules):
                 return True
         return issubclass(value, superclass)
 
-    if isinstance(modules, six.string_types) or ismodule(modules):
-        # This has been done too often!
-        modules = [modules]
     nodes = {}
     for module in modules:
         #Ref:
@@ -220,9 +253,10 @@ def derived_trimmer(hdf_path, node_names, dest):
         node_mgr = NodeManager(
             {}, hdf.duration, hdf.valid_param_names(), [], [],
             derived_nodes, {}, {})
-        _graph = graph_nodes(node_mgr)
+        graph = compact_graph(node_mgr)
         for node_name in node_names:
-            deps = dependencies3(_graph, node_name, node_mgr)
+            deps = [graph.names[i] for i in
+                    compact_dependencies(graph, node_name, node_mgr)]
             params.extend(filter(lambda d: d in node_mgr.hdf_keys, deps))
     return strip_hdf(hdf_path, params, dest)
 
@@ -0,0 +1,153 @@
+'''
+Write-behind access to an HDF file which saves derived parameters from a
+dedicated writer thread so that compression and disk I/O do not delay
+deriving subsequent Nodes.
+'''
+import copy
+import logging
+import sys
+import threading
+
+import six
+from six.moves import queue
+
+
+logger = logging.getLogger(name=__name__)
+
+# Placed on the queue to stop the writer thread.
+_STOP = object()
+
+
+class WriteBehindHDF(object):
+    '''
+    Wraps an hdf_file, queueing parameters passed into set_param to be saved
+    by a writer thread. Parameters which are queued but not yet saved are
+    returned by get_param and __getitem__. All other attributes are those of
+    the wrapped hdf_file.
+
+    Errors raised by the writer thread are raised by the next call to
+    set_param, flush or close.
+
+    with WriteBehindHDF(hdf) as hdf:
+        hdf.set_param(param)
+    '''
+
+    def __init__(self, hdf, queue_size=0):
+        '''
+        :param hdf: HDF file to write parameters to.
+        :type hdf: hdf_file
+        :param queue_size: Maximum number of parameters waiting to be saved
+            before set_param blocks. 0 is unbounded.
+        :type queue_size: int
+        '''
+        self.hdf = hdf
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._pending = {}
+        self._lock = threading.Lock()
+        # Held while the writer thread saves a parameter. Hold it to change
+        # the state of the wrapped hdf_file (e.g. its cache) from other
+        # threads.
+        self.hdf_lock = threading.RLock()
+        self._exc_info = None
+        self._thread = threading.Thread(target=self._write,
+                                        name='HDF write-behind')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __getattr__(self, name):
+        return getattr(self.hdf, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Do not mask the original exception with a write error.
+        self.close(raise_error=exc_type is None)
+
+    def __getitem__(self, name):
+        return self.get_param(name)
+
+    def __contains__(self, name):
+        return name in self._pending or name in self.hdf
+
+    def _write(self):
+        '''
+        Writer thread target saving queued parameters.
+        '''
+        while True:
+            param = self._queue.get()
+            try:
+                if param is _STOP:
+                    return
+                if self._exc_info is None:
+                    with self.hdf_lock:
+                        self.hdf.set_param(param)
+            except Exception:
+                self._exc_info = sys.exc_info()
+            finally:
+                if param is not _STOP:
+                    with self._lock:
+                        if self._pending.get(param.name) is param:
+                            del self._pending[param.name]
+                self._queue.task_done()
+
+    def _raise_error(self):
+        if self._exc_info:
+            exc_info, self._exc_info = self._exc_info, None
+            six.reraise(*exc_info)
+
+    def get_param(self, name, valid_only=False, **kwargs):
+        '''
+        Get a parameter from the queue of parameters waiting to be saved,
+        otherwise from the HDF file.
+
+        :returns: Copy of the queued parameter or the parameter read from the
+            HDF file.
+        :raises KeyError: If the parameter does not exist or valid_only and
+            the parameter is invalid.
+        '''
+        with self._lock:
+            param = self._pending.get(name)
+        if param is None:
+            return self.hdf.get_param(name, valid_only=valid_only, **kwargs)
+        if valid_only and getattr(param, 'invalid', False):
+            raise KeyError(name)
+        # Copy as parameters read from the HDF file do not share arrays.
+        param = copy.copy(param)
+        param.array = param.array.copy()
+        return param
+
+    def set_param(self, param):
+        '''
+        Queue param to be saved to the HDF file. Blocks while the queue is
+        full.
+        '''
+        self._raise_error()
+        with self._lock:
+            self._pending[param.name] = param
+        self._queue.put(param)
+
+    def flush(self):
+        '''
+        Wait until all queued parameters have been saved.
+        '''
+        self._queue.join()
+        self._raise_error()
+
+    def close(self, raise_error=True):
+        '''
+        Save all queued parameters and stop the writer thread.
+
+        :param raise_error: Raise an error raised by the writer thread,
+            otherwise the error is logged.
+        :type raise_error: bool
+        '''
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+        if raise_error:
+            self._raise_error()
+        elif self._exc_info:
+            logger.error('Error while saving parameters to HDF.',
+                         exc_info=self._exc_info)
+            self._exc_info = None
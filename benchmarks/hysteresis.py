@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+'''
+Benchmark hysteresis against the previous loop over each sample
+(hysteresis_loop within tests/library_test.py) on 10 hours of noisy 16Hz data
+by default. Prints the timings only; it asserts nothing.
+
+    python benchmarks/hysteresis.py [--samples 576000] [--hysteresis 10]
+'''
+from __future__ import print_function
+
+import argparse
+import numpy as np
+import os
+import sys
+
+from timeit import default_timer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, 'tests'))
+
+from analysis_engine.library import hysteresis
+
+from library_test import hysteresis_loop
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--samples', type=int, default=576000)
+    parser.add_argument('--hysteresis', type=float, default=10)
+    args = parser.parse_args()
+
+    np.random.seed(0)
+    array = np.ma.array(np.cumsum(np.random.randn(args.samples)))
+    array[0] = np.ma.masked
+    array[-1000:] = np.ma.masked
+
+    start = default_timer()
+    hysteresis_loop(array, args.hysteresis)
+    loop = default_timer() - start
+    start = default_timer()
+    hysteresis(array, args.hysteresis)
+    vectorised = default_timer() - start
+    print('%d samples, hysteresis %s' % (args.samples, args.hysteresis))
+    print('hysteresis: %.3fs  loop: %.3fs  (%.0fx)' % (
+        vectorised, loop, loop / vectorised))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+'''
+Benchmark planning the processing order with dependency_order (compact
+graph) against the networkx implementation (graph_nodes and process_order).
+
+Plans either a random node set of the given size, or the full node set of
+settings.NODE_MODULES (--node-modules) with every dependency which is not a
+derived node treated as a recorded parameter. Prints the timings only; it
+asserts nothing.
+
+    python benchmarks/plan_dependency_order.py [--size 5000] [--node-modules]
+'''
+from __future__ import print_function
+
+import argparse
+import logging
+import os
+import sys
+
+from datetime import datetime
+from random import Random
+from timeit import default_timer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, 'tests'))
+
+from analysis_engine import settings
+from analysis_engine.dependency_graph import (
+    dependency_order, graph_nodes, process_order)
+from analysis_engine.node import NodeManager
+from analysis_engine.utils import get_derived_nodes
+
+from dependency_graph_test import MockParam
+
+
+def random_node_mgr(size, seed=0):
+    '''
+    NodeManager of size derived nodes with random dependencies upon later
+    nodes and recorded parameters (as TestCompactPlanner).
+    '''
+    random = Random(seed)
+    lfl_params = ['Raw %d' % n for n in range(size // 4)]
+    names = ['Node %d' % n for n in range(size)]
+    derived_nodes = {}
+    for n, name in enumerate(names):
+        dependencies = random.sample(lfl_params + names[n + 1:],
+                                     random.randint(1, 4))
+        derived_nodes[name] = MockParam(dependencies=dependencies,
+                                        operational=random.random() > 0.1)
+    requested = random.sample(names, size // 2)
+    return NodeManager({'Start Datetime': datetime.now()}, 10, lfl_params,
+                       requested, [], derived_nodes, {}, {})
+
+
+AIRCRAFT_INFO = {
+    'Aircraft Type': 'aeroplane',
+    'Manufacturer': 'Airbus',
+    'Family': 'A320',
+    'Series': 'A320-200',
+    'Model': 'A320-214',
+    'Engine Manufacturer': 'CFM',
+    'Engine Series': 'CFM56-5B',
+    'Engine Type': 'CFM56-5B4',
+    'Engine Count': 2,
+    'Frame': 'A320_SFIM_ED45_CFM',
+    'Precise Positioning': True,
+}
+
+
+def node_modules_mgr():
+    '''
+    NodeManager of every node within settings.NODE_MODULES, all requested,
+    for an A320.
+    '''
+    derived_nodes = get_derived_nodes(settings.NODE_MODULES)
+    lfl_params = sorted({
+        name for node in derived_nodes.values()
+        for name in node.get_dependency_names()
+        if name not in derived_nodes and name not in AIRCRAFT_INFO})
+    return NodeManager({'Start Datetime': datetime.now()}, 10, lfl_params,
+                       sorted(derived_nodes), [], derived_nodes,
+                       AIRCRAFT_INFO, {})
+
+
+def time_call(function, repeat=3):
+    '''
+    :returns: Result of the first call and the fastest time of repeat calls.
+    '''
+    result, best = None, None
+    for _ in range(repeat):
+        start = default_timer()
+        value = function()
+        duration = default_timer() - start
+        if result is None:
+            result = value
+        best = duration if best is None else min(best, duration)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--size', type=int, default=5000,
+                        help='Number of random derived nodes.')
+    parser.add_argument('--node-modules', action='store_true',
+                        help='Plan the nodes of settings.NODE_MODULES.')
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    mgr = node_modules_mgr() if args.node_modules else \
+        random_node_mgr(args.size)
+    (order, gr_st), compact = time_call(
+        lambda: dependency_order(mgr, draw=False))
+    _, networkx = time_call(lambda: process_order(graph_nodes(mgr), mgr))
+    print('Planned %d of %d derived nodes.' % (len(order),
+                                               len(mgr.derived_nodes)))
+    print('dependency_order: %.1fms' % (compact * 1000))
+    print('networkx:         %.1fms' % (networkx * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+'''
+Benchmark repair_mask against the previous loop over each masked section
+(repair_mask_loop within tests/library_test.py) on noisy data with many short
+masked sections. Prints the timings only; it asserts nothing.
+
+    python benchmarks/repair_mask.py [--samples 100000] [--masked 0.2]
+'''
+from __future__ import print_function
+
+import argparse
+import logging
+import numpy as np
+import os
+import sys
+
+from timeit import default_timer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, 'tests'))
+
+from analysis_engine.library import repair_mask
+
+from library_test import repair_mask_loop
+
+
+def best_time(function, repeat=3):
+    '''
+    :returns: Fastest time of repeat calls.
+    '''
+    times = []
+    for _ in range(repeat):
+        start = default_timer()
+        function()
+        times.append(default_timer() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--samples', type=int, default=100000)
+    parser.add_argument('--masked', type=float, default=0.2,
+                        help='Proportion of samples masked at random.')
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    np.random.seed(0)
+    array = np.ma.array(np.random.randn(args.samples),
+                        mask=np.random.rand(args.samples) < args.masked)
+    sections = len(np.ma.clump_masked(array))
+    print('%d samples with %d masked sections.' % (args.samples, sections))
+    for method in ('interpolate', 'fill_start'):
+        loop = best_time(
+            lambda: repair_mask_loop(array.copy(), method=method))
+        vectorised = best_time(
+            lambda: repair_mask(array, copy=True, method=method))
+        print('%-11s repair_mask: %.1fms  loop: %.1fms  (%.0fx)' % (
+            method, vectorised * 1000, loop * 1000, loop / vectorised))
+
+
+if __name__ == '__main__':
+    main()
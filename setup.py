@@ -38,6 +38,7 @@ setup(
         'console_scripts': [
             'FlightDataSplitter = analysis_engine.split_hdf_to_segments:main',
             'FlightDataAnalyzer = analysis_engine.process_flight:main',
+            'FlightDataAnalyzerServer = analysis_engine.server:main',
         ],
         'gui_scripts' : [],
     },
@@ -2,7 +2,10 @@ from __future__ import print_function
 
 import collections
 import imp
+import mock
 import os
+import shutil
+import tempfile
 import networkx as nx
 import six
 import unittest
@@ -11,16 +14,21 @@ import sys
 import traceback
 
 from datetime import datetime
+from random import Random
 
 from analysis_engine.node import (DerivedParameterNode, Node, NodeManager, P)
 from analysis_engine.dependency_graph import (
     CircularDependency,
     InoperableDependencies,
     any_predecessors_in_requested,
+    clear_dependency_order_cache,
+    compact_dependencies,
+    compact_graph,
     dependency_order, 
     graph_nodes, 
     graph_adjacencies,
     indent_tree,
+    planning_key,
     process_order,
 )
 from analysis_engine.utils import get_derived_nodes
@@ -348,7 +356,7 @@ Node: Start Datetime 	Pre: [] 	Succ: [] 	Neighbors: [] 	Edges: []
         derived = get_derived_nodes([import_module('sample_derived_parameters')])
         mgr = NodeManager({'Start Datetime': datetime.now()}, 10, lfl_params, requested, [],
                           derived, {}, {})
-        self.assertRaises(nx.NetworkXError, dependency_order, mgr, draw=False)
+        self.assertRaises(ValueError, dependency_order, mgr, draw=False)
         
     def test_avoiding_possible_circular_dependency(self):
         # Possible circular dependency which can be avoided:
@@ -614,6 +622,158 @@ Node: Start Datetime 	Pre: [] 	Succ: [] 	Neighbors: [] 	Edges: []
         
 
 
+class TestDependencyOrderCache(unittest.TestCase):
+
+    class Doubled(DerivedParameterNode):
+        def derive(self, raw=P('Raw')):
+            pass
+
+    def setUp(self):
+        clear_dependency_order_cache()
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        clear_dependency_order_cache()
+        shutil.rmtree(self.cache_dir)
+
+    def _node_mgr(self, hdf_keys=['Raw'], start_datetime=datetime(2000, 1, 1),
+                  aircraft_info={}):
+        return NodeManager({'Start Datetime': start_datetime}, 10,
+                           list(hdf_keys), ['Doubled'], [],
+                           {'Doubled': self.Doubled}, aircraft_info, {})
+
+    def test_planning_key(self):
+        key = planning_key(self._node_mgr())
+        # Attribute values not used for planning are ignored.
+        self.assertEqual(
+            key, planning_key(self._node_mgr(start_datetime=datetime.now())))
+        self.assertNotEqual(key, planning_key(self._node_mgr(['Raw', 'X'])))
+        self.assertNotEqual(
+            key, planning_key(self._node_mgr(aircraft_info={'Family': 'B737'})))
+        self.assertNotEqual(key, planning_key(self._node_mgr(), option=True))
+
+    @mock.patch('analysis_engine.dependency_graph.compact_process_order')
+    @mock.patch('analysis_engine.dependency_graph.compact_graph')
+    def test_dependency_order_cache(self, compact_graph, process_order):
+        process_order.return_value = (['Raw', 'Doubled'], 'gr_st')
+        with mock.patch.object(settings, 'DEPENDENCY_ORDER_CACHE_PATH',
+                               self.cache_dir):
+            for start_datetime in (datetime(2000, 1, 1), datetime.now()):
+                node_mgr = self._node_mgr(start_datetime=start_datetime)
+                self.assertEqual(
+                    dependency_order(node_mgr, draw=False, use_cache=True),
+                    (['Raw', 'Doubled'], 'gr_st'))
+            self.assertEqual(process_order.call_count, 1)
+            self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+            # Load from the on-disk store.
+            clear_dependency_order_cache()
+            dependency_order(self._node_mgr(), draw=False, use_cache=True)
+            self.assertEqual(process_order.call_count, 1)
+            dependency_order(self._node_mgr(['Raw', 'X']), draw=False,
+                             use_cache=True)
+            self.assertEqual(process_order.call_count, 2)
+        dependency_order(self._node_mgr(), draw=False)
+        self.assertEqual(process_order.call_count, 3)
+
+
+class TestCompactPlanner(unittest.TestCase):
+    def _random_node_mgr(self, size, seed=0):
+        '''
+        Create a NodeManager of size derived nodes with random dependencies
+        upon later nodes and LFL parameters.
+        '''
+        random = Random(seed)
+        lfl_params = ['Raw %d' % n for n in range(size // 4)]
+        names = ['Node %d' % n for n in range(size)]
+        derived_nodes = {}
+        for n, name in enumerate(names):
+            dependencies = random.sample(lfl_params + names[n + 1:],
+                                         random.randint(1, 4))
+            derived_nodes[name] = MockParam(
+                dependencies=dependencies,
+                operational=random.random() > 0.1)
+        requested = random.sample(names, size // 2)
+        return NodeManager({'Start Datetime': datetime.now()}, 10,
+                           lfl_params, requested, [], derived_nodes, {}, {})
+
+    def _assert_matches_networkx(self, mgr):
+        gr_all, gr_st, order = process_order(graph_nodes(mgr), mgr)
+        compact_order, compact_gr_st = dependency_order(mgr, draw=False)
+        self.assertEqual(compact_order, order)
+        self.assertEqual(compact_gr_st.nodes(), gr_st.nodes())
+        for name in gr_st.nodes():
+            self.assertEqual(compact_gr_st.successors(name),
+                             gr_st.successors(name))
+            self.assertEqual(compact_gr_st.predecessors(name),
+                             gr_st.predecessors(name))
+        exported = compact_gr_st.to_networkx()
+        self.assertEqual(exported.nodes(data=True), gr_st.nodes(data=True))
+        self.assertEqual(exported.edges(data=True), gr_st.edges(data=True))
+
+    def test_matches_networkx(self):
+        requested = ['P7', 'P8']
+        derived_nodes = {
+            'P4': MockParam(dependencies=['Raw1', 'Raw2']),
+            'P5': MockParam(dependencies=['Raw3', 'Raw4', 'Raw3']),
+            'P6': MockParam(dependencies=['Raw3']),
+            'P7': MockParam(dependencies=['P4', 'P5', 'P6']),
+            'P8': MockParam(dependencies=['Raw5', 'P6'], operational=False),
+        }
+        mgr = NodeManager({'Start Datetime': datetime.now()}, 10,
+                          ['Raw1', 'Raw2', 'Raw3', 'Raw4', 'Raw5'],
+                          requested, [], derived_nodes, {}, {})
+        self._assert_matches_networkx(mgr)
+
+    def test_matches_networkx_sample_modules(self):
+        for module_name, lfl_params, requested in (
+            ('sample_derived_parameters',
+             ['Indicated Airspeed', 'Groundspeed', 'Pressure Altitude',
+              'Heading', 'TAT', 'Latitude', 'Longitude'],
+             ['Smoothed Track', 'Vertical Speed', 'Slip On Runway']),
+            ('sample_circular_dependency_nodes',
+             ['Airspeed', 'Gear (L) Down', 'Gear (L) Red Warning'],
+             ['Airspeed At Gear Down Selected'])):
+            derived = get_derived_nodes([import_module(module_name)])
+            mgr = NodeManager({'Start Datetime': datetime.now()}, 10,
+                              lfl_params, requested, [], derived, {}, {})
+            self._assert_matches_networkx(mgr)
+
+    def test_matches_networkx_random(self):
+        for seed in range(5):
+            self._assert_matches_networkx(self._random_node_mgr(300, seed))
+
+    def test_circular_dependency(self):
+        derived_nodes = {
+            'Heading': MockParam(dependencies=['Heading True']),
+            'Heading True': MockParam(dependencies=['Heading', 'Raw']),
+            'Heading Max': MockParam(dependencies=['Heading']),
+        }
+        mgr = NodeManager({'Start Datetime': datetime.now()}, 10, ['Raw'],
+                          ['Heading Max'], [], derived_nodes, {}, {})
+        graph = compact_graph(mgr)
+        order = compact_dependencies(graph, 'root', mgr)
+        self.assertEqual([graph.names[i] for i in order],
+                         ['Raw', 'Heading True', 'Heading', 'Heading Max',
+                          'root'])
+        self.assertRaises(CircularDependency, compact_dependencies, graph,
+                          'root', mgr, raise_cir_dep=True)
+
+    def test_large_node_set(self):
+        '''
+        Plan a node set larger than all nodes within settings.NODE_MODULES.
+        '''
+        mgr = self._random_node_mgr(5000)
+        order, gr_st = dependency_order(mgr, draw=False)
+        self.assertTrue(len(order) > 1000)
+        self.assertEqual(len(set(order)), len(order))
+        self.assertEqual(sorted(gr_st.nodes()), sorted(order + ['root']))
+        # Every node is processed after its dependencies.
+        position = {name: n for n, name in enumerate(order)}
+        for name in order:
+            for dependency in gr_st.successors(name):
+                self.assertLess(position[dependency], position[name])
+
+
 class TestGraphAdjacencies(unittest.TestCase):
     def test_graph_adjacencies(self):
         g = nx.DiGraph()
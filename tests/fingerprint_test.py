@@ -0,0 +1,91 @@
+import numpy as np
+import unittest
+
+from datetime import datetime
+
+from analysis_engine.fingerprint import (
+    array_fingerprint, class_fingerprint, node_fingerprints, unchanged_nodes)
+from analysis_engine.node import (
+    A, DerivedParameterNode, KeyPointValueNode, NodeManager, P)
+
+
+class MockHDF(dict):
+    def get_param(self, name, valid_only=False):
+        return self[name]
+
+
+class Doubled(DerivedParameterNode):
+    def derive(self, raw=P('Raw')):
+        self.array = raw.array * 2
+
+
+class Trebled(DerivedParameterNode):
+    def derive(self, raw=P('Raw')):
+        self.array = raw.array * 3
+
+
+class DoubledMax(KeyPointValueNode):
+    def derive(self, doubled=P('Doubled'), tail=A('Tail Number')):
+        self.create_kpv(*np.ma.argmax(doubled.array))
+
+
+class TestClassFingerprint(unittest.TestCase):
+    def test_class_fingerprint(self):
+        self.assertEqual(class_fingerprint(Doubled), class_fingerprint(Doubled))
+        self.assertNotEqual(class_fingerprint(Doubled),
+                            class_fingerprint(Trebled))
+
+
+class TestArrayFingerprint(unittest.TestCase):
+    def test_array_fingerprint(self):
+        array = np.ma.arange(10)
+        fingerprint = array_fingerprint(array, 1, 0)
+        self.assertEqual(fingerprint, array_fingerprint(array.copy(), 1, 0))
+        self.assertNotEqual(fingerprint, array_fingerprint(array, 2, 0))
+        self.assertNotEqual(fingerprint,
+                            array_fingerprint(array.astype(float), 1, 0))
+        array[3] = np.ma.masked
+        self.assertNotEqual(fingerprint, array_fingerprint(array, 1, 0))
+
+
+class TestNodeFingerprints(unittest.TestCase):
+    def setUp(self):
+        self.hdf = MockHDF()
+        self.hdf['Raw'] = P('Raw', np.ma.arange(10))
+        self.process_order = ['Raw', 'Tail Number', 'Doubled', 'Doubled Max',
+                              'root']
+
+    def _fingerprints(self, derived_nodes, tail_number='G-FDSL'):
+        node_mgr = NodeManager(
+            {'Start Datetime': datetime.now()}, 10, ['Raw'], [], [],
+            derived_nodes, {'Tail Number': tail_number}, {})
+        return node_fingerprints(self.hdf, node_mgr, self.process_order)
+
+    def test_node_fingerprints(self):
+        derived_nodes = {'Doubled': Doubled, 'Doubled Max': DoubledMax}
+        fingerprints = self._fingerprints(derived_nodes)
+        self.assertEqual(sorted(fingerprints),
+                         ['Doubled', 'Doubled Max', 'Raw', 'Tail Number'])
+        self.assertEqual(unchanged_nodes(self._fingerprints(derived_nodes),
+                                         fingerprints), set(fingerprints))
+        # Changing an attribute only invalidates its dependants.
+        self.assertEqual(
+            unchanged_nodes(self._fingerprints(derived_nodes, 'G-ABCD'),
+                            fingerprints),
+            {'Raw', 'Doubled'})
+        # Changing a node invalidates its dependants.
+        derived_nodes['Doubled'] = Trebled
+        self.assertEqual(
+            unchanged_nodes(self._fingerprints(derived_nodes), fingerprints),
+            {'Raw', 'Tail Number'})
+
+    def test_node_fingerprints_data(self):
+        derived_nodes = {'Doubled': Doubled, 'Doubled Max': DoubledMax}
+        fingerprints = self._fingerprints(derived_nodes)
+        self.hdf['Raw'] = P('Raw', np.ma.arange(10))
+        self.assertEqual(self._fingerprints(derived_nodes), fingerprints)
+        # Changing recorded data invalidates its dependants.
+        self.hdf['Raw'] = P('Raw', np.ma.arange(1, 11))
+        self.assertEqual(
+            unchanged_nodes(self._fingerprints(derived_nodes), fingerprints),
+            {'Tail Number'})
@@ -1031,6 +1031,61 @@ class TestAlign(unittest.TestCase):
         np.testing.assert_array_equal(result.data, [0,2,3,5,7,8,10,12,13,15,17,18,20,22,23])
         np.testing.assert_array_equal(result.mask, [0] * 15)
 
+    def test_align_kernel_cache(self):
+        from analysis_engine.library import _align_kernels
+        _align_kernels.clear()
+        slave = P(array=np.ma.arange(8, dtype=float), frequency=2,
+                  offset=0.1)
+        master = P(array=np.ma.arange(16, dtype=float), frequency=4,
+                   offset=0.05)
+        first = align(slave, master)
+        self.assertEqual(len(_align_kernels), 1)
+        slave.array = np.ma.arange(16, 24, dtype=float)
+        second = align(slave, master)
+        self.assertEqual(len(_align_kernels), 1)
+        np.testing.assert_array_almost_equal(second.compressed(),
+                                             first.compressed() + 16)
+        np.testing.assert_array_equal(second.mask, first.mask)
+        with patch('analysis_engine.library.ALIGN_KERNEL_CACHE_SIZE', 1):
+            align(slave, master, interpolate=False)
+            self.assertEqual(len(_align_kernels), 1)
+
+
+class TestAlignArrays(unittest.TestCase):
+    def test_align_arrays(self):
+        arrays = [
+            np.ma.array([10, 11, 12, 13], mask=[0, 0, 1, 0], dtype=float),
+            np.ma.arange(4, dtype=float),
+            np.ma.array([5, 6, 7, 8], dtype=float),
+        ]
+        for args in ((2, 0.15, 8, 0.1), (2, 0, 1, 0.25), (2, 0.2, 2, 0.1),
+                     (2, 0.2, 8, 0.2)):
+            result = align_arrays(arrays, *args)
+            self.assertEqual(result.shape, (3, int(4 * args[2] / args[0])))
+            for row, array in zip(result, arrays):
+                expected = align_args(array, *args)
+                ma_test.assert_masked_array_equal(row, expected)
+
+    def test_align_arrays_long(self):
+        # Rows of long arrays are aligned in turn.
+        arrays = np.ma.arange(3 * 2 ** 14, dtype=float).reshape(3, 2 ** 14)
+        arrays[1, 100:200] = np.ma.masked
+        result = align_arrays(arrays, 4, 0.1, 8, 0)
+        self.assertEqual(result.shape, (3, 2 ** 15))
+        for row, array in zip(result, arrays):
+            ma_test.assert_masked_array_equal(row,
+                                              align_args(array, 4, 0.1, 8, 0))
+
+    def test_align_arrays_aligned(self):
+        arrays = [np.ma.arange(4), np.ma.arange(4, 8)]
+        result = align_arrays(arrays, 2, 0.1, 2, 0.1)
+        np.testing.assert_array_equal(result, [[0, 1, 2, 3], [4, 5, 6, 7]])
+
+    def test_align_arrays_mapped(self):
+        arrays = [MappedArray([0, 1], values_mapping={0: '-', 1: 'Up'})]
+        self.assertRaises(ValueError, align_arrays, arrays, 1, 0, 2, 0)
+
+
 class TestAlignStringArrays(unittest.TestCase):
     def test_offset(self):
         first = P(frequency=1.0, offset=0.6,
@@ -3069,6 +3124,32 @@ class TestHeadingDiff(unittest.TestCase):
         np.testing.assert_array_equal(heading_diff(array1, array2), expected)
 
 
+def hysteresis_loop(array, hysteresis):
+    '''
+    Previous implementation of hysteresis which loops over each sample, used
+    to check and benchmark hysteresis.
+    '''
+    quarter_range = hysteresis / 4.0
+    half_done = np.zeros(len(array))
+    result = np.zeros(len(array))
+    notmasked = np.ma.where(~np.ma.getmaskarray(array))[0]
+    old = array[notmasked[0]]
+    for index in notmasked:
+        new = array[index]
+        if new - old > quarter_range:
+            old = new  - quarter_range
+        elif new - old < -quarter_range:
+            old = new + quarter_range
+        half_done[index] = old
+    for index in notmasked[::-1]:
+        new = half_done[index]
+        if new - old > quarter_range:
+            old = new  - quarter_range
+        elif new - old < -quarter_range:
+            old = new + quarter_range
+        result[index] = old
+    return np.ma.array(result, mask=array.mask)
+
 class TestHysteresis(unittest.TestCase):
     def test_hysteresis(self):
         data = np.ma.array([0,1,2,1,0,-1,5,6,7,0],dtype=float)
@@ -3105,24 +3186,17 @@ class TestHysteresis(unittest.TestCase):
         np.testing.assert_array_equal(data.data, hysteresis(data,0).data)
         self.assertRaises(ValueError, hysteresis, data, -3)
 
-    """
-    Hysteresis may need to be speeded up, in which case this test can be
-    reinstated.
-
-    def test_time_taken(self):
-        from timeit import Timer
-        timer = Timer(self.using_large_data)
-        time = min(timer.repeat(1, 1))
-        print("Time taken %s secs" % time)
-        self.assertLess(time, 0.1, msg="Took too long")
-
-    def using_large_data(self):
-        data = np.ma.arange(100000)
-        data[0] = np.ma.masked
-        data[-1000:] = np.ma.masked
-        res = hysteresis(data, 10)
-        pass
-    """
+    def test_hysteresis_matches_loop(self):
+        np.random.seed(0)
+        data = np.ma.array(np.cumsum(np.random.randn(5000)),
+                           mask=np.random.rand(5000) < 0.1)
+        data[100] = np.nan
+        for level in (0.5, 2, 10):
+            self.assertEqual(hysteresis(data, level).data.tobytes(),
+                             hysteresis_loop(data, level).data.tobytes())
+        data = np.ma.array(np.random.randint(-20, 20, 1000))
+        self.assertEqual(hysteresis(data, 7).data.tobytes(),
+                         hysteresis_loop(data, 7).data.tobytes())
 
 
 class TestIndexAtValue(unittest.TestCase):
@@ -3265,6 +3339,40 @@ class TestIndexAtValue(unittest.TestCase):
         self.assertEqual(index_at_value(array, 10, _slice=slice(3, 0, -1), endpoint='closing'), 0)
 
 
+
+class TestIndexAtValues(unittest.TestCase):
+    def test_index_at_values(self):
+        array = np.ma.array([0, 1, 2, 1, 2, 3, 2, 1, 5, 4, 3, 2, 1, 0],
+                            dtype=float)
+        array[3] = np.ma.masked
+        thresholds = [0, 0.5, 1, 1.5, 2.5, 3.1, 4.5, 6, -1]
+        for _slice in (slice(None), slice(2, 12), slice(12, 1, -1),
+                       slice(None, None, -1), slice(4, 4)):
+            for endpoint in ('exact', 'closing', 'nearest', 'first_closing'):
+                self.assertEqual(
+                    index_at_values(array, thresholds, _slice, endpoint),
+                    [index_at_value(array, threshold, _slice, endpoint)
+                     for threshold in thresholds])
+        self.assertEqual(index_at_values(array, []), [])
+        self.assertEqual(index_at_values(array, [2.5, 4.5]), [4.5, 7.875])
+
+    def test_index_at_values_nan(self):
+        # index_at_value treats pairs including NaN as crossings when a
+        # threshold is crossed.
+        array = np.ma.array([0, 1, np.nan, 1, 2, 3])
+        self.assertEqual(index_at_values(array, [0.5, 2.5, 10]),
+                         [0.5, 1.5, None])
+
+    def test_value_crossings(self):
+        array = np.ma.arange(10)
+        crossings = ValueCrossings(array, slice(9, 0, -1))
+        self.assertEqual(crossings.index_at_value(2.5), 2.5)
+        self.assertEqual(crossings.indices_at_values([7.25, 20, 1]),
+                         [7.25, None, 1.0])
+        self.assertEqual(crossings.index_at_value(20, endpoint='nearest'), 9)
+        self.assertRaises(ValueError, ValueCrossings(array, slice(0, 9, 2))
+                          .index_at_value, 2.5)
+
 class TestIndexClosestValue(unittest.TestCase):
     def test_index_closest_value(self):
         array = np.ma.array([1, 2, 3, 4, 5, 4, 3])
@@ -3552,6 +3660,71 @@ class TestInterpolateParams(unittest.TestCase):
 """
 
 
+class TestIntervalSet(unittest.TestCase):
+    def test_init(self):
+        intervals = IntervalSet([8, 0, 2, 12, 4], [10, 3, 6, 12, 5])
+        self.assertEqual(intervals.to_slices(),
+                         [slice(0, 6), slice(8, 10)])
+        self.assertEqual(len(intervals), 2)
+        # Touching intervals are not merged, as in slices_and.
+        self.assertEqual(IntervalSet([0, 5], [5, 7]).to_slices(),
+                         [slice(0, 5), slice(5, 7)])
+        self.assertEqual(len(IntervalSet()), 0)
+
+    def test_from_slices(self):
+        self.assertEqual(IntervalSet.from_slices([slice(5, 7), slice(1, 3)]),
+                         IntervalSet([1, 5], [3, 7]))
+        section_node = S(items=[Section('Phase', slice(2, 4), 1.5, 4.5)])
+        self.assertEqual(IntervalSet.from_slices(section_node).to_slices(),
+                         [slice(1.5, 4.5)])
+        self.assertEqual(section_node.get_interval_set(edges=False),
+                         IntervalSet([2], [4]))
+        self.assertRaises(ValueError, IntervalSet.from_slices,
+                          [slice(None, 4)])
+        self.assertRaises(ValueError, IntervalSet.from_slices,
+                          [slice(8, 4, -1)])
+
+    def test_set_operations(self):
+        first = IntervalSet([2, 10], [6, 20])
+        second = IntervalSet([4, 12, 18], [11, 14, 30])
+        self.assertEqual((first | second).to_slices(), [slice(2, 30)])
+        self.assertEqual((first & second).to_slices(),
+                         [slice(4, 6), slice(10, 11), slice(12, 14),
+                          slice(18, 20)])
+        self.assertEqual((first - second).to_slices(),
+                         [slice(2, 4), slice(11, 12), slice(14, 18)])
+        self.assertEqual(first.complement(0, 25).to_slices(),
+                         [slice(0, 2), slice(6, 10), slice(20, 25)])
+        self.assertEqual(first & IntervalSet(), IntervalSet())
+
+    def test_remove_small(self):
+        intervals = IntervalSet([0, 12, 30], [10, 20, 31])
+        self.assertEqual(intervals.remove_small_gaps(5).to_slices(),
+                         [slice(0, 20), slice(30, 31)])
+        self.assertEqual(intervals.remove_small_slices(5).to_slices(),
+                         [slice(0, 10), slice(12, 20)])
+        self.assertEqual(intervals.durations(hz=2).tolist(), [5, 4, 0.5])
+
+    def test_matches_slices_functions(self):
+        first = [slice(i * 10, i * 10 + 6) for i in range(100)]
+        second = [slice(i * 10 + 4, i * 10 + 13) for i in range(100)]
+        self.assertEqual(
+            (IntervalSet.from_slices(first) &
+             IntervalSet.from_slices(second)).to_slices(),
+            slices_and(first, second))
+        self.assertEqual(
+            IntervalSet.from_slices(first).complement(0, 1000).to_slices(),
+            slices_not(first, begin_at=0, end_at=1000))
+
+    def test_slices_and_many(self):
+        first = [slice(i * 100, i * 100 + 60) for i in range(1000)]
+        second = [slice(i * 100 + 30, i * 100 + 90) for i in range(1000)]
+        result = slices_and(first, second)
+        self.assertEqual(len(result), 1000)
+        self.assertEqual(result[0], slice(30, 60))
+        self.assertEqual(result[-1], slice(99930, 99960))
+
+
 class TestIsIndexWithinSlice(unittest.TestCase):
     def test_is_index_within_slice(self):
         self.assertTrue(is_index_within_slice(1, slice(0,2)))
@@ -3571,6 +3744,18 @@ class TestIsIndexWithinSlices(unittest.TestCase):
         self.assertTrue(is_index_within_slices(10, [slice(8,None)]))
         self.assertTrue(is_index_within_slices(10, [slice(None, 12)]))
 
+    def test_indices_within_slices(self):
+        slices = [slice(0, 2), slice(5, 7), slice(12, 9, -1), slice(20, None)]
+        indices = [-1, 0, 1.5, 2, 5, 7, 9, 10, 12, 19.5, 20, 100]
+        expected = [is_index_within_slices(i, slices) for i in indices]
+        self.assertEqual(indices_within_slices(indices, slices).tolist(),
+                         expected)
+        self.assertEqual(indices_within_slices(indices, []).tolist(),
+                         [False] * len(indices))
+        self.assertEqual(
+            indices_within_slices(indices, [slice(None)]).tolist(),
+            [True] * len(indices))
+
 
 class TestILSEstablished(unittest.TestCase):
     def test_basic(self):
@@ -5041,6 +5226,38 @@ class TestRateOfChange(unittest.TestCase):
         ma_test.assert_mask_equivalent(sloped, answer)
 
 
+def repair_mask_loop(array, repair_duration=REPAIR_DURATION,
+                     extrapolate=False, repair_above=None,
+                     method='interpolate'):
+    '''
+    Previous implementation of repair_mask which repairs each masked section
+    in turn, used to check and benchmark repair_mask.
+    '''
+    for section in np.ma.clump_masked(array):
+        length = section.stop - section.start
+        if repair_duration and length > repair_duration:
+            continue
+        elif section.start == 0:
+            if extrapolate or method == 'fill_stop':
+                array[section] = array[section.stop]
+        elif section.stop == len(array):
+            if extrapolate or method == 'fill_start':
+                array[section] = array[section.start - 1]
+        else:
+            start_value = array[section.start - 1]
+            stop_value = array[section.stop]
+            if method == 'interpolate':
+                if (repair_above is None or
+                    (start_value > repair_above and stop_value > repair_above)):
+                    array.data[section] = np.linspace(start_value, stop_value,
+                                                      length+2)[1:-1]
+                    array.mask[section] = False
+            elif method == 'fill_start':
+                array[section] = start_value
+            elif method == 'fill_stop':
+                array[section] = stop_value
+    return array
+
 class TestRepairMask(unittest.TestCase):
     def setUp(self):
         self.basic_data = np.ma.array(
@@ -5134,6 +5351,94 @@ class TestRepairMask(unittest.TestCase):
         self.assertFalse(np.ma.is_masked(res[8]))
         self.assertFalse(np.ma.is_masked(res[9]))
 
+    def test_repair_mask_read_only(self):
+        array = read_only_view(self.basic_data)
+        res = repair_mask(array)
+        self.assertEqual(res.tolist(),
+                         repair_mask(self.basic_data, copy=True).tolist())
+        self.assertTrue(np.ma.count_masked(res) < np.ma.count_masked(array))
+        self.assertEqual(self.basic_data.tolist(),
+                         [None, None, 10, None, None, 20, 23, 26, 30, None,
+                          None])
+
+    def test_repair_mask_matches_loop(self):
+        np.random.seed(0)
+        for dtype in (float, np.float32, int):
+            array = np.ma.array((np.random.randn(500) * 100).astype(dtype),
+                                mask=np.random.rand(500) < 0.4)
+            for method in ('interpolate', 'fill_start', 'fill_stop'):
+                for kwargs in ({}, {'extrapolate': True},
+                               {'repair_above': 0},
+                               {'repair_duration': None}):
+                    expected = repair_mask_loop(array.copy(), method=method,
+                                                **kwargs)
+                    result = repair_mask(array, copy=True, method=method,
+                                         **kwargs)
+                    self.assertEqual(result.data.tobytes(),
+                                     expected.data.tobytes())
+                    assert_array_equal(result.mask, expected.mask)
+
+    def test_repair_mask_raises_after_repairing(self):
+        array = np.ma.array(np.arange(20.0), mask=[0, 1] + [0] * 5 +
+                            [1] * 12 + [0])
+        self.assertRaises(ValueError, repair_mask, array,
+                          raise_duration_exceedance=True)
+        self.assertFalse(array.mask[1])
+        self.assertTrue(array.mask[7:19].all())
+        array[3] = np.ma.masked
+        self.assertRaises(NotImplementedError, repair_mask, array,
+                          method='fill_middle')
+
+    def test_repair_mask_many_sections(self):
+        # Noisy data with thousands of short masked sections.
+        np.random.seed(0)
+        array = np.ma.array(np.random.randn(100000),
+                            mask=np.random.rand(100000) < 0.2)
+        for method in ('interpolate', 'fill_start'):
+            expected = repair_mask_loop(array.copy(), method=method)
+            result = repair_mask(array, copy=True, method=method)
+            assert_array_equal(result.data, expected.data)
+            assert_array_equal(np.ma.getmaskarray(result),
+                               np.ma.getmaskarray(expected))
+
+
+class TestReadOnlyView(unittest.TestCase):
+    def test_read_only_view(self):
+        array = np.ma.array([1.0, 2.0, 3.0], mask=[False, True, False])
+        view = read_only_view(array)
+        self.assertEqual(view.tolist(), [1.0, None, 3.0])
+        self.assertRaises(ValueError, view.__setitem__, 0, 5.0)
+        self.assertRaises(ValueError, view.__setitem__, 0, np.ma.masked)
+        self.assertRaises(ValueError, view.mask.__setitem__, 1, False)
+        self.assertEqual(array.tolist(), [1.0, None, 3.0])
+        # The original array remains writeable and shares data with the view.
+        array[0] = 4.0
+        self.assertEqual(view[0], 4.0)
+
+    def test_read_only_view_nomask(self):
+        array = np.ma.arange(3)
+        view = read_only_view(array)
+        self.assertRaises(ValueError, view.__setitem__, 0, 5)
+        # Masking creates a mask belonging to the view alone.
+        view[0] = np.ma.masked
+        self.assertFalse(np.ma.is_masked(array))
+
+
+class TestWriteable(unittest.TestCase):
+    def test_writeable(self):
+        array = np.ma.array([1, 2, 3], mask=[False, True, False])
+        self.assertIs(writeable(array), array)
+        copied = writeable(array, copy=True)
+        self.assertIsNot(copied, array)
+        self.assertEqual(copied.tolist(), array.tolist())
+        view = read_only_view(array)
+        copied = writeable(view)
+        self.assertIsNot(copied, view)
+        copied[0] = 5
+        copied[1] = 6
+        self.assertEqual(copied.tolist(), [5, 6, 3])
+        self.assertEqual(array.tolist(), [1, None, 3])
+
 
 class TestResample(unittest.TestCase):
     def test_resample_upsample(self):
@@ -6401,6 +6706,12 @@ class TestSlicesNot(unittest.TestCase):
         slice_list = [slice(10,13),slice(16,25)]
         self.assertEqual(slices_not(slice_list), [slice(13,16)])
 
+    def test_slices_not_empty_slices(self):
+        self.assertEqual(slices_not([slice(0,0)]), [slice(0,0)])
+        self.assertEqual(slices_not([slice(3,3)]), [])
+        self.assertEqual(slices_not([slice(3,3)], begin_at=1, end_at=5),
+                         [slice(1,5)])
+
     def test_slices_not_extended(self):
         slice_list = [slice(10,13)]
         self.assertEqual(slices_not(slice_list, begin_at=2, end_at=18),
@@ -6994,9 +7305,45 @@ class TestSmoothTrack(unittest.TestCase):
         lon = np.ma.array([0,0,0,1,1,1], dtype=float)
         lat = np.ma.zeros(6, dtype=float)
         lat_s, lon_s, cost = smooth_track(lat, lon, None, 1.0)
+        self.assertLess (cost,201)
+        self.assertGreater (cost,200)
+        lat_s, lon_s, cost = smooth_track(lat, lon, None, 1.0,
+                                          method='iterative')
         self.assertLess (cost,251)
         self.assertGreater (cost,250)
 
+    def test_smooth_track_minimum(self):
+        # The banded solution matches a dense solution of the normal
+        # equations and is no worse than the iterative method.
+        lat = np.ma.array(np.sin(np.arange(40) / 5.0) +
+                          np.tile([0.0, 0.1, -0.05, 0.02], 10))
+        lon = np.ma.array(np.arange(40) ** 2 / 100.0 +
+                          np.tile([0.03, -0.1, 0.0, 0.07], 10))
+        lat_s, lon_s, cost = smooth_track(lat, lon, None, 0.5)
+        self.assertAlmostEqual(
+            cost, smooth_track_cost_function(lat_s, lon_s, lat, lon, None,
+                                             0.5))
+        second_diff = np.diff(np.eye(40), n=2, axis=0)
+        normal = np.eye(40) + 300 * second_diff.T.dot(second_diff)
+        for recorded, smoothed in ((lat, lat_s), (lon, lon_s)):
+            # The first and last two samples are held.
+            assert_array_equal(smoothed[[0, 1, -2, -1]],
+                               recorded[[0, 1, -2, -1]])
+            expected = recorded.data.copy()
+            rhs = recorded.data[2:-2] - \
+                normal[2:-2][:, [0, 1, -2, -1]].dot(recorded.data[[0, 1, -2, -1]])
+            expected[2:-2] = np.linalg.solve(normal[2:-2, 2:-2], rhs)
+            assert_array_almost_equal(smoothed, expected, decimal=10)
+        lat_i, lon_i, cost_i = smooth_track(lat, lon, None, 0.5,
+                                            method='iterative')
+        # The iterative method stops once the cost no longer decreases,
+        # short of the minimum.
+        self.assertLess(cost, cost_i)
+        self.assertLess(cost_i, smooth_track_cost_function(
+            lat, lon, lat, lon, None, 0.5))
+        self.assertRaises(ValueError, smooth_track, lat, lon, None, 0.5,
+                          method='unknown')
+
     def test_smooth_track_speed(self):
         lon = np.ma.arange(10000, dtype=float)
         lon = lon%27
@@ -7306,6 +7653,111 @@ class TestValueAtIndex(unittest.TestCase):
             self.assertEquals(value_at_index(array, x, interpolate=False), expected)
 
 
+class TestValueAtIndices(unittest.TestCase):
+    def test_value_at_indices_basic(self):
+        array = np.ma.arange(4)
+        result = value_at_indices(array, [1.5, 3.7, -0.5, 2])
+        self.assertEqual(result.tolist(), [1.5, 3.0, 0.0, 2.0])
+
+    def test_value_at_indices_masked(self):
+        array = np.ma.arange(6, dtype=float)
+        array[2] = np.ma.masked
+        array[4:] = np.ma.masked
+        result = value_at_indices(array, [2, 1.25, 2.75, 4.5, None])
+        self.assertEqual(result.tolist(), [None, 1.0, 3.0, None, None])
+
+    def test_value_at_indices_non_interpolated(self):
+        array = np.ma.arange(4)
+        result = value_at_indices(array, [2.0, 2.25, 2.5, 2.75, 3.0],
+                                  interpolate=False)
+        self.assertEqual(result.tolist(), [2, 2, 3, 3, 3])
+
+    def test_value_at_indices_matches_value_at_index(self):
+        array = np.ma.array([3.0, 5.0, 2.0, 8.0, 1.0, 9.0, 4.0],
+                            mask=[0, 0, 1, 0, 0, 1, 1])
+        indices = np.arange(-1, 8, 0.25)
+        result = value_at_indices(array, indices).tolist()
+        for index, value in zip(indices, result):
+            expected = value_at_index(array, index)
+            if expected is np.ma.masked:
+                expected = None
+            self.assertEqual(value, expected, index)
+
+    def test_value_at_indices_empty(self):
+        self.assertEqual(value_at_indices(np.ma.arange(4), []).size, 0)
+        self.assertTrue(value_at_indices(np.ma.array([]), [1]).mask.all())
+
+    def test_value_at_index_array(self):
+        array = np.ma.arange(4)
+        self.assertEqual(value_at_index(array, [0.5, 1]).tolist(), [0.5, 1.0])
+
+
+
+class TestValuesWithinSlices(unittest.TestCase):
+    def setUp(self):
+        self.array = np.ma.array([3.0, -8.0, 5.0, 2.0, 9.0, 1.0, -4.0, 7.0],
+                                 mask=[0, 0, 0, 1, 1, 0, 0, 0])
+        self.slices = [slice(0, 3), slice(1.5, 6.5), slice(3, 5), slice(2, 8),
+                       slice(None, None), slice(6, 20)]
+        self.start_edges = [None, None, 2.5, 1.5, None, 5.25]
+        self.stop_edges = [2.5, None, None, 8.0, None, None]
+
+    def test_values_within_slices(self):
+        for function in (max_value, min_value):
+            expected = [function(self.array, _slice, start_edge=start_edge,
+                                 stop_edge=stop_edge)
+                        for _slice, start_edge, stop_edge in
+                        zip(self.slices, self.start_edges, self.stop_edges)]
+            self.assertEqual(values_within_slices(
+                self.array, self.slices, function,
+                start_edges=self.start_edges, stop_edges=self.stop_edges),
+                expected, function.__name__)
+        slices = [slice(0, 3), slice(2, 8), slice(None, 4)]
+        self.assertEqual(
+            values_within_slices(self.array, slices, max_abs_value,
+                                 start_edges=[None, 2, None]),
+            [max_abs_value(self.array, slices[0]),
+             max_abs_value(self.array, slices[1], start_edge=2),
+             max_abs_value(self.array, slices[2])])
+
+    def test_values_within_slices_values(self):
+        self.assertEqual(
+            values_within_slices(self.array, self.slices, max_value,
+                                 start_edges=self.start_edges,
+                                 stop_edges=self.stop_edges),
+            [(2, 5.0), (2, 5.0), (None, None), (7, 7.0), (7, 7.0), (7, 7.0)])
+        self.assertEqual(
+            values_within_slices(self.array, self.slices, min_value,
+                                 start_edges=self.start_edges,
+                                 stop_edges=self.stop_edges),
+            [(1, -8.0), (1.5, -1.5), (None, None), (6, -4.0), (1, -8.0),
+             (6, -4.0)])
+        # The first of equal values.
+        self.assertEqual(
+            values_within_slices(np.ma.array([1, 2, 2, 1, 1]),
+                                 [slice(0, 5), slice(3, 5)], min_value),
+            [(0, 1), (3, 1)])
+
+    def test_values_within_slices_per_slice(self):
+        function = mock.Mock(return_value=Value(1, 2))
+        result = values_within_slices(self.array, self.slices[:2], function,
+                                      stop_edges=[2.5, None])
+        self.assertEqual(result, [Value(1, 2), Value(1, 2)])
+        self.assertEqual(function.call_args_list, [
+            mock.call(self.array, slice(0, 3), start_edge=None,
+                      stop_edge=2.5),
+            mock.call(self.array, slice(1.5, 6.5), start_edge=None,
+                      stop_edge=None),
+        ])
+        with self.assertRaises(ValueError):
+            values_within_slices(self.array, [slice(5, 1, -1)], max_value)
+
+    def test_values_within_slices_empty(self):
+        self.assertEqual(values_within_slices(self.array, [], max_value), [])
+        self.assertEqual(
+            values_within_slices(np.ma.array([]), [slice(0, 5)], min_value),
+            [(None, None)])
+
 class TestVstackParams(unittest.TestCase):
     def test_vstack_params(self):
         a = P('a', array=np.ma.array(range(0, 10)))
@@ -0,0 +1,115 @@
+import mock
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from analysis_engine.manifest import LazyNode, lazy_derived_nodes, module_path
+from analysis_engine.node import (
+    A, DerivedParameterNode, KeyPointValueNode, P)
+from analysis_engine.utils import get_derived_nodes
+
+
+MODULE_SOURCE = '''
+from analysis_engine.node import A, DerivedParameterNode, KeyPointValueNode, P
+
+
+class Doubled(DerivedParameterNode):
+    def derive(self, raw=P('Raw')):
+        self.array = raw.array * 2
+
+
+class RawAtPosition(KeyPointValueNode):
+    NAME_FORMAT = 'Raw At %(position)s'
+    NAME_VALUES = {'position': ('Top', 'Bottom')}
+
+    @classmethod
+    def can_operate(cls, available, tail=A('Tail Number')):
+        return tail.value == 'G-FDSL' and 'Raw' in available
+
+    def derive(self, raw=P('Raw')):
+        pass
+'''
+
+MODULE_NAME = 'sample_manifest_nodes'
+
+
+class TestManifest(unittest.TestCase):
+    def setUp(self):
+        self.module_dir = tempfile.mkdtemp()
+        self.manifest_path = os.path.join(self.module_dir, 'manifest')
+        with open(os.path.join(self.module_dir, MODULE_NAME + '.py'), 'w') as f:
+            f.write(MODULE_SOURCE)
+        sys.path.insert(0, self.module_dir)
+        self.scan = mock.Mock(side_effect=get_derived_nodes)
+
+    def tearDown(self):
+        sys.path.remove(self.module_dir)
+        sys.modules.pop(MODULE_NAME, None)
+        shutil.rmtree(self.module_dir)
+
+    def test_module_path(self):
+        self.assertEqual(module_path(MODULE_NAME),
+                         os.path.join(self.module_dir, MODULE_NAME + '.py'))
+        self.assertNotIn(MODULE_NAME, sys.modules)
+        self.assertIsNone(module_path('missing_module_name'))
+
+    def test_lazy_derived_nodes(self):
+        nodes = lazy_derived_nodes([MODULE_NAME], self.manifest_path,
+                                   self.scan)
+        self.assertEqual(self.scan.call_count, 1)
+        self.assertEqual(sorted(nodes), ['Doubled', 'Raw At Position'])
+        # The manifest is reused without importing the module.
+        sys.modules.pop(MODULE_NAME)
+        nodes = lazy_derived_nodes([MODULE_NAME], self.manifest_path,
+                                   self.scan)
+        self.assertEqual(self.scan.call_count, 1)
+        doubled = nodes['Doubled']
+        self.assertIsInstance(doubled, LazyNode)
+        self.assertEqual(doubled.get_name(), 'Doubled')
+        self.assertEqual(doubled.get_dependency_names(), ['Raw'])
+        self.assertEqual(doubled.get_can_operate_attribute_names(), ())
+        self.assertIs(doubled.__base__, DerivedParameterNode)
+        self.assertEqual(doubled.__name__, 'Doubled')
+        self.assertEqual(doubled.__module__, MODULE_NAME)
+        self.assertTrue(doubled.can_operate(['Raw']))
+        self.assertFalse(doubled.can_operate([]))
+        kpv = nodes['Raw At Position']
+        self.assertEqual(kpv.names(), ['Raw At Top', 'Raw At Bottom'])
+        self.assertEqual(kpv.get_can_operate_attribute_names(),
+                         ('Tail Number',))
+        self.assertIs(kpv.__base__, KeyPointValueNode)
+        self.assertNotIn(MODULE_NAME, sys.modules)
+        # Overridden can_operate methods import the module.
+        self.assertTrue(kpv.can_operate(['Raw'], A('Tail Number', 'G-FDSL')))
+        self.assertIn(MODULE_NAME, sys.modules)
+        node = doubled()
+        self.assertIsInstance(node, DerivedParameterNode)
+        self.assertIs(type(node), doubled.node_class)
+
+    def test_lazy_derived_nodes_modified(self):
+        lazy_derived_nodes([MODULE_NAME], self.manifest_path, self.scan)
+        path = module_path(MODULE_NAME)
+        mtime = os.path.getmtime(path)
+        os.utime(path, (mtime + 10, mtime + 10))
+        lazy_derived_nodes([MODULE_NAME], self.manifest_path, self.scan)
+        self.assertEqual(self.scan.call_count, 2)
+
+
+class TestDependencyNames(unittest.TestCase):
+    def test_get_dependency_names(self):
+        class Sample(DerivedParameterNode):
+            @classmethod
+            def can_operate(cls, available, tail=A('Tail Number')):
+                return True
+
+            def derive(self, a=P('A'), b=P('B')):
+                pass
+
+        names = Sample.get_dependency_names()
+        self.assertEqual(names, ['A', 'B'])
+        names.append('C')
+        self.assertEqual(Sample.get_dependency_names(), ['A', 'B'])
+        self.assertEqual(Sample.get_can_operate_attribute_names(),
+                         ('Tail Number',))
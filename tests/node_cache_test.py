@@ -0,0 +1,80 @@
+import numpy as np
+import os
+import shutil
+import tempfile
+import unittest
+
+from analysis_engine.node import P
+from analysis_engine.node_cache import NodeCache
+
+
+class TestNodeCache(unittest.TestCase):
+    def setUp(self):
+        self.spill_path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.spill_path)
+
+    def _param(self, name, size=10):
+        # 8 bytes per value
+        return P(name, np.ma.arange(size, dtype=float))
+
+    def test_lru_eviction(self):
+        cache = NodeCache(max_bytes=200)
+        a, b, c = self._param('A'), self._param('B'), self._param('C')
+        cache[('A', 1, 0)] = a
+        cache[('B', 1, 0)] = b
+        self.assertEqual(cache.nbytes, 160)
+        # Access A so that B is least recently used.
+        self.assertIs(cache.get(('A', 1, 0)), a)
+        cache[('C', 1, 0)] = c
+        self.assertEqual(cache.nbytes, 160)
+        self.assertEqual(cache.evictions, 1)
+        self.assertIsNone(cache.get(('B', 1, 0)))
+        self.assertIs(cache.get(('A', 1, 0)), a)
+        self.assertIs(cache.get(('C', 1, 0)), c)
+        self.assertEqual((cache.hits, cache.misses), (3, 1))
+        self.assertEqual(sorted(cache), [('A', 1, 0), ('C', 1, 0)])
+        # Larger than the entire budget.
+        cache[('D', 1, 0)] = self._param('D', size=100)
+        self.assertNotIn(('D', 1, 0), cache)
+        self.assertEqual(cache.evictions, 2)
+
+    def test_unbounded(self):
+        cache = NodeCache()
+        for name in 'ABCDE':
+            cache[(name, 1, 0)] = self._param(name, size=1000)
+        self.assertEqual(len(cache), 5)
+        self.assertEqual(cache.nbytes, 40000)
+        self.assertIs(cache.pop(('A', 1, 0)).name, 'A')
+        self.assertIsNone(cache.pop(('A', 1, 0)))
+        self.assertEqual(cache.nbytes, 32000)
+        cache.clear()
+        self.assertEqual((len(cache), cache.nbytes), (0, 0))
+
+    def test_spill(self):
+        cache = NodeCache(max_bytes=100, spill_path=self.spill_path)
+        a = self._param('A')
+        a.array[3] = np.ma.masked
+        cache[('A', 1, 0)] = a
+        cache[('B', 1, 0)] = self._param('B')
+        self.assertEqual(cache.spills, 1)
+        self.assertEqual(cache.nbytes, 80)
+        spilled = cache.get(('A', 1, 0))
+        self.assertIsNot(spilled, a)
+        self.assertIsInstance(spilled.array.data, np.memmap)
+        np.testing.assert_array_equal(spilled.array, a.array)
+        np.testing.assert_array_equal(spilled.array.mask, a.array.mask)
+        # The original node is unchanged.
+        self.assertNotIsInstance(a.array.data, np.memmap)
+        self.assertEqual(len(cache), 2)
+        cache.clear()
+        self.assertEqual(os.listdir(self.spill_path), [])
+
+    def test_node_get_aligned(self):
+        cache = NodeCache(max_bytes=10 ** 6)
+        param = P('A', np.ma.arange(10, dtype=float), frequency=1, cache=cache)
+        aligned = param.get_aligned(P('B', frequency=2, offset=0.25))
+        self.assertIs(param.get_aligned(P('B', frequency=2, offset=0.25)),
+                      aligned)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
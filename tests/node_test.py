@@ -6,10 +6,9 @@ import os
 import unittest
 
 from datetime import datetime
-from inspect import ArgSpec
 from random import shuffle
 
-from analysis_engine.library import min_value, max_value, average_value
+from analysis_engine.library import min_value, max_abs_value, max_value, average_value
 from analysis_engine.node import (
     ApproachItem,
     ApproachNode,
@@ -19,14 +18,23 @@ from analysis_engine.node import (
     KeyTimeInstanceNode, KeyTimeInstance, KTI,
     FlightAttributeNode,
     FormattedNameNode,
+    ItemColumns,
     Node, NodeManager,
+    can_operate,
+    clear_can_operate_cache,
     Parameter, P,
     MultistateDerivedParameterNode, M,
     load,
+    multistate_string_to_integer,
     powerset,
+    state_table,
+    SectionIndex,
     SectionNode,
     Section,
     _calculate_offset,
+    dependency_writes,
+    intern_name,
+    interned_name,
 )
 
 from hdfaccess.file import hdf_file
@@ -421,15 +429,13 @@ class TestFlightAttributeNode(unittest.TestCase):
         self.assertFalse(bool(attr))
 
 class TestNodeManager(unittest.TestCase):
-    @mock.patch('analysis_engine.node.inspect.getargspec')
-    def test_operational(self, getargspec):
-        argspec = mock.Mock()
-        argspec.defaults = []
-        getargspec.return_value = argspec
+    def test_operational(self):
         mock_node = mock.Mock('can_operate') # operable node
         mock_node.can_operate = mock.Mock(return_value=True)
+        mock_node.get_can_operate_attribute_names = mock.Mock(return_value=())
         mock_inop = mock.Mock('can_operate') # inoperable node
         mock_inop.can_operate = mock.Mock(return_value=False)
+        mock_inop.get_can_operate_attribute_names = mock.Mock(return_value=())
         aci = {'n':1, 'o':2, 'p':3, 'u': None}
         afr = {'l':4, 'm':5, 'v': None}
         mgr = NodeManager(
@@ -449,20 +455,73 @@ class TestNodeManager(unittest.TestCase):
         self.assertFalse(mgr.operational('v', ['a'])) # achieved flight record
         self.assertFalse(mgr.operational('u', ['a'])) # aircraft info
         self.assertFalse(mgr.operational('z', ['a', 'b']))
-        getargspec.return_value = argspec
         self.assertEqual(mgr.keys(),
                          ['HDF Duration'] +
                          list('abclmnopxyz'))
-        getargspec.return_value = ArgSpec(
-            args=['cls', 'available', 'x'], varargs=None, keywords=None,
-            defaults=(Attribute('o', None),))
+        mock_node.get_can_operate_attribute_names.return_value = ('o',)
         self.assertTrue(mgr.operational('y', ['o']))
         mock_node.can_operate.assert_called_with(['o'], Attribute('o', 2))
-        getargspec.return_value = ArgSpec(
-            args=['cls', 'available', 'x'], varargs=None, keywords=None,
-            defaults=(DerivedParameterNode('o'),))
+        mock_node.get_can_operate_attribute_names.side_effect = TypeError
         self.assertRaises(TypeError, mgr.operational, 'y', Attribute('o', 2))
 
+    def test_operational_memoised(self):
+        clear_can_operate_cache()
+        mock_node = mock.Mock('can_operate')
+        mock_node.can_operate = mock.Mock(return_value=True)
+        mock_node.get_can_operate_attribute_names = mock.Mock(
+            return_value=('n',))
+        # Separate flights with the same frame and aircraft.
+        for tail in ('G-ABCD', 'G-EFGH'):
+            mgr = NodeManager({}, 10, ['a', 'b'], ['y'], [],
+                              {'y': mock_node}, {'n': 1, 'Tail Number': tail},
+                              {})
+            self.assertTrue(mgr.operational('y', ['a', 'b']))
+            self.assertTrue(mgr.operational('y', ['b', 'a']))
+        self.assertEqual(mock_node.can_operate.call_count, 1)
+        mgr.aircraft_info['n'] = 2
+        self.assertTrue(mgr.operational('y', ['a', 'b']))
+        self.assertEqual(mock_node.can_operate.call_count, 2)
+        self.assertTrue(mgr.operational('y', ['a']))
+        self.assertEqual(mock_node.can_operate.call_count, 3)
+        # Unhashable attribute values are not memoised.
+        mgr.aircraft_info['n'] = [1]
+        self.assertTrue(mgr.operational('y', ['a']))
+        self.assertTrue(mgr.operational('y', ['a']))
+        self.assertEqual(mock_node.can_operate.call_count, 5)
+
+    @mock.patch('analysis_engine.node.CAN_OPERATE_CACHE_SIZE', 1)
+    def test_can_operate_cache_size(self):
+        clear_can_operate_cache()
+        mock_node = mock.Mock('can_operate')
+        mock_node.can_operate = mock.Mock(return_value=False)
+        self.assertFalse(can_operate(mock_node, ['a']))
+        self.assertFalse(can_operate(mock_node, ['a']))
+        self.assertEqual(mock_node.can_operate.call_count, 1)
+        self.assertFalse(can_operate(mock_node, ['b']))
+        self.assertFalse(can_operate(mock_node, ['a']))
+        self.assertEqual(mock_node.can_operate.call_count, 3)
+
+    def test_get_can_operate_attribute_names(self):
+        class Operational(DerivedParameterNode):
+            @classmethod
+            def can_operate(cls, available, x=Attribute('o')):
+                return True
+
+            def derive(self, a=P('a')):
+                pass
+
+        class Invalid(DerivedParameterNode):
+            @classmethod
+            def can_operate(cls, available, x=P('o')):
+                return True
+
+            def derive(self, a=P('a')):
+                pass
+
+        self.assertEqual(Operational.get_can_operate_attribute_names(),
+                         ('o',))
+        self.assertRaises(TypeError, Invalid.get_can_operate_attribute_names)
+
     def test_get_attribute(self):
         aci = {'a': 'a_value', 'b': None}
         afr = {'x': 'x_value', 'y': None}
@@ -897,6 +956,44 @@ class TestSectionNode(unittest.TestCase):
         self.assertEqual(node.get_surrounding(-3), [])
         self.assertEqual(node.get_surrounding(25), [sect_2])
 
+    def test_section_index(self):
+        sect_1 = Section('A', slice(2, 15), 2, 15)
+        sect_2 = Section('B', slice(5, 25), 5, 25)
+        sect_3 = Section('A', slice(30, 40), 30, 40)
+        node = SectionNode(items=[sect_3, sect_1, sect_2])
+        section_index = node._get_section_index()
+        self.assertIsInstance(section_index, SectionIndex)
+        self.assertEqual(section_index.containing(12).tolist(), [1, 2])
+        self.assertEqual(section_index.containing(25).tolist(), [])
+        self.assertEqual(
+            section_index.containing(25, inclusive=True).tolist(), [2])
+        self.assertEqual(node.get_next(3), sect_2)
+        self.assertEqual(node.get_next(10, use='stop'), sect_1)
+        self.assertEqual(node.get_next(40), None)
+        self.assertEqual(node.get_previous(27), sect_2)
+        self.assertEqual(node.get_previous(16), sect_1)
+        self.assertEqual(node.get_previous(10, use='start'), sect_2)
+        self.assertEqual(node.get_previous(2), None)
+        self.assertEqual(node.get(containing_index=12), [sect_1, sect_2])
+        self.assertEqual(node.get(containing_index=12, name='A'), [sect_1])
+        # Modifying the node discards the index.
+        sect_4 = Section('B', slice(26, 28), 26, 28)
+        node.append(sect_4)
+        self.assertEqual(node.get_next(25), sect_4)
+        node.remove(sect_4)
+        self.assertEqual(node.get_next(25), sect_3)
+        node[0] = sect_4
+        self.assertEqual(node.get_next(25), sect_4)
+        del node[0]
+        self.assertEqual(node.get_next(25), None)
+        node += [sect_3]
+        self.assertEqual(node.get_next(25), sect_3)
+        # Sections without a start or stop or with a step are not indexed.
+        sect_5 = Section('C', slice(0, 5, 1), 0, 5)
+        node.append(sect_5)
+        self.assertIsNone(node._get_section_index())
+        self.assertEqual(node.get_surrounding(3), [sect_1, sect_5])
+
     def test_get_shortest(self):
         node = SectionNode(items=[Section('ThisSection', slice(0, 5), 0, 5),
                                   Section('ThisSection', slice(10, 13), 10, 13),
@@ -959,6 +1056,26 @@ class TestFormattedNameNode(unittest.TestCase):
                                  'Speed in descent at 400 ft',
                                  'Speed in descent at 700 ft',])
 
+    def test_name_set(self):
+        names = self.speed_class.names()
+        self.assertEqual(names, ['Slowest', 'Fast', 'Warp 10'])
+        names.append('Warp 11')
+        self.assertEqual(self.speed_class.names(),
+                         ['Slowest', 'Fast', 'Warp 10'])
+        self.assertEqual(self.speed_class.name_set(),
+                         frozenset(['Slowest', 'Fast', 'Warp 10']))
+        self.assertIs(self.speed_class.name_set(),
+                      self.speed_class.name_set())
+        # Names are formatted again after NAME_VALUES is replaced.
+        with mock.patch.object(self.speed_class, 'NAME_VALUES',
+                               {'speed': ['Stopped']}):
+            self.assertEqual(self.speed_class.names(), ['Stopped'])
+        self.assertEqual(self.speed_class.names(),
+                         ['Slowest', 'Fast', 'Warp 10'])
+        node = self.speed_class()
+        self.assertIs(node.format_name(speed='Fast'),
+                      interned_name(intern_name('Fast')))
+
     def test__validate_name(self):
         """ Ensures that created names have a validated option
         """
@@ -1331,6 +1448,27 @@ class TestKeyPointValueNode(unittest.TestCase):
         self.assertEqual(list(knode),
                          [KeyPointValue(index=6, value=26, name='Kpv')])
 
+    def test_create_kpvs_within_slices_batched(self):
+        knode = self.knode
+        array = np.ma.array([3, -8, 5, 2, 9, 1, -4, 7, 0, 6])
+        array[4] = np.ma.masked
+        sections = SectionNode('Section', items=[
+            Section('section', slice(0, 5), 0, 4.5),
+            Section('section', slice(3, 9), 2.5, 9),
+            Section('section', slice(4, 5), 4, 5),
+        ])
+        knode.create_kpvs_within_slices(array, sections, max_value)
+        self.assertEqual(list(knode),
+                         [KeyPointValue(index=2, value=5, name='Kpv'),
+                          KeyPointValue(index=7, value=7, name='Kpv')])
+        del knode[:]
+        knode.create_kpvs_within_slices(array, [slice(0, 5), slice(6, 10)],
+                                        max_abs_value, min_duration=3,
+                                        freq=1)
+        self.assertEqual(list(knode),
+                         [KeyPointValue(index=1, value=-8, name='Kpv'),
+                          KeyPointValue(index=7, value=7, name='Kpv')])
+
 
     def test_create_kpv_from_slices(self):
         knode = self.knode
@@ -1662,6 +1800,71 @@ class TestKeyPointValueNode(unittest.TestCase):
 
 
 
+class TestItemColumns(unittest.TestCase):
+    def test_item_columns(self):
+        items = [KeyPointValue(10, 1.0, 'A'),
+                 KeyPointValue(20, 3.0, 'B', slice(18, 22)),
+                 KeyPointValue(30, 2.0, 'A')]
+        columns = ItemColumns.from_items(KeyPointValue, items)
+        self.assertEqual(len(columns), 3)
+        self.assertEqual(columns.index.tolist(), [10, 20, 30])
+        self.assertEqual(columns.value.tolist(), [1.0, 3.0, 2.0])
+        self.assertEqual([columns.names[i] for i in columns.name_id],
+                         ['A', 'B', 'A'])
+        self.assertEqual(columns.name_id.tolist(),
+                         [intern_name('A'), intern_name('B'), intern_name('A')])
+        self.assertEqual(list(columns.fields), ['slice'])
+        self.assertEqual(list(columns), items)
+        self.assertEqual(columns[1], items[1])
+        self.assertEqual(columns[-1], items[2])
+        self.assertRaises(IndexError, columns.__getitem__, 3)
+        self.assertEqual(list(columns[columns.value > 1.5]), items[1:])
+        aligned = columns.aligned(0.5, 1)
+        self.assertEqual(list(aligned),
+                         [KeyPointValue(6, 1.0, 'A'),
+                          KeyPointValue(11, 3.0, 'B', slice(18, 22)),
+                          KeyPointValue(16, 2.0, 'A')])
+        self.assertEqual(aligned.outside(0, 11).tolist(), [2])
+        self.assertRaises(TypeError, ItemColumns.from_items, KeyPointValue,
+                          [KeyTimeInstance(10, 'A')])
+        self.assertEqual(list(ItemColumns.from_items(KeyTimeInstance, [])),
+                         [])
+
+    def test_item_columns_types(self):
+        # Attributes keep their types, as when copying each item.
+        items = [KeyTimeInstance(10, 'A'), KeyTimeInstance(np.float64(12.5), 'A')]
+        columns = ItemColumns.from_items(KeyTimeInstance, items)
+        self.assertEqual([type(k.index) for k in columns], [int, np.float64])
+        aligned = columns.aligned(2, 0)
+        self.assertEqual([type(k.index) for k in aligned], [int, np.float64])
+        self.assertEqual(aligned.outside(0, 24).tolist(), [1])
+        items = [KeyPointValue(10.0, 3, 'A'), KeyPointValue(11.0, 4.5, 'A')]
+        columns = ItemColumns.from_items(KeyPointValue, items)
+        self.assertEqual(columns.index.dtype, float)
+        self.assertEqual([type(k.value) for k in columns], [int, float])
+        knode = KeyTimeInstanceNode('Event', frequency=1, items=[
+            KeyTimeInstance(3, 'Event')])
+        aligned = knode.get_aligned(P('p', frequency=1))
+        self.assertEqual(type(aligned[0].index), type(3 * 1.0 + 0.0))
+
+    def test_get_aligned_other_items(self):
+        # Items of other types are copied rather than stored within columns.
+        knode = KeyPointValueNode('Speed', frequency=2,
+                                  items=[KeyTimeInstance(10, 'Speed')])
+        self.assertRaises(TypeError, knode.columns)
+        self.assertEqual(knode.get_aligned(P('p', frequency=1)),
+                         [KeyTimeInstance(5, 'Speed')])
+
+
+class TestInternName(unittest.TestCase):
+    def test_intern_name(self):
+        name_id = intern_name('Airspeed At ' + 'Touchdown')
+        self.assertEqual(intern_name('Airspeed At Touchdown'), name_id)
+        self.assertNotEqual(intern_name('Airspeed At Liftoff'), name_id)
+        self.assertIs(interned_name(name_id),
+                      interned_name(intern_name('Airspeed ' + 'At Touchdown')))
+
+
 class TestKeyTimeInstanceNode(unittest.TestCase):
     def setUp(self):
         class KTI(KeyTimeInstanceNode):
@@ -1909,6 +2112,38 @@ class TestDerivedParameterNode(unittest.TestCase):
         self.assertEqual(result.frequency, unaligned_param.frequency)
         self.assertEqual(result.offset, unaligned_param.offset)
 
+    @mock.patch('analysis_engine.node.READ_ONLY_DEPENDENCIES', True)
+    def test_get_derived_read_only(self):
+        class Doubled(DerivedParameterNode):
+            def derive(self, a=P('A')):
+                self.array = a.array * 2
+
+        class Modifies(DerivedParameterNode):
+            def derive(self, a=P('A')):
+                a.array[0] = 0
+
+        param = P('A', np.ma.array([1, 2, 3], mask=[False, True, False]))
+        node = Doubled().get_derived([param])
+        self.assertEqual(node.array.tolist(), [2, None, 6])
+        self.assertRaises(ValueError, Modifies().get_derived, [param])
+        self.assertEqual(param.array.tolist(), [1, None, 3])
+        self.assertTrue(param.array.flags.writeable)
+
+    @mock.patch('analysis_engine.node.CHECK_DEPENDENCY_WRITES', True)
+    def test_get_derived_check_writes(self):
+        class Unmasks(DerivedParameterNode):
+            def derive(self, a=P('A'), b=P('B')):
+                a.array.mask = False
+                self.array = a.array + b.array
+
+        param_a = P('A', np.ma.array([1, 2, 3], mask=[False, True, False]))
+        param_b = P('B', np.ma.array([1, 2, 3]))
+        Unmasks().get_derived([param_a, param_b])
+        self.assertEqual(dependency_writes.pop('Unmasks'), ['A'])
+        self.assertNotIn('Unmasks', dependency_writes)
+        self.derived_class().get_derived([param_a, param_b])
+        self.assertEqual(dependency_writes, {})
+
     def test_get_derived_discrete_align(self):
         '''
         Ensure that interpolations do not occur.
@@ -1936,6 +2171,15 @@ class TestDerivedParameterNode(unittest.TestCase):
         self.assertEqual(spd.at(0), 0) # Extrapolation at bottom end
         self.assertEqual(spd.at(11), 19) # Extrapolation at top end
 
+    def test_parameter_at_many(self):
+        spd = Parameter('Airspeed', np.ma.array(range(20)), 2, 0.75)
+        secs = [0.75, 1.75, 2.5, 9.75, 0, 11]
+        self.assertEqual(spd.at_many(secs).tolist(),
+                         [spd.at(s) for s in secs])
+        spd.array[4] = np.ma.masked
+        self.assertEqual(spd.at_many([2.75, None, 1.75]).tolist(),
+                         [None, None, 2])
+
     @mock.patch('analysis_engine.node.slices_above')
     def test_slices_above(self, slices_above):
         '''
@@ -2185,6 +2429,36 @@ class TestMultistateDerivedParameterNode(unittest.TestCase):
         self.assertEqual(list(res.array), expected)
         os.remove(dest)
 
+    def test_multistate_string_to_integer(self):
+        mapping = {0: 'Up', 1: 'Down', 2: 'Mid'}
+        array = np.ma.array(['Up', 'Down', 'Mid', 'Down', 'Other'],
+                            mask=[0, 0, 0, 1, 1])
+        result = multistate_string_to_integer(array, mapping)
+        self.assertEqual(result.tolist(), [0, 1, 2, None, None])
+        self.assertEqual(result.data.tolist()[3:], [999999, 999999])
+        array = np.ma.array(['Up', 1, '5'], dtype=object)
+        self.assertEqual(multistate_string_to_integer(array, mapping).tolist(),
+                         [0, 1, 5])
+        self.assertRaises(ValueError, multistate_string_to_integer,
+                          np.ma.array(['Up', 'Other']), mapping)
+        self.assertIs(state_table(dict(mapping)), state_table(mapping))
+
+    def test_state_mask(self):
+        mapping = {0: 'Up', 1: 'Down', 2: 'Mid'}
+        node = M('Gear', np.ma.array([0, 1, 1, 2], mask=[0, 0, 1, 0]),
+                 values_mapping=mapping)
+        down = node.state_mask('Down')
+        self.assertEqual(down.tolist(), [False, True, None, False])
+        self.assertIs(node.state_mask('Down'), down)
+        self.assertRaises(ValueError, down.__setitem__, 0, True)
+        self.assertEqual(node.state_mask('Down', 'Mid').tolist(),
+                         [False, True, None, True])
+        self.assertRaises(ValueError, node.state_mask, 'Other')
+        node.array = ['Up', 'Up', 'Down', 'Down']
+        self.assertEqual(node.state_mask('Down').tolist(),
+                         [False, False, True, True])
+
+
 class TestNodeTypeAbbreviation(unittest.TestCase):
     def test_node_type_abbr_attribute(self):
         class NAME(DerivedParameterNode):
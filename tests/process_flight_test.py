@@ -1,5 +1,277 @@
+import gc
+import mock
+import numpy as np
+import os
+import shutil
+import tempfile
+import time
 import unittest
 
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from datetime import datetime
+from hdfaccess.file import hdf_file
+
+from analysis_engine.dependency_graph import dependency_order
+from analysis_engine.node import (
+    DerivedParameterNode, KeyPointValueNode, KeyTimeInstanceNode, NodeManager,
+    P)
+from analysis_engine.process_flight import (
+    _count_consumers, _process_copy, _release_nodes, derive_parameters,
+    process_flights)
+from analysis_engine.profiling import NodeProfiler
+from analysis_engine.write_behind import WriteBehindHDF
+
+
+class MockHDF(dict):
+    '''
+    Minimal dictionary based stand-in for hdf_file used by derive_parameters.
+    '''
+    duration = 100
+
+    def __init__(self, *args, **kwargs):
+        super(MockHDF, self).__init__(*args, **kwargs)
+        self.cache_param_list = []
+        self._cache = {}
+
+    def get_param(self, name, valid_only=False):
+        if name in self.cache_param_list:
+            self._cache[name] = self[name]
+        return self[name]
+
+    def set_param(self, param):
+        self[param.name] = param
+
+
+class Doubled(DerivedParameterNode):
+    def derive(self, raw=P('Raw')):
+        self.array = raw.array * 2
+
+
+class Halved(DerivedParameterNode):
+    def derive(self, raw=P('Raw')):
+        self.array = raw.array / 2.0
+
+
+class Combined(DerivedParameterNode):
+    def derive(self, doubled=P('Doubled'), halved=P('Halved')):
+        self.array = doubled.array + halved.array
+
+
+class CombinedMax(KeyPointValueNode):
+    def derive(self, combined=P('Combined')):
+        index = int(np.ma.argmax(combined.array))
+        self.create_kpv(index, combined.array[index])
+
+
+class HalvedAboveTen(KeyTimeInstanceNode):
+    def derive(self, halved=P('Halved')):
+        self.create_kti(int(np.ma.where(halved.array > 10)[0][0]))
+
+
+class HalvedTotal(KeyPointValueNode):
+    def derive(self, halved=P('Halved')):
+        # Sum the array after MaskedHalved has started modifying it.
+        time.sleep(0.1)
+        self.create_kpv(0, np.ma.sum(halved.array))
+
+
+class MaskedHalved(DerivedParameterNode):
+    def derive(self, halved=P('Halved')):
+        # Modifies its dependency in place.
+        halved.array[halved.array < 20] = np.ma.masked
+        self.array = halved.array
+
+
+class TestDeriveParameters(unittest.TestCase):
+
+    def setUp(self):
+        self.derived_nodes = {
+            'Doubled': Doubled,
+            'Halved': Halved,
+            'Combined': Combined,
+            'Combined Max': CombinedMax,
+            'Halved Above Ten': HalvedAboveTen,
+        }
+
+    def _node_mgr(self):
+        return NodeManager(
+            {'Start Datetime': datetime.now()}, 100, ['Raw'],
+            sorted(self.derived_nodes), [], self.derived_nodes, {}, {})
+
+    def _derive(self, workers, profiler=None, params=None, hdf=None):
+        hdf = MockHDF() if hdf is None else hdf
+        hdf['Raw'] = P('Raw', np.ma.arange(100, dtype=float))
+        node_mgr = self._node_mgr()
+        process_order, gr_st = dependency_order(node_mgr, draw=False)
+        res = derive_parameters(hdf, node_mgr, process_order, params=params,
+                                gr_st=gr_st, workers=workers,
+                                profiler=profiler)
+        return hdf, res
+
+    def test_derive_parameters_parallel_matches_serial(self):
+        serial_hdf, serial_res = self._derive(workers=1)
+        parallel_hdf, parallel_res = self._derive(workers=4)
+        self.assertEqual(sorted(serial_hdf), sorted(parallel_hdf))
+        for name in serial_hdf:
+            np.testing.assert_array_equal(serial_hdf[name].array,
+                                          parallel_hdf[name].array)
+        self.assertEqual(serial_res, parallel_res)
+        ktis, kpvs = parallel_res[:2]
+        self.assertEqual(kpvs['Combined Max'][0].index, 99)
+        self.assertEqual(kpvs['Combined Max'][0].value, 247.5)
+        self.assertEqual(ktis['Halved Above Ten'][0].index, 21)
+
+    def test_derive_parameters_parallel_modified_dependencies(self):
+        self.derived_nodes['Halved Total'] = HalvedTotal
+        self.derived_nodes['Masked Halved'] = MaskedHalved
+        serial_hdf, serial_res = self._derive(workers=1)
+        parallel_hdf, parallel_res = self._derive(workers=4)
+        self.assertEqual(serial_res, parallel_res)
+        self.assertEqual(parallel_res[1]['Halved Total'][0].value, 2475)
+        self.assertEqual(np.ma.count(parallel_hdf['Masked Halved'].array), 60)
+
+    def test_derive_parameters_parallel_raises(self):
+        class Broken(DerivedParameterNode):
+            def derive(self, combined=P('Combined')):
+                raise ZeroDivisionError()
+        self.derived_nodes['Broken'] = Broken
+        self.assertRaises(ZeroDivisionError, self._derive, workers=4)
+
+    def test_count_consumers(self):
+        process_order = ['Raw', 'Doubled', 'Halved', 'Combined',
+                         'Combined Max', 'Halved Above Ten']
+        consumed, consumers = _count_consumers(self._node_mgr(), process_order,
+                                               {})
+        self.assertEqual(consumed['Doubled'], ['Raw'])
+        self.assertEqual(sorted(consumed['Combined']), ['Doubled', 'Halved'])
+        self.assertEqual(consumed['Halved Above Ten'], ['Halved'])
+        self.assertNotIn('Raw', consumed)
+        self.assertEqual(consumers, {'Raw': 2, 'Doubled': 1, 'Halved': 2,
+                                     'Combined': 1})
+        # Dependencies later in the process order are not consumed.
+        consumed, consumers = _count_consumers(
+            self._node_mgr(), ['Raw', 'Combined', 'Doubled', 'Halved'], {})
+        self.assertEqual(consumed['Combined'], [])
+
+    @mock.patch('analysis_engine.process_flight.NODE_RELEASE', True)
+    def test_derive_parameters_releases_nodes(self):
+        for workers in (1, 4):
+            unused = KeyPointValueNode('Unused')
+            params = {'Unused': unused}
+            hdf, res = self._derive(workers=workers, params=params)
+            # Only nodes derived within derive_parameters are released.
+            self.assertEqual(params, {'Unused': unused})
+            self.assertEqual(res[1]['Combined Max'][0].value, 247.5)
+        # Cached parameters are evicted once their consumers are derived.
+        for workers in (1, 4):
+            hdf = MockHDF()
+            hdf.cache_param_list = ['Raw', 'Doubled']
+            self._derive(workers=workers, hdf=hdf)
+            self.assertEqual(hdf.cache_param_list, [])
+            self.assertEqual(hdf._cache, {})
+
+    @unittest.skipIf(tracemalloc is None, 'tracemalloc is not available.')
+    def test_release_nodes_frees_cached_parameter(self):
+        hdf_path = os.path.join(tempfile.mkdtemp(), 'release.hdf5')
+        try:
+            with hdf_file(hdf_path, create=True) as hdf:
+                hdf.set_param(P('Raw', np.ma.arange(10 ** 6, dtype=float)))
+            tracemalloc.start()
+            try:
+                with hdf_file(hdf_path) as hdf, WriteBehindHDF(hdf) as writer:
+                    hdf.cache_param_list = ['Raw']
+                    writer.get_param('Raw')
+                    gc.collect()
+                    cached = tracemalloc.get_traced_memory()[0]
+                    _release_nodes('Doubled', {'Doubled': ['Raw']},
+                                   {'Raw': 1}, writer, {}, None)
+                    gc.collect()
+                    freed = cached - tracemalloc.get_traced_memory()[0]
+                    self.assertEqual(writer.cache_param_list, [])
+            finally:
+                tracemalloc.stop()
+            # The cached array of 8MB is released.
+            self.assertGreater(freed, 7 * 10 ** 6)
+        finally:
+            shutil.rmtree(os.path.dirname(hdf_path))
+
+    @mock.patch('analysis_engine.settings.HDF_WRITE_BEHIND', True)
+    def test_derive_parameters_write_behind(self):
+        for workers in (1, 4):
+            hdf, res = self._derive(workers=workers)
+            self.assertEqual(sorted(hdf), ['Combined', 'Doubled', 'Halved',
+                                           'Raw'])
+            self.assertEqual(res[1]['Combined Max'][0].value, 247.5)
+
+    def test_derive_parameters_profiler(self):
+        profiler = NodeProfiler(trace_memory=False)
+        hdf, res = self._derive(workers=1, profiler=profiler)
+        records = {r['name']: r for r in profiler.records}
+        self.assertEqual(sorted(records), sorted(self.derived_nodes))
+        self.assertEqual(records['Combined']['size'], 100)
+        self.assertEqual(records['Combined Max']['node_type'], 'KPV')
+        self.assertFalse(hasattr(hdf['Combined'], '_align_time'))
+
+
+class TestProcessFlights(unittest.TestCase):
+
+    @mock.patch('analysis_engine.process_flight.process_flight')
+    def test_process_flights_reports_failures(self, process_flight):
+        def side_effect(segment_info, tail_number, **kwargs):
+            if segment_info['File'] == 'b.hdf5':
+                raise ValueError('Corrupt segment')
+            return {'kpv': {}, 'aircraft': kwargs['aircraft_info']}
+        process_flight.side_effect = side_effect
+        aircraft_info = {'Aircraft Type': 'aeroplane'}
+        segments = [{'File': 'a.hdf5'}, {'File': 'b.hdf5'}, {'File': 'c.hdf5'}]
+        results = process_flights(segments, 'G-FDSL',
+                                  aircraft_info=aircraft_info, processes=1)
+        self.assertEqual([r['segment_info'] for r in results], segments)
+        self.assertEqual(results[0]['result'],
+                         {'kpv': {}, 'aircraft': aircraft_info})
+        self.assertEqual(results[0]['error'], None)
+        self.assertEqual(results[1]['result'], None)
+        self.assertIn('Corrupt segment', results[1]['error'])
+        self.assertEqual(results[2]['error'], None)
+        self.assertEqual(process_flight.call_count, 3)
+
+
+class TestProcessCopy(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempdir, 'flight.hdf5')
+        self.process_path = os.path.join(self.tempdir, 'flight_process.hdf5')
+        for path in (self.path, self.process_path):
+            open(path, 'w').close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    @mock.patch('analysis_engine.process_flight.copy_file')
+    def test_process_copy(self, copy_file):
+        copy_file.return_value = self.process_path
+        os.utime(self.path, (1000, 1000))
+        os.utime(self.process_path, (2000, 2000))
+        # Always copied unless incremental.
+        self.assertEqual(_process_copy(self.path),
+                         (self.process_path, False))
+        copy_file.assert_called_once_with(self.path, postfix='_process')
+        # Previously processed file is reused when incremental.
+        copy_file.reset_mock()
+        self.assertEqual(_process_copy(self.path, incremental=True),
+                         (self.process_path, True))
+        self.assertFalse(copy_file.called)
+        # Copied again if the original file has since been modified.
+        os.utime(self.path, (3000, 3000))
+        self.assertEqual(_process_copy(self.path, incremental=True),
+                         (self.process_path, False))
+        copy_file.assert_called_once_with(self.path, postfix='_process')
+
 
 class TestProcessFlight(unittest.TestCase):
 
@@ -14,4 +286,3 @@ class TestProcessFlight(unittest.TestCase):
         '''
         '''
         self.assertTrue(False, msg='Test not implemented.')
-
@@ -0,0 +1,87 @@
+import csv
+import json
+import numpy as np
+import os
+import shutil
+import tempfile
+import unittest
+
+from analysis_engine.node import (
+    DerivedParameterNode, KeyPointValueNode, KPV, KeyPointValue, P)
+from analysis_engine.profiling import NodeProfiler, node_size, tracemalloc
+
+
+class Doubled(DerivedParameterNode):
+    def derive(self, raw=P('Raw')):
+        self.array = raw.array * 2
+
+
+class TestNodeSize(unittest.TestCase):
+    def test_node_size(self):
+        array = np.ma.arange(10, dtype=float)
+        self.assertEqual(node_size(P('A', array)), (10, 80))
+        array[2] = np.ma.masked
+        self.assertEqual(node_size(P('A', array)), (10, 90))
+        kpv = KPV('B', items=[KeyPointValue(1, 2, 'B'),
+                              KeyPointValue(3, 4, 'B')])
+        self.assertEqual(node_size(kpv), (2, None))
+
+
+class TestNodeProfiler(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def _profile(self, profiler):
+        profiler.start()
+        try:
+            raw = P('Raw', np.ma.arange(1000, dtype=float), frequency=2)
+            node = Doubled()
+            profile = profiler.begin()
+            node.get_derived([raw])
+            profiler.end(profile, 'Doubled', node)
+            kpv = KeyPointValueNode('Max Raw')
+            profile = profiler.begin()
+            kpv.create_kpv(999, 999)
+            profiler.end(profile, 'Max Raw', kpv)
+        finally:
+            profiler.stop()
+
+    def test_report(self):
+        profiler = NodeProfiler()
+        self._profile(profiler)
+        doubled, max_raw = sorted(profiler.records, key=lambda r: r['name'])
+        self.assertEqual(doubled['node_type'], 'Parameter')
+        self.assertEqual(doubled['size'], 1000)
+        self.assertEqual(doubled['nbytes'], 8000)
+        self.assertTrue(doubled['wall_time'] >= doubled['align_time'] >= 0)
+        self.assertEqual(max_raw['node_type'], 'KPV')
+        self.assertEqual(max_raw['size'], 1)
+        self.assertEqual(max_raw['nbytes'], None)
+        self.assertEqual(max_raw['align_time'], None)
+        if tracemalloc:
+            self.assertTrue(doubled['peak_memory'] >= 8000)
+            self.assertFalse(tracemalloc.is_tracing())
+        report = profiler.report(sort_by='size')
+        self.assertEqual([r['name'] for r in report], ['Doubled', 'Max Raw'])
+        report = profiler.report(sort_by='nbytes', reverse=False)
+        self.assertEqual([r['name'] for r in report], ['Doubled', 'Max Raw'])
+        self.assertRaises(ValueError, profiler.report, sort_by='unknown')
+
+    def test_write(self):
+        profiler = NodeProfiler(trace_memory=False)
+        self._profile(profiler)
+        json_path = os.path.join(self.tempdir, 'profile.json')
+        profiler.write(json_path, sort_by='size')
+        with open(json_path) as fh:
+            report = json.load(fh)
+        self.assertEqual([r['name'] for r in report], ['Doubled', 'Max Raw'])
+        self.assertEqual(report[0]['peak_memory'], None)
+        csv_path = os.path.join(self.tempdir, 'profile.csv')
+        profiler.write(csv_path, sort_by='size', reverse=False)
+        with open(csv_path) as fh:
+            rows = list(csv.DictReader(fh))
+        self.assertEqual([r['name'] for r in rows], ['Max Raw', 'Doubled'])
+        self.assertEqual(rows[1]['size'], '1000')
@@ -0,0 +1,152 @@
+import mock
+import os
+import shutil
+import simplejson as json
+import tempfile
+import unittest
+
+from analysis_engine.node import KeyTimeInstance
+from analysis_engine.server import (
+    CLAIMED_SUFFIX, JOB_SUFFIX, RESULT_SUFFIX, AnalysisServer,
+    _get_aircraft_info, clear_aircraft_info, process_job, submit_job)
+
+
+def _results():
+    return {
+        'flight': {},
+        'kti': {'Liftoff': [KeyTimeInstance(10, 'Liftoff')]},
+        'kpv': {},
+        'approach': {},
+        'phases': {},
+    }
+
+
+JOB = {
+    'id': 1,
+    'segment_info': {'File': 'flight.hdf5',
+                     'Start Datetime': '2013-01-01T00:00:00+00:00'},
+    'tail_number': 'G-FDSL',
+    'aircraft_info': {'Aircraft Type': 'aeroplane'},
+    'kwargs': {'requested': ['Liftoff']},
+}
+
+
+@mock.patch('analysis_engine.server.warm_up')
+@mock.patch('analysis_engine.server.process_flight')
+class TestAnalysisServer(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_process_job(self, process_flight, warm_up):
+        process_flight.return_value = _results()
+        response = process_job(JOB)
+        self.assertIsNone(response['error'])
+        self.assertEqual(response['id'], 1)
+        self.assertEqual(response['segment_info'], JOB['segment_info'])
+        self.assertEqual(response['result']['kti']['Liftoff'][0]['index'], 10)
+        segment_info, tail_number = process_flight.call_args[0]
+        self.assertEqual(segment_info['Start Datetime'].year, 2013)
+        self.assertEqual(tail_number, 'G-FDSL')
+        self.assertEqual(process_flight.call_args[1]['requested'],
+                         ['Liftoff'])
+
+    def test_process_job_error(self, process_flight, warm_up):
+        process_flight.side_effect = ValueError('Invalid segment')
+        response = process_job(JOB)
+        self.assertIsNone(response['result'])
+        self.assertIn('Invalid segment', response['error'])
+        response = process_job({'id': 2})
+        self.assertEqual(response['id'], 2)
+        self.assertIn('KeyError', response['error'])
+
+    def test_socket(self, process_flight, warm_up):
+        process_flight.return_value = _results()
+        socket_path = os.path.join(self.path, 'analysis.sock')
+        with AnalysisServer(socket_path=socket_path):
+            self.assertEqual(warm_up.call_count, 1)
+            response = submit_job(JOB, socket_path=socket_path)
+            self.assertIsNone(response['error'])
+            self.assertEqual(response['id'], 1)
+            response = submit_job({'id': 2}, socket_path=socket_path)
+            self.assertEqual(response['id'], 2)
+            self.assertIsNotNone(response['error'])
+        self.assertFalse(os.path.exists(socket_path))
+        self.assertEqual(process_flight.call_count, 1)
+
+    def test_spool(self, process_flight, warm_up):
+        process_flight.return_value = _results()
+        with open(os.path.join(self.path, 'a' + JOB_SUFFIX), 'w') as f:
+            json.dump(JOB, f)
+        with open(os.path.join(self.path, 'b' + JOB_SUFFIX), 'w') as f:
+            f.write('{')
+        server = AnalysisServer(spool_path=self.path)
+        self.assertEqual(server.process_spool(), 2)
+        self.assertEqual(sorted(os.listdir(self.path)),
+                         ['a' + RESULT_SUFFIX, 'b' + RESULT_SUFFIX])
+        with open(os.path.join(self.path, 'a' + RESULT_SUFFIX)) as f:
+            response = json.load(f)
+        self.assertIsNone(response['error'])
+        self.assertEqual(response['result']['kti']['Liftoff'][0]['index'], 10)
+        with open(os.path.join(self.path, 'b' + RESULT_SUFFIX)) as f:
+            self.assertIsNotNone(json.load(f)['error'])
+        self.assertEqual(server.process_spool(), 0)
+
+    def test_spool_pool_error(self, process_flight, warm_up):
+        with open(os.path.join(self.path, 'a' + JOB_SUFFIX), 'w') as f:
+            json.dump(JOB, f)
+        server = AnalysisServer(spool_path=self.path)
+        server._pool = mock.Mock()
+        self.assertEqual(server.process_spool(), 1)
+        self.assertEqual(os.listdir(self.path), ['a' + CLAIMED_SUFFIX])
+        # Errors raised outside of process_job, e.g. pickling the response.
+        kwargs = server._pool.apply_async.call_args[1]
+        kwargs['error_callback'](TypeError("can't pickle response"))
+        self.assertEqual(os.listdir(self.path), ['a' + RESULT_SUFFIX])
+        with open(os.path.join(self.path, 'a' + RESULT_SUFFIX)) as f:
+            response = json.load(f)
+        self.assertEqual(response['id'], 1)
+        self.assertEqual(response['segment_info'], JOB['segment_info'])
+        self.assertIsNone(response['result'])
+        self.assertIn("can't pickle response", response['error'])
+
+
+@mock.patch('analysis_engine.server.time.time')
+@mock.patch('analysis_engine.server.get_aircraft_info')
+class TestGetAircraftInfo(unittest.TestCase):
+    def tearDown(self):
+        clear_aircraft_info()
+
+    @mock.patch('analysis_engine.settings.SERVER_AIRCRAFT_INFO_TTL', 60)
+    def test_get_aircraft_info(self, get_aircraft_info, time):
+        get_aircraft_info.side_effect = lambda tail_number: {'Model': 'A320'}
+        time.return_value = 0
+        self.assertEqual(_get_aircraft_info('G-FDSL'), {'Model': 'A320'})
+        # Copies are returned as process_flight modifies aircraft_info.
+        _get_aircraft_info('G-FDSL')['Model'] = 'B737'
+        time.return_value = 59
+        self.assertEqual(_get_aircraft_info('G-FDSL'), {'Model': 'A320'})
+        self.assertEqual(get_aircraft_info.call_count, 1)
+        # Fetched again once expired.
+        time.return_value = 60
+        _get_aircraft_info('G-FDSL')
+        self.assertEqual(get_aircraft_info.call_count, 2)
+        _get_aircraft_info('G-ABCD')
+        clear_aircraft_info('G-FDSL')
+        _get_aircraft_info('G-FDSL')
+        _get_aircraft_info('G-ABCD')
+        self.assertEqual(get_aircraft_info.call_count, 4)
+        clear_aircraft_info()
+        _get_aircraft_info('G-ABCD')
+        self.assertEqual(get_aircraft_info.call_count, 5)
+
+    @mock.patch('analysis_engine.settings.SERVER_AIRCRAFT_INFO_TTL', None)
+    def test_get_aircraft_info_no_ttl(self, get_aircraft_info, time):
+        get_aircraft_info.return_value = {}
+        time.return_value = 0
+        _get_aircraft_info('G-FDSL')
+        time.return_value = 10 ** 9
+        _get_aircraft_info('G-FDSL')
+        self.assertEqual(get_aircraft_info.call_count, 1)
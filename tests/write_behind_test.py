@@ -0,0 +1,68 @@
+import numpy as np
+import threading
+import unittest
+
+from analysis_engine.node import P
+from analysis_engine.write_behind import WriteBehindHDF
+
+
+class MockHDF(dict):
+    def __init__(self):
+        super(MockHDF, self).__init__()
+        self.duration = 10
+        self.release = threading.Event()
+
+    def get_param(self, name, valid_only=False):
+        return self[name]
+
+    def set_param(self, param):
+        self.release.wait()
+        if param.name == 'Broken':
+            raise ValueError('Cannot save parameter')
+        self[param.name] = param
+
+
+class TestWriteBehindHDF(unittest.TestCase):
+    def test_write_behind(self):
+        hdf = MockHDF()
+        writer = WriteBehindHDF(hdf, queue_size=2)
+        self.assertEqual(writer.duration, 10)
+        param = P('A', np.ma.arange(10))
+        writer.set_param(param)
+        # Queued parameters are available before they are saved.
+        self.assertNotIn('A', hdf)
+        self.assertIn('A', writer)
+        queued = writer.get_param('A', valid_only=True)
+        self.assertIsNot(queued.array, param.array)
+        np.testing.assert_array_equal(queued.array, param.array)
+        hdf.release.set()
+        writer.flush()
+        self.assertIs(hdf['A'], param)
+        self.assertIs(writer['A'], param)
+        writer.close()
+
+    def test_write_behind_error(self):
+        hdf = MockHDF()
+        hdf.release.set()
+        writer = WriteBehindHDF(hdf)
+        writer.set_param(P('Broken', np.ma.arange(10)))
+        self.assertRaises(ValueError, writer.flush)
+        # The error is only raised once.
+        writer.set_param(P('B', np.ma.arange(10)))
+        writer.close()
+        self.assertIn('B', hdf)
+        writer = WriteBehindHDF(hdf)
+        writer.set_param(P('Broken', np.ma.arange(10)))
+        self.assertRaises(ValueError, writer.close)
+
+    def test_context_manager(self):
+        hdf = MockHDF()
+        hdf.release.set()
+        with WriteBehindHDF(hdf) as writer:
+            writer.set_param(P('A', np.ma.arange(10)))
+        self.assertIn('A', hdf)
+        # Write errors do not mask exceptions raised within the block.
+        with self.assertRaises(KeyError):
+            with WriteBehindHDF(hdf) as writer:
+                writer.set_param(P('Broken', np.ma.arange(10)))
+                raise KeyError('B')